@@ -1,14 +1,49 @@
-from flask import Flask, render_template, request, redirect, url_for, session
+from flask import (
+    Flask, Response, render_template, request, redirect, url_for, session, g, has_request_context,
+    stream_with_context,
+)
+from flask.json.provider import DefaultJSONProvider
 from flask_sqlalchemy import SQLAlchemy  # for sqlite
+from sqlalchemy import create_engine, event
 from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session as OrmSession, object_session
+from sqlalchemy.pool import NullPool
 from werkzeug.middleware.proxy_fix import ProxyFix
 from functools import wraps
+from itertools import combinations
+import click
 import pandas as pd
 import sqlite3
+import atexit
+import cProfile
+import csv
+import io
+import pstats
 import json
+import logging
+import logging.handlers
+import math
+import multiprocessing
 import os
+import queue
 import random
+import secrets
+import sys
+import tempfile
+import threading
+import time
+import traceback
+import zlib
+from collections import OrderedDict
+from collections.abc import Mapping
+from dataclasses import dataclass
 from datetime import datetime
+from types import MappingProxyType
+
+try:
+    import orjson
+except ImportError:  # optional: the stdlib json module is used instead
+    orjson = None
 
 
 # Study configuration
@@ -51,6 +86,195 @@ app.config["SESSION_COOKIE_HTTPONLY"] = True
 app.config["SESSION_COOKIE_SAMESITE"] = os.environ.get("SESSION_COOKIE_SAMESITE", "Lax")
 app.config["SESSION_COOKIE_SECURE"] = _get_bool_env("SESSION_COOKIE_SECURE", default=not flask_debug)
 
+
+# ---- Structured, queued logging ----
+# Request code only builds a LogRecord and puts it on an in-memory queue; a
+# QueueListener thread formats it as one JSON object per line and writes it
+# to stderr (journald under systemd). Pass structured data with
+# `extra={'fields': {...}}`.
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "DEBUG" if flask_debug else "INFO").upper()
+
+
+def _parse_log_sample_rates(raw: str) -> dict[int, float]:
+    """Parse e.g. "DEBUG=0.1,INFO=1" into {logging.DEBUG: 0.1, logging.INFO: 1.0}."""
+    rates = {}
+    for part in (raw or '').split(','):
+        name, _, value = part.partition('=')
+        level = logging.getLevelName(name.strip().upper())
+        if not isinstance(level, int):
+            continue
+        try:
+            rates[level] = max(0.0, min(1.0, float(value)))
+        except ValueError:
+            continue
+    return rates
+
+
+LOG_SAMPLE_RATES = _parse_log_sample_rates(os.environ.get("LOG_SAMPLE_RATES", ""))
+_log_sample_rng = random.Random()
+
+
+class _RequestContextLogFilter(logging.Filter):
+    """Runs in the calling thread: samples noisy levels and attaches request context."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        rate = LOG_SAMPLE_RATES.get(record.levelno)
+        if rate is not None and rate < 1.0 and _log_sample_rng.random() >= rate:
+            return False
+        if has_request_context():
+            record.participant_id = session.get('prolific_id')
+            record.endpoint = request.endpoint
+            started = g.get('_request_started')
+            record.duration_ms = round((time.perf_counter() - started) * 1000, 1) if started else None
+        if record.exc_info and not getattr(record, 'exc', None):
+            # QueueHandler.prepare() drops exc_info before the record is queued.
+            record.exc = logging.Formatter().formatException(record.exc_info)
+        return True
+
+
+class _MessageOnlyFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        return record.getMessage()
+
+
+class _JsonLogFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        out = {
+            'ts': datetime.utcfromtimestamp(record.created).isoformat(timespec='milliseconds') + 'Z',
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+            'pid': record.process,
+        }
+        for key in ('participant_id', 'endpoint', 'duration_ms'):
+            value = getattr(record, key, None)
+            if value is not None:
+                out[key] = value
+        fields = getattr(record, 'fields', None)
+        if isinstance(fields, dict):
+            out.update(fields)
+        exc = getattr(record, 'exc', None)
+        if exc:
+            out['exc'] = exc
+        return json.dumps(out, ensure_ascii=False, default=str)
+
+
+_log_queue_handler = logging.handlers.QueueHandler(queue.SimpleQueue())
+_log_queue_handler.addFilter(_RequestContextLogFilter())
+_log_queue_handler.setFormatter(_MessageOnlyFormatter())
+_log_listener = None
+_log_listener_pid = None
+_log_listener_lock = threading.Lock()
+
+
+def _ensure_log_listener_started():
+    """Start the QueueListener once per process (threads do not survive fork)."""
+    global _log_listener, _log_listener_pid
+    if _log_listener_pid == os.getpid():
+        return
+    with _log_listener_lock:
+        if _log_listener_pid == os.getpid():
+            return
+        stream_handler = logging.StreamHandler(sys.stderr)
+        stream_handler.setFormatter(_JsonLogFormatter())
+        # A fresh queue: the parent's listener thread did not survive the fork.
+        _log_queue_handler.queue = queue.SimpleQueue()
+        _log_listener = logging.handlers.QueueListener(_log_queue_handler.queue, stream_handler)
+        _log_listener.start()
+        _log_listener_pid = os.getpid()
+
+
+def _stop_log_listener():
+    if _log_listener is not None and _log_listener_pid == os.getpid():
+        _log_listener.stop()
+
+
+_root_logger = logging.getLogger()
+_root_logger.addHandler(_log_queue_handler)
+_root_logger.setLevel(LOG_LEVEL)
+_ensure_log_listener_started()
+atexit.register(_stop_log_listener)
+
+
+@app.before_request
+def _start_request_clock():
+    _ensure_log_listener_started()
+    g._request_started = time.perf_counter()
+
+
+@app.after_request
+def _log_request_finished(response):
+    if app.logger.isEnabledFor(logging.DEBUG):
+        app.logger.debug(
+            "request finished",
+            extra={'fields': {'method': request.method, 'path': request.path, 'status': response.status_code}},
+        )
+    return response
+
+# ---- JSON encoding ----
+# Flask responses, the session cookie, templates' |tojson and the db.JSON
+# columns all go through the functions below: orjson when it is installed
+# (pip install orjson) and JSON_BACKEND is not "json", else the stdlib. Values
+# orjson rejects (integers beyond 64 bits, unusual dump options) fall back to
+# the stdlib, so output only differs in whitespace and in non-ASCII text being
+# written as UTF-8 instead of \u escapes.
+JSON_BACKEND = 'orjson' if orjson is not None and os.environ.get("JSON_BACKEND", "orjson") != 'json' else 'json'
+_ORJSON_DUMP_KWARGS = {'default', 'ensure_ascii', 'sort_keys', 'separators', 'indent'}
+
+
+def _orjson_dumps(obj, default=None, sort_keys: bool = False, indent=None) -> str | None:
+    """orjson text for `obj`, or None if the stdlib has to handle it."""
+    if indent not in (None, 2):
+        return None
+    # Datetimes go through `default` as with the stdlib (Flask renders them as HTTP dates).
+    option = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+    if sort_keys:
+        option |= orjson.OPT_SORT_KEYS
+    if indent == 2:
+        option |= orjson.OPT_INDENT_2
+    try:
+        return orjson.dumps(obj, default=default, option=option).decode('utf-8')
+    except TypeError:
+        return None
+
+
+def json_column_dumps(obj) -> str:
+    """Serializer for db.JSON columns."""
+    if JSON_BACKEND == 'orjson':
+        text = _orjson_dumps(obj)
+        if text is not None:
+            return text
+    return json.dumps(obj)
+
+
+def json_column_loads(text):
+    """Deserializer for db.JSON columns."""
+    return orjson.loads(text) if JSON_BACKEND == 'orjson' else json.loads(text)
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """Flask's default JSON provider, encoding and decoding with orjson when available."""
+
+    def dumps(self, obj, **kwargs) -> str:
+        if JSON_BACKEND == 'orjson' and kwargs.keys() <= _ORJSON_DUMP_KWARGS:
+            text = _orjson_dumps(
+                obj,
+                default=kwargs.get('default', self.default),
+                sort_keys=kwargs.get('sort_keys', self.sort_keys),
+                indent=kwargs.get('indent'),
+            )
+            if text is not None:
+                return text
+        return super().dumps(obj, **kwargs)
+
+    def loads(self, s, **kwargs):
+        if JSON_BACKEND == 'orjson' and not kwargs:
+            return orjson.loads(s)
+        return super().loads(s, **kwargs)
+
+
+app.json = FastJSONProvider(app)
+
 db_uri = (
     os.environ.get("SQLALCHEMY_DATABASE_URI")
     or os.environ.get("DATABASE_URL")
@@ -64,8 +288,35 @@ db_uri = (
 
 app.config["SQLALCHEMY_DATABASE_URI"] = db_uri  # for sqlite
 app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False  # for sqlite
+app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
+    "json_serializer": json_column_dumps,
+    "json_deserializer": json_column_loads,
+}
 db = SQLAlchemy(app)  # for sqlite
 
+# Several threads and workers write the responses DB at once (gunicorn.conf.py
+# runs gthread workers). WAL lets readers, including the snapshot backup, run
+# alongside a writer, and busy_timeout makes a writer wait for the lock
+# instead of failing with "database is locked". journal_mode is stored in the
+# database file; busy_timeout is set on every new connection.
+SQLITE_JOURNAL_MODE = os.environ.get("SQLITE_JOURNAL_MODE", "WAL")
+SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get("SQLITE_BUSY_TIMEOUT_MS", "10000"))
+
+
+def _configure_sqlite_connection(dbapi_conn, connection_record):
+    cursor = dbapi_conn.cursor()
+    try:
+        cursor.execute(f"PRAGMA busy_timeout = {SQLITE_BUSY_TIMEOUT_MS}")
+        if SQLITE_JOURNAL_MODE:
+            cursor.execute(f"PRAGMA journal_mode = {SQLITE_JOURNAL_MODE}")
+    finally:
+        cursor.close()
+
+
+with app.app_context():
+    if db.engine.url.get_backend_name() == 'sqlite':
+        event.listen(db.engine, "connect", _configure_sqlite_connection)
+
 
 
 ###define database models for sqlite
@@ -74,9 +325,12 @@ class Participant(db.Model):
     prolific_id = db.Column(db.String(64), unique=True, nullable=False)
     condition = db.Column(db.String(32))
     timestamp_start = db.Column(db.DateTime)
-    demographics = db.Column(db.JSON)
-    pre_questionnaire = db.Column(db.JSON)
-    post_questionnaire = db.Column(db.JSON)
+    timestamp_updated = db.Column(db.DateTime)  # last save of any participant section
+    # Raw payloads are deferred (loaded on first access); old ones may live in
+    # payload_archive instead, see raw_payload().
+    demographics = db.deferred(db.Column(db.JSON), group='payload')
+    pre_questionnaire = db.deferred(db.Column(db.JSON), group='payload')
+    post_questionnaire = db.deferred(db.Column(db.JSON), group='payload')
     
     # Explanation pair tracking (for balanced randomization)
     explanation_pair = db.Column(db.String(255))  # Stores the pair of explanations shown (e.g., "Fact-checked for accuracy | Trending right now")
@@ -111,18 +365,18 @@ class Round(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     round_number = db.Column(db.Integer)
     participant_id = db.Column(db.Integer, db.ForeignKey('participant.id'), nullable=False)
-    theme_selection = db.Column(db.JSON)
-    article = db.Column(db.JSON)
-    mid_questionnaire = db.Column(db.JSON)
+    theme_selection = db.deferred(db.Column(db.JSON), group='payload')
+    article = db.deferred(db.Column(db.JSON), group='payload')
+    mid_questionnaire = db.deferred(db.Column(db.JSON), group='payload')
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
 
-    # Flattened rating-box fields (2 recommendations)
-    main_article_stable_id = db.Column(db.String)
-    main_article_title = db.Column(db.String)
+    # Flattened rating-box fields (2 recommendations). Articles, topics and labels
+    # are stored once in the *_dim tables and referenced by id; `round_view`
+    # rehydrates their text (main_article_title, rec0_label_text, ...).
+    main_article_ref = db.Column(db.Integer, db.ForeignKey('article_dim.id'))
 
     # The recommendation the participant chose before completing the rating questions
-    selected_rec_stable_id = db.Column(db.String)
-    selected_rec_title = db.Column(db.String)
+    selected_rec_article_ref = db.Column(db.Integer, db.ForeignKey('article_dim.id'))
 
     # Which recommendation position was chosen: 0 (rec0) or 1 (rec1)
     selected_rec_pos = db.Column(db.Integer)
@@ -131,10 +385,9 @@ class Round(db.Model):
     changing_label_rec_pos = db.Column(db.Integer)
 
     # Main article topic (for analysis convenience)
-    main_topic = db.Column(db.String)
+    main_topic_ref = db.Column(db.Integer, db.ForeignKey('topic_dim.id'))
 
-    rec0_stable_id = db.Column(db.String)
-    rec0_title = db.Column(db.String)
+    rec0_article_ref = db.Column(db.Integer, db.ForeignKey('article_dim.id'))
     rec0_likelihood = db.Column(db.Integer)
     rec0_preference_fit = db.Column(db.Integer)
     rec0_constructive = db.Column(db.Integer)
@@ -142,8 +395,7 @@ class Round(db.Model):
     rec0_trustworthy = db.Column(db.Integer)
     rec0_relevant = db.Column(db.Integer)
 
-    rec1_stable_id = db.Column(db.String)
-    rec1_title = db.Column(db.String)
+    rec1_article_ref = db.Column(db.Integer, db.ForeignKey('article_dim.id'))
     rec1_likelihood = db.Column(db.Integer)
     rec1_preference_fit = db.Column(db.Integer)
     rec1_constructive = db.Column(db.Integer)
@@ -166,10 +418,10 @@ class Round(db.Model):
     high_relevant = db.Column(db.Integer)
 
     # Recommendation topics + shown labels (for analysis convenience)
-    rec0_topic = db.Column(db.String)
-    rec1_topic = db.Column(db.String)
-    rec0_label_text = db.Column(db.String)
-    rec1_label_text = db.Column(db.String)
+    rec0_topic_ref = db.Column(db.Integer, db.ForeignKey('topic_dim.id'))
+    rec1_topic_ref = db.Column(db.Integer, db.ForeignKey('topic_dim.id'))
+    rec0_label_ref = db.Column(db.Integer, db.ForeignKey('label_dim.id'))
+    rec1_label_ref = db.Column(db.Integer, db.ForeignKey('label_dim.id'))
 
     label_understandable = db.Column(db.Integer)
     label_useful = db.Column(db.Integer)
@@ -179,6 +431,136 @@ class Round(db.Model):
 
     # Rating-box attention check (only asked in round 3; NULL otherwise)
     rb_attention_check = db.Column(db.Integer)
+
+
+class Rating(db.Model):
+    """Long-form ratings: one row per answered (round, target, item), codes in RATING_TARGETS / RATING_ITEMS.
+
+    Written by the round flattening triggers; the covering index serves per-item aggregates.
+    """
+    __tablename__ = 'rating'
+    __table_args__ = (
+        db.Index('ix_rating_item', 'item_code', 'target', 'value', 'round_id'),
+        {'sqlite_with_rowid': False},
+    )
+    round_id = db.Column(db.Integer, db.ForeignKey('round.id'), primary_key=True)
+    target = db.Column(db.SmallInteger, primary_key=True)
+    item_code = db.Column(db.SmallInteger, primary_key=True)
+    value = db.Column(db.SmallInteger, nullable=False)
+
+
+class RatingSummary(db.Model):
+    """Running count and sum of each rating item per target and changing label (summary triggers)."""
+    __tablename__ = 'rating_summary'
+    label_ref = db.Column(db.Integer, primary_key=True)  # label_dim id of the changing label, 0 if none
+    target = db.Column(db.SmallInteger, primary_key=True)
+    item_code = db.Column(db.SmallInteger, primary_key=True)
+    n = db.Column(db.Integer, nullable=False, default=0)
+    total = db.Column(db.Integer, nullable=False, default=0)
+
+
+class SelectionSummary(db.Model):
+    """Running recommendation choices per changing-label position and label (summary triggers)."""
+    __tablename__ = 'selection_summary'
+    changing_label_rec_pos = db.Column(db.SmallInteger, primary_key=True)  # -1 if unknown
+    label_ref = db.Column(db.Integer, primary_key=True)  # 0 if none
+    rounds = db.Column(db.Integer, nullable=False, default=0)
+    selected = db.Column(db.Integer, nullable=False, default=0)
+    selected_changing = db.Column(db.Integer, nullable=False, default=0)
+
+
+class CompletionSummary(db.Model):
+    """Running participants and completions per explanation pair (summary triggers)."""
+    __tablename__ = 'completion_summary'
+    explanation_pair = db.Column(db.String(255), primary_key=True)  # '' until assigned
+    participants = db.Column(db.Integer, nullable=False, default=0)
+    completed = db.Column(db.Integer, nullable=False, default=0)
+
+
+class ArticleDim(db.Model):
+    """Articles shown in any round, stored once (first title seen wins)."""
+    __tablename__ = 'article_dim'
+    id = db.Column(db.Integer, primary_key=True)
+    stable_id = db.Column(db.String, unique=True, nullable=False)
+    title = db.Column(db.String)
+
+
+class TopicDim(db.Model):
+    __tablename__ = 'topic_dim'
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String, unique=True, nullable=False)
+
+
+class LabelDim(db.Model):
+    """Explanation label texts shown above recommendations ('' for none)."""
+    __tablename__ = 'label_dim'
+    id = db.Column(db.Integer, primary_key=True)
+    text = db.Column(db.String, unique=True, nullable=False)
+
+
+class PayloadArchive(db.Model):
+    """Compressed raw JSON payloads moved out of their rows by `flask archive-payloads`."""
+    __tablename__ = 'payload_archive'
+    __table_args__ = {'sqlite_with_rowid': False}
+    table_name = db.Column(db.String(32), primary_key=True)
+    row_id = db.Column(db.Integer, primary_key=True)
+    column_name = db.Column(db.String(32), primary_key=True)
+    codec = db.Column(db.String(8), nullable=False)  # zlib | zstd
+    data = db.Column(db.LargeBinary, nullable=False)
+    archived_at = db.Column(db.DateTime, nullable=False)
+
+
+class RumEvent(db.Model):
+    """Append-only client-side timing samples (one row per page view and metric)."""
+    __tablename__ = 'rum_event'
+    id = db.Column(db.Integer, primary_key=True)
+    page = db.Column(db.String(64), nullable=False)
+    round_number = db.Column(db.Integer)
+    metric = db.Column(db.String(64), nullable=False)
+    value_ms = db.Column(db.Float, nullable=False)
+    timestamp = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+
+
+class StepEvent(db.Model):
+    """Append-only funnel log: one row per step entry/exit (see STUDY_STEPS)."""
+    __tablename__ = 'step_event'
+    id = db.Column(db.Integer, primary_key=True)
+    prolific_id = db.Column(db.String(64), nullable=False)
+    step = db.Column(db.SmallInteger, nullable=False)
+    kind = db.Column(db.SmallInteger, nullable=False)  # 0 = enter, 1 = exit
+    ts_ms = db.Column(db.BigInteger, nullable=False)
+    duration_ms = db.Column(db.Integer)  # exit events only
+
+
+class StepStat(db.Model):
+    """Running per-step counters, updated with every funnel flush."""
+    __tablename__ = 'step_stat'
+    step = db.Column(db.SmallInteger, primary_key=True)
+    entered = db.Column(db.Integer, nullable=False, default=0)
+    exited = db.Column(db.Integer, nullable=False, default=0)
+
+
+class StepLatencyBucket(db.Model):
+    """Running histogram of time spent per step (log-spaced buckets, see _funnel_bucket)."""
+    __tablename__ = 'step_latency_hist'
+    step = db.Column(db.SmallInteger, primary_key=True)
+    bucket = db.Column(db.SmallInteger, primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+
+class JobState(db.Model):
+    """Persisted progress of a resumable background job (one row per job)."""
+    __tablename__ = 'job_state'
+    name = db.Column(db.String(64), primary_key=True)
+    status = db.Column(db.String(16), nullable=False, default='idle')  # idle | running | cancelling | done | failed
+    cursor = db.Column(db.Integer, nullable=False, default=0)  # last processed id
+    processed = db.Column(db.Integer, nullable=False, default=0)
+    updated = db.Column(db.Integer, nullable=False, default=0)
+    total = db.Column(db.Integer)
+    started_at = db.Column(db.DateTime)
+    heartbeat_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+    error = db.Column(db.Text)
 ###
 
 
@@ -212,6 +594,369 @@ def admin_only(fn):
     return wrapper
 
 
+# ---- On-demand request profiling (admin only) ----
+# Off by default. Switch on at runtime either for a sample of requests
+# (/debug-profiler?sample_rate=0.05) or for a single request by sending the
+# `X-Profile: 1` header together with the admin token.
+PROFILE_DIR = os.environ.get("PROFILE_DIR", "profiles")
+PROFILE_KEEP = int(os.environ.get("PROFILE_KEEP", "50"))
+PROFILE_HEADER = "X-Profile"
+_PROFILE_CONTROL_FILE = os.path.join(PROFILE_DIR, "sample_rate")
+_PROFILE_RELOAD_INTERVAL_S = 2.0
+
+# The sample rate lives in a small control file so that every gunicorn worker
+# picks up a change made through any one of them. Workers only re-read it every
+# few seconds; between reloads the check is a float comparison.
+_profile_state = {
+    "sample_rate": float(os.environ.get("PROFILE_SAMPLE_RATE", "0") or 0),
+    "checked_at": 0.0,
+}
+_profile_rng = random.Random()
+
+
+def _profile_sample_rate() -> float:
+    now = time.monotonic()
+    if now - _profile_state["checked_at"] >= _PROFILE_RELOAD_INTERVAL_S:
+        _profile_state["checked_at"] = now
+        try:
+            with open(_PROFILE_CONTROL_FILE) as fh:
+                _profile_state["sample_rate"] = max(0.0, min(1.0, float(fh.read().strip() or 0)))
+        except (OSError, ValueError):
+            pass
+    return _profile_state["sample_rate"]
+
+
+def _set_profile_sample_rate(rate: float) -> float:
+    rate = max(0.0, min(1.0, rate))
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    with open(_PROFILE_CONTROL_FILE, "w") as fh:
+        fh.write(str(rate))
+    _profile_state["sample_rate"] = rate
+    _profile_state["checked_at"] = time.monotonic()
+    return rate
+
+
+def _rotate_profiles():
+    try:
+        names = [n for n in os.listdir(PROFILE_DIR) if n.endswith(".prof")]
+    except OSError:
+        return
+    # File names start with a sortable timestamp, oldest first.
+    for name in sorted(names)[:-PROFILE_KEEP or None]:
+        try:
+            os.remove(os.path.join(PROFILE_DIR, name))
+        except OSError:
+            pass
+
+
+@app.before_request
+def _start_request_profiler():
+    forced = PROFILE_HEADER in request.headers
+    if not forced:
+        rate = _profile_sample_rate()
+        if not rate or _profile_rng.random() >= rate:
+            return
+    elif not _admin_allowed():
+        return
+
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        # Another profiler is already active on this thread.
+        return
+    g._profiler = profiler
+    g._profiler_started = time.perf_counter()
+
+
+@app.teardown_request
+def _stop_request_profiler(exc=None):
+    profiler = g.pop("_profiler", None)
+    if profiler is None:
+        return
+    profiler.disable()
+    elapsed_ms = int((time.perf_counter() - g.pop("_profiler_started")) * 1000)
+    endpoint = (request.endpoint or "unknown").replace(".", "-")
+    name = f"{datetime.utcnow().strftime('%Y%m%dT%H%M%S%f')}_{os.getpid()}_{endpoint}_{elapsed_ms}ms.prof"
+    try:
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        profiler.dump_stats(os.path.join(PROFILE_DIR, name))
+        _rotate_profiles()
+    except OSError as e:
+        app.logger.warning("failed to write profile", extra={'fields': {'profile': name, 'error': str(e)}})
+
+
+# ---- Slow-request watchdog ----
+# Always on. Each request registers itself (thread id, start time, endpoint,
+# participant) and the SQL statement it is currently executing; a daemon
+# thread checks the registry and, once a request is past the deadline, logs a
+# single structured record with the worker thread's current Python stack.
+SLOW_REQUEST_DEADLINE_S = float(os.environ.get("SLOW_REQUEST_DEADLINE_S", "10"))
+_WATCHDOG_INTERVAL_S = max(0.05, min(1.0, SLOW_REQUEST_DEADLINE_S / 4))
+
+_inflight_requests: dict[int, dict] = {}
+_watchdog_lock = threading.Lock()
+_watchdog_pid = None
+
+
+def _watchdog_loop():
+    while True:
+        time.sleep(_WATCHDOG_INTERVAL_S)
+        now = time.monotonic()
+        frames = None
+        for ident, info in list(_inflight_requests.items()):
+            if info['reported'] or now - info['started'] < SLOW_REQUEST_DEADLINE_S:
+                continue
+            if frames is None:
+                frames = sys._current_frames()
+            frame = frames.get(ident)
+            sql = info['sql']
+            record = {
+                'event': 'slow_request',
+                'deadline_s': SLOW_REQUEST_DEADLINE_S,
+                'elapsed_s': round(now - info['started'], 3),
+                'method': info['method'],
+                'path': info['path'],
+                'endpoint': info['endpoint'],
+                'participant_id': info['participant_id'],
+                'worker_pid': os.getpid(),
+                'thread_id': ident,
+                'sql': sql,
+                'sql_elapsed_s': round(now - info['sql_started'], 3) if sql else None,
+                'stack': traceback.format_stack(frame) if frame is not None else None,
+            }
+            info['reported'] = True
+            app.logger.warning("slow request", extra={'fields': record})
+
+
+def _ensure_watchdog_started():
+    """Start the watchdog thread once per process (threads do not survive fork)."""
+    global _watchdog_pid
+    if _watchdog_pid == os.getpid() or SLOW_REQUEST_DEADLINE_S <= 0:
+        return
+    with _watchdog_lock:
+        if _watchdog_pid == os.getpid():
+            return
+        _inflight_requests.clear()
+        threading.Thread(target=_watchdog_loop, name="slow-request-watchdog", daemon=True).start()
+        _watchdog_pid = os.getpid()
+
+
+@app.before_request
+def _watchdog_register_request():
+    _ensure_watchdog_started()
+    _inflight_requests[threading.get_ident()] = {
+        'started': time.monotonic(),
+        'method': request.method,
+        'path': request.path,
+        'endpoint': request.endpoint,
+        'participant_id': request.args.get('PROLIFIC_PID') or session.get('prolific_id'),
+        'sql': None,
+        'sql_started': None,
+        'reported': False,
+    }
+
+
+@app.teardown_request
+def _watchdog_unregister_request(exc=None):
+    info = _inflight_requests.pop(threading.get_ident(), None)
+    if info and info['reported']:
+        app.logger.warning("slow request finished", extra={'fields': {
+            'event': 'slow_request_finished',
+            'path': info['path'],
+            'elapsed_s': round(time.monotonic() - info['started'], 3),
+            'error': str(exc) if exc else None,
+        }})
+
+
+def _watchdog_before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    info = _inflight_requests.get(threading.get_ident())
+    if info is not None:
+        info['sql'] = statement
+        info['sql_started'] = time.monotonic()
+
+
+def _watchdog_after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    info = _inflight_requests.get(threading.get_ident())
+    if info is not None:
+        info['sql'] = None
+
+
+with app.app_context():
+    event.listen(db.engine, "before_cursor_execute", _watchdog_before_cursor_execute)
+    event.listen(db.engine, "after_cursor_execute", _watchdog_after_cursor_execute)
+
+
+# ---- Admission control ----
+# A launch sends hundreds of new participants to / and /demographics within
+# seconds. Rather than let them queue until nginx times out, a worker sheds new
+# arrivals with a small "please wait" page (503 + Retry-After, refreshing
+# itself) when either
+#   - it already has ADMISSION_MAX_INFLIGHT requests in flight (0 = no cap), or
+#   - the request waited longer than ADMISSION_MAX_QUEUE_MS before reaching
+#     the app, measured from nginx's X-Request-Start header (see deploy/).
+# Participants already in the study (session['round'] set by demographics)
+# and POSTs of the study forms, which carry answers, are always admitted, so
+# people mid-study are never turned away; with ADMISSION_MAX_INFLIGHT below
+# the worker's thread count the remaining threads stay free for them. RUM
+# beacons (/rum) are never prioritised, whoever sends them: under the same
+# conditions they are dropped with a bare 503 instead of the page.
+# Counters live in shared memory created at import, so with gunicorn's
+# preload_app they add up across workers; /debug-admission shows them.
+ADMISSION_MAX_INFLIGHT = int(os.environ.get("ADMISSION_MAX_INFLIGHT", "0"))
+ADMISSION_MAX_QUEUE_MS = float(os.environ.get("ADMISSION_MAX_QUEUE_MS", "3000"))
+ADMISSION_RETRY_AFTER_S = int(os.environ.get("ADMISSION_RETRY_AFTER_S", "5"))
+_ADMISSION_COUNTERS = ('admitted_new', 'admitted_in_study', 'shed_inflight', 'shed_queue_age')
+_admission_counts = multiprocessing.Array('q', len(_ADMISSION_COUNTERS))
+_ADMISSION_FORM_ENDPOINTS = frozenset({'demographics', 'pre_questionnaire', 'instructions', 'article'})
+_ADMISSION_BEST_EFFORT_ENDPOINTS = frozenset({'rum_ingest'})
+_admission_inflight = 0
+_admission_lock = threading.Lock()
+
+
+def _count_admission(name: str):
+    with _admission_counts.get_lock():
+        _admission_counts[_ADMISSION_COUNTERS.index(name)] += 1
+
+
+def _request_queue_ms() -> float | None:
+    """Time since nginx received the request, from `X-Request-Start: t=<epoch seconds>`."""
+    raw = request.headers.get('X-Request-Start', '')
+    try:
+        started = float(raw[2:] if raw.startswith('t=') else raw)
+    except ValueError:
+        return None
+    # Accept milliseconds or microseconds too, as other proxies send them.
+    while started > 1e11:
+        started /= 1000
+    return max(0.0, (time.time() - started) * 1000)
+
+
+@app.before_request
+def _admit_request():
+    global _admission_inflight
+    if request.endpoint == 'static':
+        return None
+    best_effort = request.endpoint in _ADMISSION_BEST_EFFORT_ENDPOINTS
+    in_study = not best_effort and (
+        'round' in session
+        or (request.method == 'POST' and request.endpoint in _ADMISSION_FORM_ENDPOINTS)
+        or _admin_allowed()
+    )
+    queue_ms = None if in_study else _request_queue_ms()
+    if ADMISSION_MAX_QUEUE_MS and queue_ms is not None and queue_ms > ADMISSION_MAX_QUEUE_MS:
+        reason = 'shed_queue_age'
+    else:
+        with _admission_lock:
+            if not in_study and 0 < ADMISSION_MAX_INFLIGHT <= _admission_inflight:
+                reason = 'shed_inflight'
+            else:
+                _admission_inflight += 1
+                g._admitted = True
+                reason = None
+        if reason is None:
+            _count_admission('admitted_in_study' if in_study else 'admitted_new')
+            return None
+    _count_admission(reason)
+    app.logger.info("request shed", extra={'fields': {
+        'event': 'request_shed', 'reason': reason, 'path': request.path,
+        'inflight': _admission_inflight, 'queue_ms': round(queue_ms) if queue_ms is not None else None,
+    }})
+    if best_effort:
+        return Response(status=503, headers={'Retry-After': str(ADMISSION_RETRY_AFTER_S), 'Cache-Control': 'no-store'})
+    return _please_wait_response()
+
+
+def _please_wait_response(message: str | None = None):
+    """503 + Retry-After with the self-refreshing please_wait page."""
+    headers = {'Retry-After': str(ADMISSION_RETRY_AFTER_S), 'Cache-Control': 'no-store'}
+    body = render_template('please_wait.html', retry_after=ADMISSION_RETRY_AFTER_S, message=message)
+    return Response(body, status=503, headers=headers)
+
+
+@app.teardown_request
+def _release_admission(exc=None):
+    global _admission_inflight
+    if g.pop('_admitted', False):
+        with _admission_lock:
+            _admission_inflight -= 1
+
+
+@app.route('/debug-admission')
+@admin_only
+def debug_admission():
+    """Admission counters (all workers with preload_app); ?reset=1 zeroes them."""
+    if request.args.get('reset') == '1':
+        with _admission_counts.get_lock():
+            for i in range(len(_ADMISSION_COUNTERS)):
+                _admission_counts[i] = 0
+    with _admission_counts.get_lock():
+        counts = dict(zip(_ADMISSION_COUNTERS, _admission_counts[:]))
+    return {
+        'max_inflight': ADMISSION_MAX_INFLIGHT,
+        'max_queue_ms': ADMISSION_MAX_QUEUE_MS,
+        'retry_after_s': ADMISSION_RETRY_AFTER_S,
+        'counts': counts,
+        'worker': {'pid': os.getpid(), 'inflight': _admission_inflight},
+    }
+
+
+# ---- SQL query budgets ----
+# Maximum SQL statements per (endpoint, method) on the participant path. Every
+# request counts its statements; going over budget logs a warning with the
+# statements, and with SQL_BUDGET_STRICT=1 raises instead (that is how
+# scripts/check_query_budgets.py fails the build on a regression).
+SQL_QUERY_BUDGETS = {
+    ('landing', 'GET'): 0,
+    ('demographics', 'GET'): 0,
+    ('demographics', 'POST'): 2,
+    ('pre_questionnaire', 'GET'): 0,
+    ('pre_questionnaire', 'POST'): 2,
+    ('instructions', 'GET'): 0,
+    ('instructions', 'POST'): 0,
+    ('article', 'GET'): 1,
+    ('article', 'POST'): 3,
+    ('thank_you', 'GET'): 0,
+}
+SQL_BUDGET_STRICT = _get_bool_env("SQL_BUDGET_STRICT", default=False)
+
+
+class SqlBudgetExceeded(RuntimeError):
+    pass
+
+
+def _count_sql_statement(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context():
+        g.setdefault('_sql_statements', []).append(statement)
+
+
+with app.app_context():
+    event.listen(db.engine, "before_cursor_execute", _count_sql_statement)
+
+
+@app.after_request
+def _check_sql_budget(response):
+    statements = g.get('_sql_statements') or []
+    budget = SQL_QUERY_BUDGETS.get((request.endpoint, request.method))
+    if budget is None or len(statements) <= budget:
+        return response
+    fields = {
+        'event': 'sql_budget_exceeded',
+        'endpoint': request.endpoint,
+        'method': request.method,
+        'statements': len(statements),
+        'budget': budget,
+        'sql': statements,
+    }
+    if SQL_BUDGET_STRICT:
+        raise SqlBudgetExceeded(
+            f"{request.method} {request.endpoint}: {len(statements)} SQL statements (budget {budget})\n"
+            + "\n".join(statements)
+        )
+    app.logger.warning("sql budget exceeded", extra={'fields': fields})
+    return response
+
+
 def _ensure_round_flat_columns():
     """Lightweight SQLite migration: add missing flattened columns to `round`.
 
@@ -230,23 +975,19 @@ def _ensure_round_flat_columns():
             return
 
         desired_cols = {
-            'main_article_stable_id': 'TEXT',
-            'main_article_title': 'TEXT',
-            'main_topic': 'TEXT',
-            'selected_rec_stable_id': 'TEXT',
-            'selected_rec_title': 'TEXT',
+            'main_article_ref': 'INTEGER',
+            'main_topic_ref': 'INTEGER',
+            'selected_rec_article_ref': 'INTEGER',
             'selected_rec_pos': 'INTEGER',
             'changing_label_rec_pos': 'INTEGER',
-            'rec0_stable_id': 'TEXT',
-            'rec0_title': 'TEXT',
+            'rec0_article_ref': 'INTEGER',
             'rec0_likelihood': 'INTEGER',
             'rec0_preference_fit': 'INTEGER',
             'rec0_constructive': 'INTEGER',
             'rec0_understandable': 'INTEGER',
             'rec0_trustworthy': 'INTEGER',
             'rec0_relevant': 'INTEGER',
-            'rec1_stable_id': 'TEXT',
-            'rec1_title': 'TEXT',
+            'rec1_article_ref': 'INTEGER',
             'rec1_likelihood': 'INTEGER',
             'rec1_preference_fit': 'INTEGER',
             'rec1_constructive': 'INTEGER',
@@ -268,10 +1009,10 @@ def _ensure_round_flat_columns():
             'label_influenced': 'INTEGER',
             'label_attention': 'INTEGER',
             'label_more': 'INTEGER',
-            'rec0_topic': 'TEXT',
-            'rec1_topic': 'TEXT',
-            'rec0_label_text': 'TEXT',
-            'rec1_label_text': 'TEXT',
+            'rec0_topic_ref': 'INTEGER',
+            'rec1_topic_ref': 'INTEGER',
+            'rec0_label_ref': 'INTEGER',
+            'rec1_label_ref': 'INTEGER',
 
             # Rating-box attention check (round 3 only)
             'rb_attention_check': 'INTEGER',
@@ -324,79 +1065,25 @@ def _ensure_participant_flat_columns():
             'pre_avoid_other': 'TEXT',
             # explanation pair tracking
             'explanation_pair': 'TEXT',
+            'timestamp_updated': 'DATETIME',
         }
 
         for col_name, col_type in desired_cols.items():
             if col_name in existing_cols:
                 continue
             conn.exec_driver_sql(f'ALTER TABLE "participant" ADD COLUMN {col_name} {col_type}')
-
-
-def _sync_participant_flat_columns(participant: Participant, section: str, data: dict):
-    """Keep flattened participant columns in sync with stored JSON payloads."""
-    if not participant or not isinstance(data, dict):
-        return
-
-    def _as_text(v):
-        if v is None:
-            return None
-        s = str(v).strip()
-        return s if s else None
-
-    if section == 'demographics':
-        participant.demo_gender = _as_text(data.get('gender'))
-        participant.demo_age = data.get('age') if isinstance(data.get('age'), int) else None
-        participant.demo_age_group = _as_text(data.get('age_group'))
-        participant.demo_country = _as_text(data.get('state') or data.get('country'))
-        participant.demo_education = _as_text(data.get('education'))
-        participant.demo_political_leaning = _as_text(data.get('political_leaning'))
-
-    if section == 'pre_questionnaire':
-        participant.pre_news_frequency = _as_text(data.get('news_frequency'))
-        participant.pre_platform = _as_text(data.get('platform'))
-        participant.pre_favourite_topic_1 = _as_text(data.get('favourite_topic_1'))
-        participant.pre_least_favourite_topic_1 = _as_text(data.get('least_favourite_topic_1'))
-        participant.pre_favourite_topic_2 = _as_text(data.get('favourite_topic_2'))
-        participant.pre_least_favourite_topic_2 = _as_text(data.get('least_favourite_topic_2'))
-        participant.pre_enjoy_topic_1 = _as_text(data.get('enjoy_topic_1'))
-        participant.pre_enjoy_topic_2 = _as_text(data.get('enjoy_topic_2'))
-        participant.pre_avoid_topic_1 = _as_text(data.get('avoid_topic_1'))
-        participant.pre_avoid_topic_2 = _as_text(data.get('avoid_topic_2'))
-        participant.pre_attention_check = _as_text(data.get('attention_check'))
-        participant.pre_avoid_news = _as_text(data.get('avoid_news'))
-
-        reasons = data.get('avoid_reasons')
-        if isinstance(reasons, list):
-            participant.pre_avoid_reasons = json.dumps(reasons, ensure_ascii=False)
-        else:
-            participant.pre_avoid_reasons = _as_text(reasons)
-
-        participant.pre_avoid_other = _as_text(data.get('avoid_other'))
-
-
-def _backfill_participant_flat_columns():
-    """Backfill flattened participant columns from existing JSON payloads."""
-    try:
-        participants = Participant.query.all()
-    except Exception:
-        return
-
-    updated = 0
-    for p in participants:
-        if isinstance(p.demographics, dict):
-            _sync_participant_flat_columns(p, 'demographics', p.demographics)
-            updated += 1
-        if isinstance(p.pre_questionnaire, dict):
-            _sync_participant_flat_columns(p, 'pre_questionnaire', p.pre_questionnaire)
-            updated += 1
-
-    if updated:
-        db.session.commit()
+        if 'timestamp_updated' not in existing_cols:
+            # Best guess for rows saved before the column existed: the post-
+            # questionnaire is saved right after the last round.
+            conn.exec_driver_sql(
+                'UPDATE "participant" SET timestamp_updated = COALESCE('
+                '(SELECT MAX(r.timestamp) FROM "round" r WHERE r.participant_id = participant.id), timestamp_start)'
+            )
+        conn.commit()
 
 
 with app.app_context():
     _ensure_participant_flat_columns()
-    _backfill_participant_flat_columns()
 
 
 RESPONSES_DIR = "responses"
@@ -408,7 +1095,8 @@ def setup_session_and_redirects():
     if pid:
         session['prolific_id'] = pid
 
-    allowed_routes = {'landing', 'static'}
+    # rum_ingest answers 403 itself: a beacon should not be redirected to the landing page.
+    allowed_routes = {'landing', 'static', 'rum_ingest'}
 
     # Redirect to landing if no Prolific ID
     if not session.get('prolific_id') and request.endpoint not in allowed_routes:
@@ -445,6 +1133,254 @@ def require_session_flag(flag_name: str, redirect_endpoint: str = 'landing'):
 
     return wrapper
 
+
+# ---- Idempotent form submissions ----
+# Every study form carries a one-time hidden form_token ({{ form_token() }}).
+# The first POST with a token runs the view; when that ends in a redirect, the
+# redirect and the session it left behind are kept for FORM_TOKEN_TTL_S. A
+# repeat of the token (double-click, browser resubmit, proxy retry) gets the
+# same redirect without running the view, so nothing is written twice and the
+# round cannot advance twice. After a double-click the browser may never have
+# received the first response's cookie; if the repeat's session is still at
+# the progress point the first submission started from, the session the first
+# submission produced is replayed too. Any other repeat (e.g. an old form
+# resubmitted from the back history) is sent to the participant's current
+# step with the session untouched. A repeat that arrives while the first is
+# still running waits for it, up to _FORM_REPLAY_WAIT_S; if the first is still
+# running then, the repeat gets the please-wait page rather than running the
+# view a second time. The view runs again only when the first submission has
+# finished without a redirect (it failed or re-rendered the form).
+# The cache is per process: a repeat served by another gunicorn worker than
+# the original is not recognised and runs the view again.
+FORM_TOKEN_TTL_S = float(os.environ.get("FORM_TOKEN_TTL_S", "900"))
+FORM_TOKEN_CACHE_SIZE = int(os.environ.get("FORM_TOKEN_CACHE_SIZE", "10000"))
+_FORM_REPLAY_WAIT_S = 30
+_form_results: OrderedDict[tuple, dict] = OrderedDict()
+_form_results_lock = threading.Lock()
+
+
+@app.context_processor
+def _form_token_helper():
+    return {'form_token': lambda: secrets.token_urlsafe(16)}
+
+
+def _expire_form_results(now: float):
+    """Drop entries past the TTL or over the size cap; oldest first. Caller holds the lock."""
+    while _form_results:
+        entry = next(iter(_form_results.values()))
+        if len(_form_results) <= FORM_TOKEN_CACHE_SIZE and now - entry['at'] < FORM_TOKEN_TTL_S:
+            break
+        _form_results.popitem(last=False)
+
+
+def _study_progress() -> tuple:
+    """Where the session is in the study; two equal values mean the same step and round."""
+    return (
+        session.get('round'),
+        *(bool(session.get(f'{step}_completed')) for step in
+          ('demographics', 'pre_questionnaire', 'instructions', 'study')),
+    )
+
+
+def _current_step_url() -> str:
+    """URL of the step the session is currently on."""
+    if session.get('study_completed'):
+        return url_for('thank_you')
+    if session.get('instructions_completed'):
+        article_id = session.get('next_article') if session.get('round', 1) > 1 else session.get('first_article_id')
+        return url_for('article', article_id=article_id)
+    if session.get('pre_questionnaire_completed'):
+        return url_for('instructions')
+    if session.get('demographics_completed'):
+        return url_for('pre_questionnaire')
+    return url_for('demographics')
+
+
+def idempotent_form(f):
+    """Answer repeats of a POST's form_token with the first submission's redirect."""
+
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        token = request.form.get('form_token') if request.method == 'POST' else None
+        if not token:
+            return f(*args, **kwargs)
+        key = (session.get('prolific_id'), request.path, token)
+        now = time.monotonic()
+        with _form_results_lock:
+            _expire_form_results(now)
+            entry = _form_results.get(key)
+            repeat = entry is not None
+            if not repeat:
+                entry = _form_results[key] = {
+                    'at': now, 'done': threading.Event(), 'progress': _study_progress(),
+                    'location': None, 'session': None,
+                }
+
+        if repeat:
+            if not entry['done'].wait(_FORM_REPLAY_WAIT_S):
+                app.logger.warning("form resubmission while the first is still running", extra={'fields': {
+                    'event': 'form_replay_timeout', 'path': request.path, 'age_s': round(time.monotonic() - entry['at'], 3),
+                }})
+                return _please_wait_response('Your answers are still being saved.')
+            if entry['location'] is None:
+                # The first submission failed or re-rendered the form: process this one.
+                return f(*args, **kwargs)
+            replay = _study_progress() == entry['progress']
+            app.logger.info("form resubmission replayed", extra={'fields': {
+                'event': 'form_replayed', 'path': request.path,
+                'age_s': round(now - entry['at'], 3), 'session_replayed': replay,
+            }})
+            if not replay:
+                return redirect(_current_step_url())
+            session.clear()
+            session.update(entry['session'])
+            return redirect(entry['location'])
+
+        location = None
+        try:
+            response = f(*args, **kwargs)
+            if getattr(response, 'status_code', None) in (301, 302, 303, 307, 308):
+                location = response.location
+            return response
+        finally:
+            with _form_results_lock:
+                if location is None:
+                    _form_results.pop(key, None)
+                else:
+                    entry['session'] = dict(session)
+                    entry['location'] = location
+            entry['done'].set()
+
+    return decorated_function
+
+# ---- Study funnel: step entry/exit tracking ----
+# A step is entered when its page is first rendered (GET 200) and exited when
+# the participant first renders a later step. The session keeps the furthest
+# step reached, so going back (or being redirected back to the current step)
+# logs nothing and every step is entered at most once per participant. Events
+# are buffered in memory and written in batches by a background thread, which
+# also updates the running counters and latency histogram that /debug-funnel
+# reads.
+STUDY_STEPS = (
+    ['landing', 'demographics', 'pre_questionnaire', 'instructions']
+    + [f'article_{n}' for n in range(1, STUDY_TOTAL_ROUNDS + 1)]
+    + ['thank_you']
+)
+STUDY_STEP_CODES = {name: code for code, name in enumerate(STUDY_STEPS, start=1)}
+FUNNEL_FLUSH_INTERVAL_S = float(os.environ.get("FUNNEL_FLUSH_INTERVAL_S", "5"))
+# Quarter-octave buckets: each bucket spans ~19% of its lower bound.
+_FUNNEL_BUCKETS_PER_OCTAVE = 4
+
+_funnel_buffer: list[dict] = []
+_funnel_lock = threading.Lock()
+_funnel_flusher_pid = None
+
+
+def _funnel_step_for_request() -> str | None:
+    if request.endpoint == 'article':
+        return f"article_{session.get('round', 1)}"
+    return request.endpoint if request.endpoint in STUDY_STEP_CODES else None
+
+
+def _funnel_bucket(duration_ms: int) -> int:
+    return int(math.log2(max(duration_ms, 1)) * _FUNNEL_BUCKETS_PER_OCTAVE)
+
+
+def _funnel_bucket_upper_ms(bucket: int) -> int:
+    return int(2 ** ((bucket + 1) / _FUNNEL_BUCKETS_PER_OCTAVE))
+
+
+def _funnel_flush():
+    with _funnel_lock:
+        batch = _funnel_buffer[:]
+        _funnel_buffer.clear()
+    if not batch:
+        return
+
+    stats: dict[int, list[int]] = {}
+    hist: dict[tuple[int, int], int] = {}
+    for ev in batch:
+        entered_exited = stats.setdefault(ev['step'], [0, 0])
+        entered_exited[ev['kind']] += 1
+        if ev['kind'] == 1 and ev['duration_ms'] is not None:
+            key = (ev['step'], _funnel_bucket(ev['duration_ms']))
+            hist[key] = hist.get(key, 0) + 1
+
+    try:
+        with app.app_context(), db.engine.begin() as conn:
+            conn.execute(StepEvent.__table__.insert(), batch)
+            conn.exec_driver_sql(
+                "INSERT INTO step_stat (step, entered, exited) VALUES (?, ?, ?) "
+                "ON CONFLICT(step) DO UPDATE SET entered = entered + excluded.entered, "
+                "exited = exited + excluded.exited",
+                [(step, e, x) for step, (e, x) in stats.items()],
+            )
+            if hist:
+                conn.exec_driver_sql(
+                    "INSERT INTO step_latency_hist (step, bucket, count) VALUES (?, ?, ?) "
+                    "ON CONFLICT(step, bucket) DO UPDATE SET count = count + excluded.count",
+                    [(step, bucket, n) for (step, bucket), n in hist.items()],
+                )
+    except Exception as e:
+        app.logger.warning("failed to flush funnel events", extra={'fields': {'events': len(batch), 'error': str(e)}})
+
+
+def _funnel_flush_loop():
+    while True:
+        time.sleep(FUNNEL_FLUSH_INTERVAL_S)
+        _funnel_flush()
+
+
+def _ensure_funnel_flusher_started():
+    global _funnel_flusher_pid
+    if _funnel_flusher_pid == os.getpid():
+        return
+    with _funnel_lock:
+        if _funnel_flusher_pid == os.getpid():
+            return
+        _funnel_buffer.clear()
+        threading.Thread(target=_funnel_flush_loop, name="funnel-flusher", daemon=True).start()
+        _funnel_flusher_pid = os.getpid()
+
+
+atexit.register(_funnel_flush)
+
+
+@app.after_request
+def _track_funnel_step(response):
+    if request.method != 'GET' or response.status_code != 200:
+        return response
+    step = _funnel_step_for_request()
+    pid = session.get('prolific_id')
+    if step is None or not pid:
+        return response
+
+    code = STUDY_STEP_CODES[step]
+    previous = session.get('funnel_step')
+    if previous is not None and code <= previous:
+        # Reload, or a step the participant already passed.
+        return response
+
+    now_ms = int(time.time() * 1000)
+    events = []
+    if previous in STUDY_STEP_CODES.values():
+        events.append({
+            'prolific_id': pid,
+            'step': previous,
+            'kind': 1,
+            'ts_ms': now_ms,
+            'duration_ms': max(0, now_ms - int(session.get('funnel_step_at') or now_ms)),
+        })
+    events.append({'prolific_id': pid, 'step': code, 'kind': 0, 'ts_ms': now_ms, 'duration_ms': None})
+    session['funnel_step'] = code
+    session['funnel_step_at'] = now_ms
+
+    _ensure_funnel_flusher_started()
+    with _funnel_lock:
+        _funnel_buffer.extend(events)
+    return response
+
+
 @app.route('/set-condition/<cond>')
 def set_condition(cond):
     if cond in ['color', 'no_color', 'c2pa', 'nolabel']:
@@ -456,36 +1392,106 @@ def set_condition(cond):
 # Load articles from SQLite database
 
 _BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-ARTICLES_DB_PATH = os.path.join(_BASE_DIR, "article_selection.db")
-conn = sqlite3.connect(ARTICLES_DB_PATH)
-raw_df = pd.read_sql_query("SELECT * FROM new_articles", conn)
-conn.close()
-
-# The first row contains the actual headers
-headers = list(raw_df.iloc[0])
-raw_df = raw_df[1:].copy()
-raw_df.columns = [str(h).strip() for h in headers]
-
-# Pick topic/category column
-if 'field20' in raw_df.columns:
-    # Study uses field20 as the canonical topic column.
-    TOPIC_COL = 'field20'
-elif 'topic' in raw_df.columns:
-    TOPIC_COL = 'topic'
-elif 'Category' in raw_df.columns:
-    TOPIC_COL = 'Category'
-elif '_cached_topics' in raw_df.columns:
-    TOPIC_COL = '_cached_topics'
-else:
-    nunique = raw_df.nunique(dropna=True)
-    small_cols = [c for c in raw_df.columns if 1 < nunique.get(c, 0) <= 50]
-    TOPIC_COL = small_cols[0] if small_cols else raw_df.columns[0]
-
-df = raw_df.reset_index(drop=True).copy()
-df.reset_index(inplace=True)
-app.logger.info("Loaded articles from DB. Columns: %s", df.columns.tolist())
+ARTICLES_DB_PATH = os.environ.get("ARTICLES_DB_PATH") or os.path.join(_BASE_DIR, "article_selection.db")
+
+
+def load_article_catalog(path: str) -> tuple[pd.DataFrame, str]:
+    """Load the `new_articles` table and return (df, topic column).
+
+    The first data row of `new_articles` holds the real column headers.
+    The returned df has an extra `index` column (0..n-1) used as the article id.
+    """
+    conn = sqlite3.connect(path)
+    raw_df = pd.read_sql_query("SELECT * FROM new_articles", conn)
+    conn.close()
+
+    # The first row contains the actual headers
+    headers = list(raw_df.iloc[0])
+    raw_df = raw_df[1:].copy()
+    raw_df.columns = [str(h).strip() for h in headers]
+
+    # Pick topic/category column
+    if 'field20' in raw_df.columns:
+        # Study uses field20 as the canonical topic column.
+        topic_col = 'field20'
+    elif 'topic' in raw_df.columns:
+        topic_col = 'topic'
+    elif 'Category' in raw_df.columns:
+        topic_col = 'Category'
+    elif '_cached_topics' in raw_df.columns:
+        topic_col = '_cached_topics'
+    else:
+        nunique = raw_df.nunique(dropna=True)
+        small_cols = [c for c in raw_df.columns if 1 < nunique.get(c, 0) <= 50]
+        topic_col = small_cols[0] if small_cols else raw_df.columns[0]
+
+    catalog = raw_df.reset_index(drop=True).copy()
+    catalog.reset_index(inplace=True)
+    return catalog, topic_col
+
+
+@dataclass(frozen=True)
+class ArticleCatalog:
+    """The article catalog, built once per worker and only read afterwards.
+
+    Requests look articles up by id and sample them by topic from the plain
+    dict/tuple indexes, so threads and greenlets share it without locks;
+    `frame` is kept for the debug endpoints and scripts and must not be mutated.
+    """
+    frame: pd.DataFrame
+    topic_col: str
+    records: Mapping[int, Mapping]  # article id -> raw catalog row
+    ids: tuple[int, ...]
+    by_topic: Mapping[str, tuple[int, ...]]  # normalized topic -> article ids
+
+    @classmethod
+    def from_frame(cls, frame: pd.DataFrame, topic_col: str) -> 'ArticleCatalog':
+        records = {}
+        by_topic: dict[str, list[int]] = {}
+        for row in frame.to_dict(orient='records'):
+            article_id = int(row['index'])
+            records[article_id] = MappingProxyType(row)
+            by_topic.setdefault(_normalize_topic_value(row.get(topic_col)), []).append(article_id)
+        return cls(
+            frame=frame,
+            topic_col=topic_col,
+            records=MappingProxyType(records),
+            ids=tuple(records),
+            by_topic=MappingProxyType({topic: tuple(ids) for topic, ids in by_topic.items()}),
+        )
+
+
+def _normalize_topic_value(val) -> str:
+    if val is None:
+        return ''
+    if isinstance(val, (list, tuple)):
+        val = val[0] if val else ''
+    return str(val).strip().lower()
+
+
+CATALOG = ArticleCatalog.from_frame(*load_article_catalog(ARTICLES_DB_PATH))
+TOPIC_COL = CATALOG.topic_col
+app.logger.info("Loaded articles from DB. Columns: %s", CATALOG.frame.columns.tolist())
 app.logger.info("Using topic column: %s", TOPIC_COL)
 
+# ---- Per-participant randomness ----
+# Every randomized decision draws from its own random.Random seeded with
+# STUDY_RNG_SEED, the participant's Prolific ID and what is being decided, so
+# no generator is shared between threads and a participant's assignments can
+# be reproduced from the same catalog and answers.
+STUDY_RNG_SEED = os.environ.get("STUDY_RNG_SEED", "")
+
+
+def participant_rng(*purpose) -> random.Random:
+    """Generator for one decision of the current participant, e.g. participant_rng('round', 2).
+
+    Unseeded when there is no participant in the session.
+    """
+    pid = session.get('prolific_id') if has_request_context() else None
+    if not pid:
+        return random.Random()
+    return random.Random(':'.join(str(part) for part in (STUDY_RNG_SEED, pid, *purpose)))
+
 
 # Social-influence labels shown above recommendation cards.
 FAV_REC_LABEL = "You might also like this article:"
@@ -507,6 +1513,609 @@ LEAST_REC_LABELS = [
 # ]
 
 
+# ---- Flattened analysis columns (SQLite triggers) ----
+# The flattened `round` and `participant` columns are derived in SQLite from the
+# stored JSON payloads, so writes only store the payload. Each source column
+# gets an AFTER INSERT and an AFTER UPDATE OF trigger that recomputes its
+# flattened columns with json_extract. The trigger SQL is generated from the
+# expression specs below; _ensure_flat_triggers() (re)installs a trigger when
+# its definition changes. Plain columns rather than generated columns because
+# SQLite cannot turn the existing columns of deployed databases into generated
+# ones without rebuilding the tables.
+#
+# Topics come from the catalog (a different database), so the article POST
+# stores them in the payload (`main_topic`, `recommendations_topics`).
+
+
+def _sql_text(expr: str) -> str:
+    """Trimmed text value, '' as NULL."""
+    return f"NULLIF(TRIM(CAST({expr} AS TEXT)), '')"
+
+
+def _sql_int(expr: str) -> str:
+    """Integer value of a JSON number or numeric string, else NULL."""
+    digits = f"LTRIM(TRIM(CAST({expr} AS TEXT)), '-')"
+    return f"(CASE WHEN {digits} GLOB '[0-9]*' AND {digits} NOT GLOB '*[^0-9]*' THEN CAST(TRIM({expr}) AS INTEGER) END)"
+
+
+def _sql_quote(value: str) -> str:
+    return "'" + value.replace("'", "''") + "'"
+
+
+def _round_text_exprs(a: str) -> dict:
+    """Text fields of the article payload `a`; stored via the dimension tables (ROUND_DIM_REFS)."""
+    def j(path):
+        return f"json_extract({a}, '{path}')"
+
+    text = {
+        'main_article_stable_id': j('$.main_article_stable_id'),
+        'main_article_title': j('$.main_article_title'),
+        'main_topic': j('$.main_topic'),
+        'selected_rec_stable_id': j('$.selected_recommendation_stable_id'),
+        'selected_rec_title': j('$.selected_recommendation_title'),
+    }
+    for pos in (0, 1):
+        rec_id = j(f'$.recommendations[{pos}]')
+        text[f'rec{pos}_stable_id'] = j(f'$.recommendations_stable_ids[{pos}]')
+        text[f'rec{pos}_title'] = j(f'$.recommendations_titles[{pos}]')
+        text[f'rec{pos}_topic'] = j(f'$.recommendations_topics[{pos}]')
+        text[f'rec{pos}_label_text'] = f"""json_extract({a}, '$.recommendations_labels."' || {rec_id} || '"')"""
+    return text
+
+
+# ref column on `round` -> (dimension table, {dimension column: text field from _round_text_exprs}).
+# The first dimension column is its unique key.
+ROUND_DIM_REFS = {
+    'main_article_ref': ('article_dim', {'stable_id': 'main_article_stable_id', 'title': 'main_article_title'}),
+    'selected_rec_article_ref': ('article_dim', {'stable_id': 'selected_rec_stable_id', 'title': 'selected_rec_title'}),
+    'rec0_article_ref': ('article_dim', {'stable_id': 'rec0_stable_id', 'title': 'rec0_title'}),
+    'rec1_article_ref': ('article_dim', {'stable_id': 'rec1_stable_id', 'title': 'rec1_title'}),
+    'main_topic_ref': ('topic_dim', {'name': 'main_topic'}),
+    'rec0_topic_ref': ('topic_dim', {'name': 'rec0_topic'}),
+    'rec1_topic_ref': ('topic_dim', {'name': 'rec1_topic'}),
+    'rec0_label_ref': ('label_dim', {'text': 'rec0_label_text'}),
+    'rec1_label_ref': ('label_dim', {'text': 'rec1_label_text'}),
+}
+
+
+def _round_dim_sql(a: str) -> str:
+    """Trigger statements adding the payload's articles, topics and labels to the dimension tables."""
+    text = _round_text_exprs(a)
+    statements = []
+    for dim, fields in ROUND_DIM_REFS.values():
+        key = text[next(iter(fields.values()))]
+        statements.append(
+            f"INSERT OR IGNORE INTO {dim} ({', '.join(fields)}) "
+            f"SELECT {', '.join(text[f] for f in fields.values())} WHERE {key} IS NOT NULL;"
+        )
+    return '\n  '.join(statements)
+
+
+def _round_flat_exprs(a: str) -> dict:
+    """Flattened `round` columns as SQL expressions over the article payload `a`."""
+    def j(path):
+        return f"json_extract({a}, '{path}')"
+
+    text = _round_text_exprs(a)
+    rec = [j(f'$.recommendations[{pos}]') for pos in (0, 1)]
+    # A recommendation shows the changing label if its label is set and is not the favourite label.
+    changing = [
+        f"COALESCE({text[f'rec{pos}_label_text']}, '') NOT IN ('', {_sql_quote(FAV_REC_LABEL)})" for pos in (0, 1)
+    ]
+    explicit_changing = j('$.changing_label_rec_pos')
+
+    def rating_for_rec(pos, item):
+        # New payloads key ratings by rec id (`likelihood_891`), some older ones by position (`likelihood_0`).
+        by_id = f"NULLIF(json_extract({a}, '$.ratings.{item}_' || {rec[pos]}), '')"
+        return _sql_int(f"COALESCE({by_id}, {j(f'$.ratings.{item}_{pos}')})")
+
+    cols = {
+        'selected_rec_pos': (
+            f"COALESCE({j('$.selected_recommendation_pos')}, "
+            f"CASE {j('$.selected_recommendation_id')} WHEN {rec[0]} THEN 0 WHEN {rec[1]} THEN 1 END)"
+        ),
+        'changing_label_rec_pos': (
+            f"CASE WHEN CAST({explicit_changing} AS TEXT) IN ('0', '1') THEN CAST({explicit_changing} AS INTEGER) "
+            f"WHEN {changing[0]} AND NOT {changing[1]} THEN 0 "
+            f"WHEN {changing[1]} AND NOT {changing[0]} THEN 1 END"
+        ),
+    }
+    for ref, (dim, fields) in ROUND_DIM_REFS.items():
+        key_col, key_field = next(iter(fields.items()))
+        cols[ref] = f"(SELECT id FROM {dim} WHERE {key_col} = {text[key_field]})"
+    for pos in (0, 1):
+        for item in ('likelihood', 'preference_fit', 'constructive', 'understandable', 'trustworthy', 'relevant'):
+            cols[f'rec{pos}_{item}'] = rating_for_rec(pos, item)
+    # Ratings by article type (low-interest vs high-interest)
+    for kind in ('low', 'high'):
+        for item in ('preference_fit', 'constructive', 'understandable', 'trustworthy', 'relevant'):
+            cols[f'{kind}_{item}'] = _sql_int(j(f'$.ratings.{kind}_{item}'))
+    # Label items (shared) and the rating-box attention check (round 3 only)
+    for item in ('label_understandable', 'label_useful', 'label_influenced', 'label_attention', 'label_more',
+                 'rb_attention_check'):
+        cols[item] = _sql_int(j(f'$.ratings.{item}'))
+    return cols
+
+
+def _demographics_flat_exprs(d: str) -> dict:
+    def j(path):
+        return f"json_extract({d}, '{path}')"
+
+    return {
+        'demo_gender': _sql_text(j('$.gender')),
+        'demo_age': f"CASE WHEN json_type({d}, '$.age') = 'integer' THEN {j('$.age')} END",
+        'demo_age_group': _sql_text(j('$.age_group')),
+        'demo_country': _sql_text(f"COALESCE(NULLIF({j('$.state')}, ''), {j('$.country')})"),
+        'demo_education': _sql_text(j('$.education')),
+        'demo_political_leaning': _sql_text(j('$.political_leaning')),
+    }
+
+
+def _pre_questionnaire_flat_exprs(p: str) -> dict:
+    def j(path):
+        return f"json_extract({p}, '{path}')"
+
+    cols = {
+        f'pre_{key}': _sql_text(j(f'$.{key}'))
+        for key in ('news_frequency', 'platform', 'favourite_topic_1', 'least_favourite_topic_1',
+                    'favourite_topic_2', 'least_favourite_topic_2', 'enjoy_topic_1', 'enjoy_topic_2',
+                    'avoid_topic_1', 'avoid_topic_2', 'attention_check', 'avoid_news')
+    }
+    # Multi-select: stored as a JSON array string.
+    cols['pre_avoid_reasons'] = (
+        f"CASE WHEN json_type({p}, '$.avoid_reasons') = 'array' THEN {j('$.avoid_reasons')} "
+        f"ELSE {_sql_text(j('$.avoid_reasons'))} END"
+    )
+    cols['pre_avoid_other'] = _sql_text(j('$.avoid_other'))
+    return cols
+
+
+# (table, JSON source column) -> builder of {flattened column: SQL expression}
+FLAT_COLUMN_SOURCES = {
+    ('round', 'article'): _round_flat_exprs,
+    ('participant', 'demographics'): _demographics_flat_exprs,
+    ('participant', 'pre_questionnaire'): _pre_questionnaire_flat_exprs,
+}
+
+
+# Long-form ratings (`rating` table). Codes are stored, so only append new ones.
+RATING_TARGETS = {'rec0': 0, 'rec1': 1, 'low': 2, 'high': 3, 'label': 4, 'rating_box': 5}
+RATING_ITEMS = {
+    'likelihood': 1, 'preference_fit': 2, 'constructive': 3, 'understandable': 4, 'trustworthy': 5,
+    'relevant': 6, 'useful': 7, 'influenced': 8, 'attention': 9, 'more': 10, 'attention_check': 11,
+}
+# flattened `round` column -> (target, item)
+RATING_COLUMNS = {
+    **{f'rec{pos}_{item}': (f'rec{pos}', item) for pos in (0, 1)
+       for item in ('likelihood', 'preference_fit', 'constructive', 'understandable', 'trustworthy', 'relevant')},
+    **{f'{kind}_{item}': (kind, item) for kind in ('low', 'high')
+       for item in ('preference_fit', 'constructive', 'understandable', 'trustworthy', 'relevant')},
+    **{f'label_{item}': ('label', item) for item in ('understandable', 'useful', 'influenced', 'attention', 'more')},
+    'rb_attention_check': ('rating_box', 'attention_check'),
+}
+
+
+def _rating_rows_sql() -> str:
+    """Trigger statements replacing a round's `rating` rows with its answered flattened ratings."""
+    selects = '\n    UNION ALL '.join(
+        f'SELECT {RATING_TARGETS[target]} AS target, {RATING_ITEMS[item]} AS item_code, {col} AS value '
+        f'FROM "round" WHERE id = NEW.id'
+        for col, (target, item) in RATING_COLUMNS.items()
+    )
+    return (
+        'DELETE FROM rating WHERE round_id = NEW.id;\n'
+        '  INSERT INTO rating (round_id, target, item_code, value)\n'
+        f'  SELECT NEW.id, target, item_code, value FROM (\n    {selects}\n  ) WHERE value IS NOT NULL;'
+    )
+
+
+# (table, JSON source column) -> extra trigger statements: 'before' / 'after' the flattening
+# UPDATE (built from the source expression) and on 'delete' of the row.
+FLAT_TRIGGER_EXTRA = {
+    ('round', 'article'): {
+        'before': _round_dim_sql,
+        'after': lambda src: _rating_rows_sql(),
+        'delete': 'DELETE FROM rating WHERE round_id = OLD.id;',
+    },
+}
+
+# Text columns that older databases still have on `round` (replaced by the *_ref
+# columns). The triggers set them to NULL so re-flattened rows shrink. Until a
+# row is re-flattened its text is read from them (_round_text_columns), and
+# the backfill job starts by itself while any row still has some
+# (_start_legacy_backfill).
+LEGACY_FLAT_COLUMNS = {'round': tuple(_round_text_exprs('NULL'))}
+# Set by _ensure_flat_triggers(): the LEGACY_FLAT_COLUMNS['round'] this database
+# has, and whether rounds still hold text in them.
+_legacy_round_columns: tuple = ()
+_legacy_backfill_pending = False
+
+
+def _flat_trigger_sql(existing_columns: dict) -> dict:
+    """{trigger name: CREATE TRIGGER statement} for every flattened source column.
+
+    `existing_columns` maps table -> its current column names (for LEGACY_FLAT_COLUMNS).
+    """
+    triggers = {}
+    for (table, source), build in FLAT_COLUMN_SOURCES.items():
+        src = f'NEW.{source}'
+        exprs = build(src)
+        for col in LEGACY_FLAT_COLUMNS.get(table, ()):
+            if col in existing_columns.get(table, ()):
+                exprs[col] = 'NULL'
+        assignments = ',\n    '.join(f'{col} = {expr}' for col, expr in exprs.items())
+        is_object = f"CASE WHEN json_valid({src}) THEN json_type({src}) END = 'object'"
+        extra = FLAT_TRIGGER_EXTRA.get((table, source), {})
+        before = f"{extra['before'](src)}\n  " if 'before' in extra else ''
+        after = f"\n  {extra['after'](src)}" if 'after' in extra else ''
+        for event, when in (('insert', 'INSERT'), ('update', f'UPDATE OF {source}')):
+            name = f'{table}_flatten_{source}_{event}'
+            triggers[name] = (
+                f'CREATE TRIGGER {name} AFTER {when} ON "{table}"\n'
+                f'WHEN {is_object}\n'
+                f'BEGIN\n  {before}UPDATE "{table}" SET\n    {assignments}\n  WHERE id = NEW.id;{after}\nEND'
+            )
+        if 'delete' in extra:
+            name = f'{table}_flatten_{source}_delete'
+            triggers[name] = f'CREATE TRIGGER {name} AFTER DELETE ON "{table}"\nBEGIN\n  {extra["delete"]}\nEND'
+    return triggers
+
+
+def _round_text_columns() -> list:
+    """(name, expression) pairs rehydrating a round's text fields from the dimension tables.
+
+    Where the database still has the field's legacy text column, that column
+    is the fallback for rows not re-flattened yet.
+    """
+    dim_models = {'article_dim': ArticleDim, 'topic_dim': TopicDim, 'label_dim': LabelDim}
+    columns = []
+    for ref, (dim, fields) in ROUND_DIM_REFS.items():
+        model = dim_models[dim]
+        for dim_col, name in fields.items():
+            expr = db.select(getattr(model, dim_col)).where(model.id == getattr(Round, ref)).scalar_subquery()
+            if name in _legacy_round_columns:
+                expr = db.func.coalesce(expr, db.literal_column(f'"round".{name}'))
+            columns.append((name, expr))
+    return columns
+
+
+def _legacy_round_text_pending(conn) -> bool:
+    """Whether a round with a stored payload still has text in a legacy column."""
+    if not _legacy_round_columns:
+        return False
+    has_text = ' OR '.join(f'{col} IS NOT NULL' for col in _legacy_round_columns)
+    return bool(conn.exec_driver_sql(
+        f'SELECT EXISTS (SELECT 1 FROM "round" WHERE ({has_text}) '
+        f"AND CASE WHEN json_valid(article) THEN json_type(article) END = 'object')"
+    ).scalar())
+
+
+def _round_view_sql() -> str:
+    """`round_view`: every `round` column plus the rehydrated text, for analysts."""
+    query = db.select(*Round.__table__.columns, *[expr.label(name) for name, expr in _round_text_columns()])
+    compiled = query.compile(dialect=db.engine.dialect, compile_kwargs={'literal_binds': True})
+    return f'CREATE VIEW round_view AS\n{compiled}'
+
+
+# ---- Payload archive ----
+# Rows the study no longer writes to (older than PAYLOAD_ARCHIVE_MIN_AGE_H)
+# whose flattened columns match what the triggers compute from their payload
+# can have their raw JSON moved into `payload_archive` by
+# `flask --app app archive-payloads`: compressed with zstd if `zstandard` is
+# installed, else zlib, and the live column cleared. raw_payload() reads
+# either place. Re-flattening (backfill job, changed participant triggers)
+# restores archived payloads first.
+PAYLOAD_ARCHIVE_MIN_AGE_H = float(os.environ.get("PAYLOAD_ARCHIVE_MIN_AGE_H", "24"))
+ARCHIVED_PAYLOAD_COLUMNS = {
+    'participant': ('demographics', 'pre_questionnaire'),
+    'round': ('article', 'theme_selection', 'mid_questionnaire'),
+}
+_ARCHIVE_AGE_COLUMNS = {'participant': 'timestamp_start', 'round': 'timestamp'}
+
+
+def _zstd_available() -> bool:
+    try:
+        import zstandard  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _compress_payload(text: str) -> tuple[str, bytes]:
+    raw = text.encode('utf-8')
+    if _zstd_available():
+        import zstandard
+        return 'zstd', zstandard.ZstdCompressor(level=10).compress(raw)
+    return 'zlib', zlib.compress(raw, 9)
+
+
+def _decompress_payload(codec: str, data: bytes) -> str:
+    if codec == 'zstd':
+        import zstandard
+        return zstandard.ZstdDecompressor().decompress(data).decode('utf-8')
+    return zlib.decompress(data).decode('utf-8')
+
+
+def raw_payload(obj, column: str):
+    """A row's JSON payload, from its live column or, once archived, from payload_archive."""
+    value = getattr(obj, column)
+    if value is not None:
+        return value
+    row = (object_session(obj) or db.session).execute(
+        db.select(PayloadArchive.codec, PayloadArchive.data).where(
+            PayloadArchive.table_name == obj.__tablename__,
+            PayloadArchive.row_id == obj.id,
+            PayloadArchive.column_name == column,
+        )
+    ).first()
+    return json.loads(_decompress_payload(*row)) if row else None
+
+
+def _archived_payloads(conn, table: str, ids=None) -> dict:
+    """{(row id, column): JSON text} archived for `table` (all rows if `ids` is None)."""
+    q = db.select(
+        PayloadArchive.row_id, PayloadArchive.column_name, PayloadArchive.codec, PayloadArchive.data
+    ).where(PayloadArchive.table_name == table)
+    if ids is not None:
+        q = q.where(PayloadArchive.row_id.in_(ids))
+    return {(row_id, column): _decompress_payload(codec, data) for row_id, column, codec, data in conn.execute(q)}
+
+
+def _unarchive_payloads(conn, table: str, ids=None) -> int:
+    """Move archived payloads back into their rows, which re-fires the flattening triggers."""
+    payloads = _archived_payloads(conn, table, ids)
+    for (row_id, column), text in payloads.items():
+        conn.exec_driver_sql(f'UPDATE "{table}" SET {column} = ? WHERE id = ?', (text, row_id))
+    if payloads:
+        q = db.delete(PayloadArchive).where(PayloadArchive.table_name == table)
+        if ids is not None:
+            q = q.where(PayloadArchive.row_id.in_(ids))
+        conn.execute(q)
+    return len(payloads)
+
+
+def _unflattened_ids(conn, table: str, ids: list[int]) -> set[int]:
+    """Ids among `ids` whose flattened columns differ from what the triggers compute now."""
+    unflattened = set()
+    marks = ','.join('?' * len(ids))
+    for (source_table, source), build in FLAT_COLUMN_SOURCES.items():
+        if source_table != table:
+            continue
+        src = f'"{table}".{source}'
+        is_object = f"CASE WHEN json_valid({src}) THEN json_type({src}) END = 'object'"
+        matches = ' AND '.join(f'{col} IS {expr}' for col, expr in build(src).items())
+        rows = conn.exec_driver_sql(
+            f'SELECT id FROM "{table}" WHERE id IN ({marks}) AND {source} IS NOT NULL '
+            f'AND NOT CASE WHEN {is_object} THEN ({matches}) ELSE 0 END',
+            tuple(ids),
+        ).all()
+        unflattened.update(row[0] for row in rows)
+    return unflattened
+
+
+def _archive_chunk(table: str, after_id: int, cutoff: datetime, chunk_size: int):
+    """Archive the next chunk of `table` rows after `after_id`.
+
+    Returns (last id seen, rows archived, rows skipped as not flattened), or None when done.
+    """
+    columns = ARCHIVED_PAYLOAD_COLUMNS[table]
+    with db.engine.begin() as conn:
+        rows = conn.exec_driver_sql(
+            f'SELECT id, {", ".join(columns)} FROM "{table}" '
+            f'WHERE id > ? AND {_ARCHIVE_AGE_COLUMNS[table]} < ? '
+            f'AND ({" OR ".join(f"{c} IS NOT NULL" for c in columns)}) ORDER BY id LIMIT ?',
+            (after_id, cutoff.strftime('%Y-%m-%d %H:%M:%S.%f'), chunk_size),
+        ).all()
+        if not rows:
+            return None
+        skipped = _unflattened_ids(conn, table, [row[0] for row in rows])
+        now = datetime.utcnow()
+        archived_ids, archive_rows = [], []
+        for row_id, *texts in rows:
+            if row_id in skipped:
+                continue
+            archived_ids.append(row_id)
+            for column, text in zip(columns, texts):
+                if text is not None:
+                    codec, data = _compress_payload(text)
+                    archive_rows.append({'table_name': table, 'row_id': row_id, 'column_name': column,
+                                         'codec': codec, 'data': data, 'archived_at': now})
+        if archive_rows:
+            conn.execute(PayloadArchive.__table__.insert().prefix_with('OR REPLACE'), archive_rows)
+            conn.exec_driver_sql(
+                f'UPDATE "{table}" SET {", ".join(f"{c} = NULL" for c in columns)} '
+                f'WHERE id IN ({",".join("?" * len(archived_ids))})',
+                tuple(archived_ids),
+            )
+    return rows[-1][0], len(archived_ids), len(skipped)
+
+
+def _ensure_flat_triggers():
+    """Install missing or changed flattening triggers and the `round_view` view.
+
+    Participants are re-flattened in place when their triggers change (the
+    table is small). Rounds are left to the /debug-backfill-flat job, which
+    starts by itself while rounds still hold legacy text.
+    """
+    global _legacy_round_columns, _legacy_backfill_pending
+    with db.engine.begin() as conn:
+        existing_columns = {
+            table: {row[1] for row in conn.exec_driver_sql(f'PRAGMA table_info("{table}")').all()}
+            for table in ('round', 'participant')
+        }
+        _legacy_round_columns = tuple(c for c in LEGACY_FLAT_COLUMNS['round'] if c in existing_columns['round'])
+        installed = dict(conn.exec_driver_sql(
+            "SELECT name, sql FROM sqlite_master WHERE type IN ('trigger', 'view')"
+        ).all())
+        changed = set()
+        for name, sql in _flat_trigger_sql(existing_columns).items():
+            if installed.get(name) == sql:
+                continue
+            conn.exec_driver_sql(f'DROP TRIGGER IF EXISTS {name}')
+            conn.exec_driver_sql(sql)
+            changed.add(name.split('_flatten_')[0])
+        view_sql = _round_view_sql()
+        if installed.get('round_view') != view_sql:
+            conn.exec_driver_sql('DROP VIEW IF EXISTS round_view')
+            conn.exec_driver_sql(view_sql)
+        if 'participant' in changed:
+            _unarchive_payloads(conn, 'participant')
+            conn.exec_driver_sql(
+                'UPDATE "participant" SET demographics = demographics, pre_questionnaire = pre_questionnaire'
+            )
+        _legacy_backfill_pending = _legacy_round_text_pending(conn)
+    if _legacy_backfill_pending:
+        app.logger.info("rounds with legacy text columns found", extra={'fields': {
+            'columns': list(_legacy_round_columns),
+            'hint': 'the backfill job starts with the first request; exports read the legacy columns until then',
+        }})
+    if changed:
+        app.logger.info("flattening triggers installed", extra={'fields': {
+            'tables': sorted(changed),
+            'hint': 'run /debug-backfill-flat?action=restart to re-flatten existing rounds' if 'round' in changed else None,
+        }})
+
+
+# ---- Live summary tables (SQLite triggers) ----
+# Monitoring counters kept current in the same transaction as each save, so
+# the dashboard reads a few small rows instead of grouping all participants
+# and rounds. Every source row contributes rows of (key columns, value
+# columns); AFTER INSERT adds NEW's contribution, AFTER DELETE subtracts OLD's
+# and AFTER UPDATE of a watched column does both. The round contributions read
+# the flattened columns, so they follow the flattening triggers' UPDATE.
+# A summary whose triggers changed is rebuilt from scratch at startup.
+
+
+def _changing_label_ref(r: str) -> str:
+    return f"COALESCE(CASE {r}.changing_label_rec_pos WHEN 0 THEN {r}.rec0_label_ref WHEN 1 THEN {r}.rec1_label_ref END, 0)"
+
+
+def _rating_summary_rows(r: str) -> list:
+    return [
+        ((_changing_label_ref(r), str(RATING_TARGETS[target]), str(RATING_ITEMS[item])), ('1', f'{r}.{col}'),
+         f'{r}.{col} IS NOT NULL')
+        for col, (target, item) in RATING_COLUMNS.items()
+    ]
+
+
+def _selection_summary_rows(r: str) -> list:
+    return [(
+        (f'COALESCE({r}.changing_label_rec_pos, -1)', _changing_label_ref(r)),
+        ('1', f'{r}.selected_rec_pos IS NOT NULL',
+         f'COALESCE({r}.selected_rec_pos = {r}.changing_label_rec_pos, 0)'),
+        f'{r}.main_article_ref IS NOT NULL',
+    )]
+
+
+def _completion_participant_rows(p: str) -> list:
+    return [((f"COALESCE({p}.explanation_pair, '')",), ('1', '0'), 'true')]
+
+
+def _completion_round_rows(r: str) -> list:
+    # The pair is assigned once, before the first round, so it is looked up rather than watched.
+    pair = f"COALESCE((SELECT explanation_pair FROM participant WHERE id = {r}.participant_id), '')"
+    return [((pair,), ('0', '1'), f'{r}.round_number = {STUDY_TOTAL_ROUNDS} AND {r}.main_article_ref IS NOT NULL')]
+
+
+# summary table -> (key columns, value columns, {source table: (contribution rows builder, watched columns)})
+SUMMARY_TABLES = {
+    'rating_summary': (
+        ('label_ref', 'target', 'item_code'), ('n', 'total'),
+        {'round': (_rating_summary_rows, (*RATING_COLUMNS, 'changing_label_rec_pos', 'rec0_label_ref',
+                                          'rec1_label_ref'))},
+    ),
+    'selection_summary': (
+        ('changing_label_rec_pos', 'label_ref'), ('rounds', 'selected', 'selected_changing'),
+        {'round': (_selection_summary_rows, ('main_article_ref', 'selected_rec_pos', 'changing_label_rec_pos',
+                                             'rec0_label_ref', 'rec1_label_ref'))},
+    ),
+    'completion_summary': (
+        ('explanation_pair',), ('participants', 'completed'),
+        {
+            'participant': (_completion_participant_rows, ('explanation_pair',)),
+            'round': (_completion_round_rows, ('participant_id', 'round_number', 'main_article_ref')),
+        },
+    ),
+}
+
+
+def _summary_selects(summary: str, rows: list, sign: int = 1, from_sql: str = '') -> list[str]:
+    keys, values, _ = SUMMARY_TABLES[summary]
+    selects = []
+    for key_exprs, value_exprs, cond in rows:
+        if sign < 0:
+            value_exprs = [f'-({v})' for v in value_exprs]
+        columns = [f'{expr} AS {name}' for expr, name in zip([*key_exprs, *value_exprs], [*keys, *values])]
+        selects.append(f"SELECT {', '.join(columns)}{from_sql} WHERE {cond}")
+    return selects
+
+
+def _summary_trigger_sql(summary: str) -> dict:
+    """{trigger name: CREATE TRIGGER statement} keeping `summary` current."""
+    keys, values, sources = SUMMARY_TABLES[summary]
+    updates = ', '.join(f'{v} = {v} + excluded.{v}' for v in values)
+    triggers = {}
+    for table, (build, watched) in sources.items():
+        added = _summary_selects(summary, build('NEW'))
+        removed = _summary_selects(summary, build('OLD'), sign=-1)
+        changed = ' OR '.join(f'OLD.{col} IS NOT NEW.{col}' for col in watched)
+        for event, when, selects in (
+            ('insert', 'INSERT', added),
+            ('update', f"UPDATE OF {', '.join(watched)}", removed + added),
+            ('delete', 'DELETE', removed),
+        ):
+            name = f'{summary}_{table}_{event}'
+            condition = f'\nWHEN {changed}' if event == 'update' else ''
+            union = '\n    UNION ALL '.join(selects)
+            triggers[name] = (
+                f'CREATE TRIGGER {name} AFTER {when} ON "{table}"{condition}\n'
+                f'BEGIN\n  INSERT INTO {summary} ({", ".join([*keys, *values])})\n'
+                f'  SELECT * FROM (\n    {union}\n  ) WHERE true\n'
+                f'  ON CONFLICT ({", ".join(keys)}) DO UPDATE SET {updates};\nEND'
+            )
+    return triggers
+
+
+def _rebuild_summary(conn, summary: str):
+    """Recompute `summary` from its source tables (full scan)."""
+    keys, values, sources = SUMMARY_TABLES[summary]
+    selects = [
+        select
+        for table, (build, _) in sources.items()
+        for select in _summary_selects(summary, build('r'), from_sql=f' FROM "{table}" AS r')
+    ]
+    union = '\n  UNION ALL '.join(selects)
+    conn.exec_driver_sql(f'DELETE FROM {summary}')
+    conn.exec_driver_sql(
+        f'INSERT INTO {summary} ({", ".join([*keys, *values])})\n'
+        f'SELECT {", ".join(keys)}, {", ".join(f"SUM({v})" for v in values)} FROM (\n  {union}\n) '
+        f'GROUP BY {", ".join(keys)}'
+    )
+
+
+def _ensure_summary_tables():
+    """Install missing or changed summary triggers and rebuild the summaries they feed."""
+    with db.engine.begin() as conn:
+        installed = dict(conn.exec_driver_sql("SELECT name, sql FROM sqlite_master WHERE type = 'trigger'").all())
+        rebuilt = []
+        for summary in SUMMARY_TABLES:
+            triggers = _summary_trigger_sql(summary)
+            if all(installed.get(name) == sql for name, sql in triggers.items()):
+                continue
+            for name, sql in triggers.items():
+                conn.exec_driver_sql(f'DROP TRIGGER IF EXISTS {name}')
+                conn.exec_driver_sql(sql)
+            _rebuild_summary(conn, summary)
+            rebuilt.append(summary)
+    if rebuilt:
+        app.logger.info("summary tables rebuilt", extra={'fields': {'tables': rebuilt}})
+
+
+with app.app_context():
+    _ensure_flat_triggers()
+    _ensure_summary_tables()
+
+
 TOPIC_MAP_LIST_A = {
     'Business & Economics': 'Economics',
     'International News': 'International',
@@ -533,14 +2142,29 @@ def _map_list_topic(list_name: str, selection: str | None) -> str | None:
     return mapping.get(selection)
 
 
+def _choose_topic_start_list(rng=random) -> str:
+    """Which topic list (A or B) round 1 starts with."""
+    return rng.choice(['A', 'B'])
+
+
 def _ensure_topic_start_list():
     """Pick and persist which list starts round 1 (A or B)."""
     if session.get('topic_start_list') in ('A', 'B'):
         return
-    session['topic_start_list'] = random.choice(['A', 'B'])
+    session['topic_start_list'] = _choose_topic_start_list(participant_rng('topic_start_list'))
+
+
+def _explanation_pair_for(participant_num: int) -> list[str]:
+    """Least-topic labels for rounds 1 and 2 of the participant_num-th participant.
+
+    Cycles through all C(len(LEAST_REC_LABELS), 2) unique pairs in a fixed order.
+    """
+    all_pairs = list(combinations(range(len(LEAST_REC_LABELS)), 2))
+    label_idx_i, label_idx_j = all_pairs[participant_num % len(all_pairs)]
+    return [LEAST_REC_LABELS[label_idx_i], LEAST_REC_LABELS[label_idx_j]]
 
 
-def _ensure_least_rec_label_order(total_rounds: int = STUDY_TOTAL_ROUNDS):
+def _ensure_least_rec_label_order(total_rounds: int = STUDY_TOTAL_ROUNDS, participant_num: int | None = None):
     """Create a per-participant balanced order of least-topic labels.
 
     To ensure balanced randomization across participants (each explanation
@@ -550,10 +2174,17 @@ def _ensure_least_rec_label_order(total_rounds: int = STUDY_TOTAL_ROUNDS):
     - Each participant gets a different pair
     - After 15 participants, each explanation has appeared 5 times
     - Then the cycle repeats for the next set of 15
+
+    `participant_num` is passed by update_participant_data when it is about to
+    create the participant (so there is no stored pair to look up); otherwise
+    the session, then the participant row, is checked for an existing pair.
     """
+    if participant_num is None and session.get('least_rec_label_order') and session.get('explanation_pair'):
+        return
+
     # First, check if this participant already has a pair assigned
     pid = get_participant_id()
-    if pid:
+    if pid and participant_num is None:
         try:
             participant = Participant.query.filter_by(prolific_id=pid).first()
             if participant and participant.explanation_pair:
@@ -564,43 +2195,34 @@ def _ensure_least_rec_label_order(total_rounds: int = STUDY_TOTAL_ROUNDS):
                     order = [labels[0].strip(), labels[1].strip()]
                     session['least_rec_label_order'] = order
                     session['explanation_pair'] = pair_str
-                    print(f"[DEBUG] Retrieved explanation_pair from DB: {pair_str}", flush=True)
+                    app.logger.debug("retrieved explanation_pair from DB", extra={'fields': {'explanation_pair': pair_str}})
                     return
         except Exception as e:
-            print(f"[DEBUG] Error retrieving participant pair: {e}", flush=True)
-    
-    # If no participant pair exists yet, calculate and assign a new one
-    from itertools import combinations
-    
-    labels = LEAST_REC_LABELS[:]
-    
-    # Generate all possible unique pairs of different explanations
-    all_pairs = list(combinations(range(len(labels)), 2))
+            app.logger.warning("failed to retrieve participant pair", extra={'fields': {'error': str(e)}})
     
+    # If no participant pair exists yet, calculate and assign a new one.
     # Count how many participants have already been created to determine
-    # which pair this participant should get (for balanced distribution)
-    try:
-        participant_num = db.session.query(Participant).count()
-    except Exception:
-        participant_num = 0
-    
-    # Assign pair based on participant count (cycle through all pairs)
-    pair_idx = participant_num % len(all_pairs)
-    label_idx_i, label_idx_j = all_pairs[pair_idx]
-    
-    # Create order for this participant's rounds
-    # Round 1 gets first label, Round 2 gets second label
-    order = [
-        labels[label_idx_i],
-        labels[label_idx_j]
-    ]
+    # which pair this participant should get (for balanced distribution).
+    # MAX(id) is the count as long as participants are never deleted, and is
+    # read from the primary-key index instead of scanning the table.
+    if participant_num is None:
+        try:
+            participant_num = db.session.scalar(db.select(db.func.max(Participant.id))) or 0
+        except Exception:
+            participant_num = 0
     
+    # Assign pair based on participant count (cycle through all pairs).
+    # Round 1 gets first label, Round 2 gets second label.
+    order = _explanation_pair_for(participant_num)
     session['least_rec_label_order'] = order
-    
+
     # Store the pair description in session for later saving to participant record
-    pair_description = f"{labels[label_idx_i]} | {labels[label_idx_j]}"
+    pair_description = f"{order[0]} | {order[1]}"
     session['explanation_pair'] = pair_description
-    print(f"[DEBUG] Set explanation_pair: {pair_description} (participant_num={participant_num}, pair_idx={pair_idx})", flush=True)
+    app.logger.debug("set explanation_pair", extra={'fields': {
+        'explanation_pair': pair_description,
+        'participant_num': participant_num,
+    }})
 
 
 
@@ -608,21 +2230,103 @@ def _ensure_least_rec_label_order(total_rounds: int = STUDY_TOTAL_ROUNDS):
 
 
 
-def _list_for_round(round_number: int) -> str:
-    """Alternate lists A/B by round, starting from randomized start list."""
-    _ensure_topic_start_list()
-    start = session.get('topic_start_list', 'A')
+def _list_for_round_from(start: str, round_number: int) -> str:
+    """Alternate lists A/B by round, starting from `start`."""
     if round_number % 2 == 1:
         return start
     return 'B' if start == 'A' else 'A'
 
 
-def _normalize_topic_value(val) -> str:
-    if val is None:
-        return ''
-    if isinstance(val, (list, tuple)):
-        val = val[0] if val else ''
-    return str(val).strip().lower()
+def _list_for_round(round_number: int) -> str:
+    """Alternate lists A/B by round, starting from randomized start list."""
+    _ensure_topic_start_list()
+    return _list_for_round_from(session.get('topic_start_list', 'A'), round_number)
+
+
+def _find_article_row(article_id) -> dict | None:
+    """Return (a copy of) the raw catalog row for an article id (df['index']), or None."""
+    record = CATALOG.records.get(article_id)
+    return dict(record) if record is not None else None
+
+
+def _sample_id(ids: tuple[int, ...], excluded: set, rng) -> int | None:
+    """Uniform choice from `ids` minus `excluded`, or None if nothing is left."""
+    if len(ids) > 2 * len(excluded):
+        # At least half the ids are allowed: rejection sampling takes < 2 draws on average.
+        while True:
+            article_id = rng.choice(ids)
+            if article_id not in excluded:
+                return article_id
+    allowed = [i for i in ids if i not in excluded]
+    return rng.choice(allowed) if allowed else None
+
+
+def _random_article_row(rng) -> dict:
+    return _find_article_row(rng.choice(CATALOG.ids))
+
+
+def _pick_article_from_topic(topic_value: str | None, seen_ids, main_article_id, rng=None) -> dict | None:
+    """Sample one catalog row from a topic (main article or recommendation slot).
+
+    Prefers articles the participant has not seen and that are not the main
+    article, then relaxes those constraints one at a time. Main articles are
+    picked with main_article_id=None. `rng` defaults to an unseeded generator.
+    """
+    if not topic_value:
+        return None
+    ids = CATALOG.by_topic.get(_normalize_topic_value(topic_value), ())
+    rng = rng or random.Random()
+    main_excluded = {main_article_id} if main_article_id is not None else set()
+    # Prefer unseen and not-the-main-article, next allow seen, finally allow even
+    # the main article (duplicate main+rec is acceptable).
+    for excluded in (set(seen_ids) | main_excluded, main_excluded, set()):
+        article_id = _sample_id(ids, excluded, rng)
+        if article_id is not None:
+            return _find_article_row(article_id)
+    return None
+
+
+def _assign_rec_labels(recommendations, fav_topic, least_topic, least_label: str | None):
+    """Label each recommendation by kind; returns (labels_by_id, kinds_by_id).
+
+    The favourite-topic rec gets no label ('fav'), the least-topic rec gets
+    this round's rotating explanation ('least'). Recs matching neither topic
+    fill the remaining slot, favourite first.
+    """
+    labels_by_id: dict[str, str] = {}
+    kinds_by_id: dict[str, str] = {}
+    fav_topic_str = _normalize_topic_value(fav_topic)
+    least_topic_str = _normalize_topic_value(least_topic)
+    for rec in recommendations:
+        rec_topic_str = _normalize_topic_value(rec.get(TOPIC_COL))
+        rec_id = str(rec.get('index'))
+
+        if fav_topic_str and rec_topic_str == fav_topic_str:
+            labels_by_id[rec_id] = ''
+            kinds_by_id[rec_id] = 'fav'
+        elif least_topic_str and rec_topic_str == least_topic_str:
+            labels_by_id[rec_id] = least_label or ''
+            kinds_by_id[rec_id] = 'least'
+        else:
+            # If topics are missing (e.g., duplicates), assign remaining slot deterministically.
+            if len([v for v in labels_by_id.values() if v == '']) < 1:
+                labels_by_id[rec_id] = ''
+                kinds_by_id[rec_id] = 'fav'
+            else:
+                labels_by_id[rec_id] = least_label or ''
+                kinds_by_id[rec_id] = 'least'
+    return labels_by_id, kinds_by_id
+
+
+def _changing_label_pos(recommendation_ids, kinds_by_id: dict) -> int | None:
+    """Position (0/1) of the least-topic rec, which carries the changing explanation."""
+    try:
+        for pos, rec_id in enumerate(recommendation_ids[:2]):
+            if str(kinds_by_id.get(str(rec_id), '')).strip() == 'least':
+                return int(pos)
+    except Exception:
+        pass
+    return None
 
 
 def normalize_article_row(row_dict):
@@ -666,122 +2370,653 @@ def normalize_article_row(row_dict):
     # Date: prefer published_date then updated_date
     out['Date'] = row_dict.get('Date') or row_dict.get('published_date') or row_dict.get('updated_date') or ''
 
-    # Keep any other original fields for debugging or downstream use
-    for k, v in row_dict.items():
-        if k not in out:
-            out[k] = v
+    # Keep any other original fields for debugging or downstream use
+    for k, v in row_dict.items():
+        if k not in out:
+            out[k] = v
+
+    return out
+
+
+def get_stable_article_id(article_row: dict):
+    """Return a stable identifier from the articles DB row.
+
+    The `new_articles` table uses generic column names (field1, field2, ...),
+    but the first data-row is treated as headers in this app.
+    We prefer `internal_id` if present, otherwise fall back to `field1`.
+    """
+    if not isinstance(article_row, dict):
+        return None
+    return article_row.get('internal_id') or article_row.get('Internal ID') or article_row.get('field1')
+
+
+@app.route('/debug-init-db')
+@admin_only
+def debug_init_db():
+    """Diagnostics: initialize responses DB tables and report status."""
+    with app.app_context():
+        db.create_all()
+
+    try:
+        engine = db.engine
+        db_path = None
+        try:
+            db_path = engine.url.database
+        except Exception:
+            db_path = None
+
+        with engine.connect() as conn:
+            rows = conn.exec_driver_sql("SELECT name FROM sqlite_master WHERE type='table' ORDER BY name").all()
+        tables = [r[0] for r in rows]
+    except Exception as e:
+        return {'error': 'Failed to inspect DB', 'details': str(e)}, 500
+
+    return {
+        'db_uri': app.config.get('SQLALCHEMY_DATABASE_URI'),
+        'db_path': db_path,
+        'tables': tables,
+        'hint': 'Expect to see participant and round tables.'
+    }
+
+
+@app.route('/debug-articles')
+@admin_only
+def debug_articles():
+    """Quick diagnostics: returns detected columns, topic column, and a small sample of rows."""
+    try:
+        sample = CATALOG.frame.head(5).to_dict(orient='records')
+    except Exception:
+        sample = []
+    return {
+        'columns': list(CATALOG.frame.columns),
+        'topic_col': TOPIC_COL,
+        'sample_rows': sample
+    }
+
+
+@app.route('/debug-article/<int:article_id>')
+@admin_only
+def debug_article(article_id: int):
+    """Diagnostics: look up a single article by its internal id (df['index']).
+
+    This is the same id saved in responses under:
+    - round.article.main_article_id
+    - round.article.recommendations[]
+    """
+    row = _find_article_row(article_id)
+    if row is None:
+        return {
+            'found': False,
+            'article_id': article_id,
+            'hint': "This app uses df['index'] (after reset_index) as the article id.",
+        }, 404
+
+    record = normalize_article_row(row)
+    return {
+        'found': True,
+        'article_id': int(record.get('index')),
+        'stable_id': get_stable_article_id(record),
+        'title': record.get('Title'),
+        'author': record.get('Author'),
+        'date': record.get('Date'),
+        'topic_col': TOPIC_COL,
+        'topic_value': record.get(TOPIC_COL),
+    }
+
+
+@app.route('/debug-profiler')
+@admin_only
+def debug_profiler():
+    """Show or change the profiling sample rate.
+
+    Usage:
+    - Current state: /debug-profiler
+    - Profile 5% of requests: /debug-profiler?sample_rate=0.05
+    - Switch off: /debug-profiler?sample_rate=0
+    - Single request: send `X-Profile: 1` (plus the admin token) with it.
+    """
+    raw = request.args.get('sample_rate')
+    if raw is not None:
+        try:
+            _set_profile_sample_rate(float(raw))
+        except (ValueError, OSError) as e:
+            return {'error': 'Could not set sample_rate', 'details': str(e)}, 400
+    return {
+        'sample_rate': _profile_sample_rate(),
+        'profile_dir': os.path.abspath(PROFILE_DIR),
+        'keep': PROFILE_KEEP,
+        'header': PROFILE_HEADER,
+    }
+
+
+@app.route('/debug-profiles')
+@admin_only
+def debug_profiles():
+    """List the most recent request profiles (newest first)."""
+    try:
+        names = sorted((n for n in os.listdir(PROFILE_DIR) if n.endswith('.prof')), reverse=True)
+    except OSError:
+        names = []
+
+    profiles = []
+    for name in names:
+        # <timestamp>_<pid>_<endpoint>_<ms>ms.prof
+        parts = name[:-len('.prof')].split('_')
+        profiles.append({
+            'name': name,
+            'pid': parts[1] if len(parts) > 3 else None,
+            'endpoint': '_'.join(parts[2:-1]) if len(parts) > 3 else None,
+            'duration_ms': int(parts[-1][:-2]) if parts[-1].endswith('ms') and parts[-1][:-2].isdigit() else None,
+            'size_bytes': os.path.getsize(os.path.join(PROFILE_DIR, name)),
+        })
+    return {'sample_rate': _profile_sample_rate(), 'profiles': profiles}
+
+
+@app.route('/debug-profiles/<name>')
+@admin_only
+def debug_profile_summary(name: str):
+    """Summarize one profile: top functions by cumulative (or ?sort=tottime) time."""
+    if os.path.basename(name) != name or not name.endswith('.prof'):
+        return {'error': 'Invalid profile name'}, 400
+    path = os.path.join(PROFILE_DIR, name)
+    if not os.path.isfile(path):
+        return {'error': 'Unknown profile', 'name': name}, 404
+
+    sort_key = request.args.get('sort', 'cumtime')
+    if sort_key not in ('cumtime', 'tottime', 'ncalls'):
+        sort_key = 'cumtime'
+    limit = request.args.get('limit', default=30, type=int)
+
+    stats = pstats.Stats(path)
+    rows = []
+    for (filename, lineno, func), (_cc, ncalls, tottime, cumtime, _callers) in stats.stats.items():
+        rows.append({
+            'function': f"{filename}:{lineno}({func})",
+            'ncalls': ncalls,
+            'tottime': round(tottime, 6),
+            'cumtime': round(cumtime, 6),
+        })
+    rows.sort(key=lambda r: r[sort_key], reverse=True)
+    return {
+        'name': name,
+        'total_time': round(stats.total_tt, 6),
+        'sort': sort_key,
+        'top': rows[:max(1, limit)],
+    }
+
+
+# ---- Analytics snapshot ----
+# Admin and analytics reads (/debug-rounds, /debug-ratings, /debug-rum-report,
+# /debug-export and the export CLI) go to a read-only copy of the responses DB,
+# so a long aggregate or export never holds a lock the study's writes wait for.
+# `flask --app app snapshot` (run by the systemd timer in deploy/) or
+# /debug-snapshot?action=take refreshes the copy with SQLite's online backup
+# API into a temporary file that then atomically replaces the old one; reads
+# already running finish on the copy they opened. ?live=1 reads the live
+# database instead, as do all reads until the first snapshot exists.
+# Responses report the snapshot's age.
+SNAPSHOT_DB_PATH = os.environ.get("SNAPSHOT_DB_PATH")  # default: <responses db>.snapshot.db
+SNAPSHOT_PAGES_PER_STEP = int(os.environ.get("SNAPSHOT_PAGES_PER_STEP", "-1"))  # -1: one step
+_snapshot_engines: dict[str, object] = {}
+
+
+def _live_db_path() -> str | None:
+    """File behind the responses DB, or None if it is not an on-disk SQLite database."""
+    url = db.engine.url
+    if url.get_backend_name() != 'sqlite' or url.database in (None, '', ':memory:'):
+        return None
+    return url.database
+
+
+def snapshot_path() -> str | None:
+    live = _live_db_path()
+    if live is None:
+        return None
+    return SNAPSHOT_DB_PATH or f"{os.path.splitext(live)[0]}.snapshot.db"
+
+
+def snapshot_age_s() -> float | None:
+    path = snapshot_path()
+    try:
+        return round(time.time() - os.path.getmtime(path), 1) if path else None
+    except FileNotFoundError:
+        return None
+
+
+def take_snapshot() -> dict:
+    """Copy the responses DB to snapshot_path() with the online backup API; returns stats.
+
+    With the default SNAPSHOT_PAGES_PER_STEP=-1 the copy is made in one step
+    under a single read transaction, so it is consistent; writers wait for it
+    only in rollback-journal mode, for as long as the copy takes. A positive
+    step size lets writers in between steps, but SQLite restarts the copy
+    whenever the source changes, so keep it for large, quiet databases.
+    """
+    live, target = _live_db_path(), snapshot_path()
+    if live is None:
+        raise RuntimeError('Snapshots need an on-disk SQLite responses database.')
+    started = time.monotonic()
+    # Same directory as the target, so os.replace() is an atomic rename.
+    fd, tmp = tempfile.mkstemp(prefix=os.path.basename(target) + '.', suffix='.tmp',
+                               dir=os.path.dirname(target) or '.')
+    os.close(fd)
+    try:
+        src = sqlite3.connect(live, timeout=30)
+        dst = sqlite3.connect(tmp)
+        try:
+            src.backup(dst, pages=SNAPSHOT_PAGES_PER_STEP, sleep=0.05)
+            dst.execute('PRAGMA journal_mode=DELETE')  # readers open it read-only, without -wal/-shm files
+        finally:
+            dst.close()
+            src.close()
+        os.replace(tmp, target)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
+    stats = {'path': target, 'bytes': os.path.getsize(target), 'took_s': round(time.monotonic() - started, 3)}
+    app.logger.info("snapshot taken", extra={'fields': stats})
+    return stats
+
+
+def _snapshot_engine(path: str):
+    # NullPool: every checkout opens the file anew, so reads see the newest copy
+    # after os.replace() instead of a pooled handle on the old one.
+    engine = _snapshot_engines.get(path)
+    if engine is None:
+        # setdefault: threads racing here all end up with the first engine stored.
+        engine = _snapshot_engines.setdefault(path, create_engine(
+            f'sqlite:///file:{path}?mode=ro&uri=true', poolclass=NullPool,
+            **app.config["SQLALCHEMY_ENGINE_OPTIONS"],
+        ))
+    return engine
+
+
+def open_analytics_session(live: bool = False) -> tuple[object, dict]:
+    """(session, source info) for an admin/analytics read.
+
+    The session reads the snapshot unless `live` is set or no snapshot exists
+    yet, in which case it is db.session. The caller closes a snapshot session.
+    """
+    age = snapshot_age_s()
+    if live or age is None:
+        return db.session, {'source': 'live', 'snapshot_age_s': age}
+    return OrmSession(_snapshot_engine(snapshot_path())), {'source': 'snapshot', 'snapshot_age_s': age}
+
+
+def analytics_session() -> tuple[object, dict]:
+    """open_analytics_session() for the current request (?live=1), closed on teardown."""
+    if '_analytics' not in g:
+        g._analytics = open_analytics_session(live=request.args.get('live') == '1')
+    return g._analytics
+
+
+@app.teardown_appcontext
+def _close_analytics_session(exc):
+    analytics = g.pop('_analytics', None)
+    if analytics is not None and analytics[0] is not db.session:
+        analytics[0].close()
+
+
+@app.route('/debug-snapshot')
+@admin_only
+def debug_snapshot():
+    """Analytics snapshot status, or refresh it now.
+
+    Usage:
+    - Status: /debug-snapshot
+    - Take a snapshot now: /debug-snapshot?action=take
+    """
+    path = snapshot_path()
+    if path is None:
+        return {'error': 'Snapshots need an on-disk SQLite responses database.'}, 501
+    result = {'path': path}
+    if request.args.get('action') == 'take':
+        result.update(take_snapshot())
+    result['snapshot_age_s'] = snapshot_age_s()
+    return result
+
+
+@app.cli.command('snapshot')
+def snapshot_command():
+    """Refresh the read-only analytics snapshot of the responses DB."""
+    try:
+        stats = take_snapshot()
+    except RuntimeError as e:
+        raise click.ClickException(str(e))
+    click.echo(f"snapshot {stats['path']}: {stats['bytes']} bytes in {stats['took_s']}s", err=True)
+
+
+# ---- Client-side timing (RUM) ----
+# templates/_rum.html sends one beacon per page view. Only participants with a
+# session may send them, only the metrics the template collects are kept, and
+# each participant gets RUM_MAX_BEACONS_PER_FLUSH beacons per flush interval.
+# Rows are buffered in memory and written in batches by a background thread,
+# like the funnel events, so a beacon never waits on a commit.
+RUM_MAX_EVENTS_PER_BEACON = 20
+RUM_MAX_VALUE_MS = 10 * 60 * 1000
+RUM_PERCENTILES = (50, 75, 95, 99)
+RUM_METRICS = frozenset({
+    # Navigation and paint timings.
+    'ttfb', 'response_end', 'dom_interactive', 'dom_content_loaded', 'load',
+    'first_paint', 'first_contentful_paint', 'images_loaded',
+    # performance.mark('study:...') milestones in article.html.
+    'main_image_loaded', 'choice_confirmed', 'rating_box_ready', 'wizard_ready',
+})
+RUM_FLUSH_INTERVAL_S = float(os.environ.get("RUM_FLUSH_INTERVAL_S", "5"))
+RUM_MAX_BEACONS_PER_FLUSH = 5
+RUM_MAX_BUFFERED_ROWS = 10000
+
+_rum_buffer: list[dict] = []
+_rum_beacons_by_pid: dict[str, int] = {}
+_rum_lock = threading.Lock()
+_rum_flusher_pid = None
+
+
+def _percentile(sorted_values: list, pct: float):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(pct / 100.0 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def _rum_flush():
+    with _rum_lock:
+        batch = _rum_buffer[:]
+        _rum_buffer.clear()
+        _rum_beacons_by_pid.clear()
+    if not batch:
+        return
+    try:
+        with app.app_context(), db.engine.begin() as conn:
+            conn.execute(RumEvent.__table__.insert(), batch)
+    except Exception as e:
+        app.logger.warning("failed to store RUM events", extra={'fields': {'rows': len(batch), 'error': str(e)}})
+
 
-    return out
+def _rum_flush_loop():
+    while True:
+        time.sleep(RUM_FLUSH_INTERVAL_S)
+        _rum_flush()
 
 
-def get_stable_article_id(article_row: dict):
-    """Return a stable identifier from the articles DB row.
+def _ensure_rum_flusher_started():
+    global _rum_flusher_pid
+    if _rum_flusher_pid == os.getpid():
+        return
+    with _rum_lock:
+        if _rum_flusher_pid == os.getpid():
+            return
+        _rum_buffer.clear()
+        _rum_beacons_by_pid.clear()
+        threading.Thread(target=_rum_flush_loop, name="rum-flusher", daemon=True).start()
+        _rum_flusher_pid = os.getpid()
 
-    The `new_articles` table uses generic column names (field1, field2, ...),
-    but the first data-row is treated as headers in this app.
-    We prefer `internal_id` if present, otherwise fall back to `field1`.
-    """
-    if not isinstance(article_row, dict):
-        return None
-    return article_row.get('internal_id') or article_row.get('Internal ID') or article_row.get('field1')
 
+atexit.register(_rum_flush)
 
-@app.route('/debug-init-db')
-@admin_only
-def debug_init_db():
-    """Diagnostics: initialize responses DB tables and report status."""
-    with app.app_context():
-        db.create_all()
 
+@app.route('/rum', methods=['POST'])
+def rum_ingest():
+    """Queue a batch of client timing samples sent with navigator.sendBeacon()."""
+    pid = session.get('prolific_id')
+    if not pid:
+        return ('', 403)
     try:
-        engine = db.engine
-        db_path = None
-        try:
-            db_path = engine.url.database
-        except Exception:
-            db_path = None
+        payload = json.loads(request.get_data(cache=False, as_text=True) or '{}')
+    except ValueError:
+        return ('', 400)
+    events = payload.get('events') if isinstance(payload, dict) else None
+    if not isinstance(events, list):
+        return ('', 400)
+
+    now = datetime.utcnow()
+    rows = []
+    for ev in events[:RUM_MAX_EVENTS_PER_BEACON]:
+        if not isinstance(ev, dict) or not isinstance(ev.get('metrics'), dict):
+            continue
+        page = str(ev.get('page') or '')[:64]
+        if page not in app.view_functions:
+            continue
+        round_number = ev.get('round') if isinstance(ev.get('round'), int) else None
+        for metric, value in ev['metrics'].items():
+            if metric not in RUM_METRICS:
+                continue
+            if not isinstance(value, (int, float)) or isinstance(value, bool):
+                continue
+            if not 0 <= value <= RUM_MAX_VALUE_MS:
+                continue
+            rows.append({
+                'page': page,
+                'round_number': round_number,
+                'metric': metric,
+                'value_ms': float(value),
+                'timestamp': now,
+            })
+
+    if rows:
+        _ensure_rum_flusher_started()
+        with _rum_lock:
+            beacons = _rum_beacons_by_pid.get(pid, 0)
+            if beacons >= RUM_MAX_BEACONS_PER_FLUSH or len(_rum_buffer) + len(rows) > RUM_MAX_BUFFERED_ROWS:
+                return ('', 429)
+            _rum_beacons_by_pid[pid] = beacons + 1
+            _rum_buffer.extend(rows)
+    return ('', 204)
+
+
+@app.route('/debug-rum-report')
+@admin_only
+def debug_rum_report():
+    """Percentiles of client timings per page, round and metric.
 
-        with engine.connect() as conn:
-            rows = conn.exec_driver_sql("SELECT name FROM sqlite_master WHERE type='table' ORDER BY name").all()
-        tables = [r[0] for r in rows]
-    except Exception as e:
-        return {'error': 'Failed to inspect DB', 'details': str(e)}, 500
+    Usage:
+    - Last 7 days: /debug-rum-report
+    - Custom window: /debug-rum-report?days=1
+    """
+    days = request.args.get('days', default=7, type=float)
+    since = datetime.utcnow() - timedelta(days=days)
+    reader, source = analytics_session()
+    rows = reader.execute(
+        db.select(RumEvent.page, RumEvent.round_number, RumEvent.metric, RumEvent.value_ms)
+        .where(RumEvent.timestamp >= since)
+        .order_by(RumEvent.page, RumEvent.round_number, RumEvent.metric, RumEvent.value_ms)
+    ).all()
+
+    groups: dict[tuple, list] = {}
+    for page, round_number, metric, value in rows:
+        groups.setdefault((page, round_number, metric), []).append(value)
+
+    report = []
+    for (page, round_number, metric), values in groups.items():
+        entry = {'page': page, 'round': round_number, 'metric': metric, 'count': len(values)}
+        for pct in RUM_PERCENTILES:
+            entry[f'p{pct}'] = round(_percentile(values, pct), 1)
+        report.append(entry)
+    return {'days': days, 'since': since.isoformat(), 'data': source, 'report': report}
+
+
+@app.route('/debug-funnel')
+@admin_only
+def debug_funnel():
+    """Live drop-off counts and time-per-step percentiles from the running aggregates.
 
-    return {
-        'db_uri': app.config.get('SQLALCHEMY_DATABASE_URI'),
-        'db_path': db_path,
-        'tables': tables,
-        'hint': 'Expect to see participant and round tables.'
+    Numbers lag the live flow by up to FUNNEL_FLUSH_INTERVAL_S seconds.
+    """
+    entered_exited = {
+        row.step: (row.entered, row.exited)
+        for row in db.session.execute(db.select(StepStat)).scalars()
     }
+    hist: dict[int, list[tuple[int, int]]] = {}
+    for row in db.session.execute(
+        db.select(StepLatencyBucket).order_by(StepLatencyBucket.step, StepLatencyBucket.bucket)
+    ).scalars():
+        hist.setdefault(row.step, []).append((row.bucket, row.count))
+
+    def _hist_percentile(buckets, pct):
+        total = sum(n for _, n in buckets)
+        if not total:
+            return None
+        threshold = pct / 100.0 * total
+        seen = 0
+        for bucket, n in buckets:
+            seen += n
+            if seen >= threshold:
+                return _funnel_bucket_upper_ms(bucket)
+        return _funnel_bucket_upper_ms(buckets[-1][0])
+
+    steps = []
+    for name in STUDY_STEPS:
+        code = STUDY_STEP_CODES[name]
+        entered, exited = entered_exited.get(code, (0, 0))
+        next_code = code + 1 if code < len(STUDY_STEPS) else None
+        next_entered = entered_exited.get(next_code, (0, 0))[0] if next_code else None
+        buckets = hist.get(code, [])
+        steps.append({
+            'step': name,
+            'code': code,
+            'entered': entered,
+            'exited': exited,
+            'dropped': (entered - next_entered) if next_code else None,
+            'median_ms': _hist_percentile(buckets, 50),
+            'p95_ms': _hist_percentile(buckets, 95),
+        })
+    return {'flush_interval_s': FUNNEL_FLUSH_INTERVAL_S, 'steps': steps}
 
 
-@app.route('/debug-articles')
+@app.route('/debug-dashboard')
 @admin_only
-def debug_articles():
-    """Quick diagnostics: returns detected columns, topic column, and a small sample of rows."""
-    try:
-        sample = df.head(5).to_dict(orient='records')
-    except Exception:
-        sample = []
-    return {
-        'columns': list(df.columns),
-        'topic_col': TOPIC_COL,
-        'sample_rows': sample
-    }
+def debug_dashboard():
+    """Live study summary from the trigger-maintained summary tables.
 
+    Reads a few rows per explanation label, so it costs the same at any study size.
 
-@app.route('/debug-article/<int:article_id>')
+    Usage:
+    - /debug-dashboard
+    - Ratings of one item only: /debug-dashboard?item=trustworthy
+    - Recompute the summaries from participant/round (full scan): /debug-dashboard?rebuild=1
+    """
+    item = request.args.get('item')
+    if item is not None and item not in RATING_ITEMS:
+        return {'error': f'item must be one of {sorted(RATING_ITEMS)}'}, 400
+    if request.args.get('rebuild') == '1':
+        with db.engine.begin() as conn:
+            for summary in SUMMARY_TABLES:
+                _rebuild_summary(conn, summary)
+
+    labels = dict(db.session.execute(db.select(LabelDim.id, LabelDim.text)).all())
+    completions = [
+        {
+            'explanation_pair': row.explanation_pair or None,
+            'participants': row.participants,
+            'completed': row.completed,
+            'completion_rate': round(row.completed / row.participants, 3) if row.participants else None,
+        }
+        for row in db.session.scalars(db.select(CompletionSummary).order_by(CompletionSummary.explanation_pair))
+    ]
+    selection = [
+        {
+            'changing_label_rec_pos': None if row.changing_label_rec_pos < 0 else row.changing_label_rec_pos,
+            'label': labels.get(row.label_ref),
+            'rounds': row.rounds,
+            'selected': row.selected,
+            'changing_selected_rate': round(row.selected_changing / row.selected, 3) if row.selected else None,
+        }
+        for row in db.session.scalars(
+            db.select(SelectionSummary).where(SelectionSummary.rounds > 0)
+            .order_by(SelectionSummary.changing_label_rec_pos, SelectionSummary.label_ref)
+        )
+    ]
+    q = (
+        db.select(RatingSummary).where(RatingSummary.n > 0)
+        .order_by(RatingSummary.item_code, RatingSummary.target, RatingSummary.label_ref)
+    )
+    if item is not None:
+        q = q.where(RatingSummary.item_code == RATING_ITEMS[item])
+    target_names = {code: name for name, code in RATING_TARGETS.items()}
+    item_names = {code: name for name, code in RATING_ITEMS.items()}
+    ratings = [
+        {
+            'item': item_names.get(row.item_code, row.item_code),
+            'target': target_names.get(row.target, row.target),
+            'label': labels.get(row.label_ref),
+            'n': row.n,
+            'mean': round(row.total / row.n, 3),
+        }
+        for row in db.session.scalars(q)
+    ]
+    return {'completions': completions, 'selection': selection, 'ratings': ratings}
+
+
+@app.route('/debug-ratings')
 @admin_only
-def debug_article(article_id: int):
-    """Diagnostics: look up a single article by its internal id (df['index']).
+def debug_ratings():
+    """Mean rating of one item per target and explanation label, from the `rating` table.
 
-    This is the same id saved in responses under:
-    - round.article.main_article_id
-    - round.article.recommendations[]
+    Usage:
+    - /debug-ratings?item=trustworthy
+    - /debug-ratings?item=trustworthy&target=low
+    The label is the round's changing (least-topic) explanation.
     """
-    row = df[df['index'] == article_id]
-    if row.empty:
-        return {
-            'found': False,
-            'article_id': article_id,
-            'hint': "This app uses df['index'] (after reset_index) as the article id.",
-        }, 404
-
-    record = normalize_article_row(row.iloc[0].to_dict())
+    item = request.args.get('item', 'trustworthy')
+    target = request.args.get('target')
+    if item not in RATING_ITEMS:
+        return {'error': f'item must be one of {sorted(RATING_ITEMS)}'}, 400
+    if target is not None and target not in RATING_TARGETS:
+        return {'error': f'target must be one of {sorted(RATING_TARGETS)}'}, 400
+
+    label_ref = db.case(
+        (Round.changing_label_rec_pos == 0, Round.rec0_label_ref),
+        (Round.changing_label_rec_pos == 1, Round.rec1_label_ref),
+    )
+    q = (
+        db.select(Rating.target, LabelDim.text, db.func.count(), db.func.avg(Rating.value))
+        .join(Round, Round.id == Rating.round_id)
+        .outerjoin(LabelDim, LabelDim.id == label_ref)
+        .where(Rating.item_code == RATING_ITEMS[item])
+        .group_by(Rating.target, LabelDim.text)
+        .order_by(Rating.target, LabelDim.text)
+    )
+    if target is not None:
+        q = q.where(Rating.target == RATING_TARGETS[target])
+    target_names = {code: name for name, code in RATING_TARGETS.items()}
+    reader, source = analytics_session()
     return {
-        'found': True,
-        'article_id': int(record.get('index')),
-        'stable_id': get_stable_article_id(record),
-        'title': record.get('Title'),
-        'author': record.get('Author'),
-        'date': record.get('Date'),
-        'topic_col': TOPIC_COL,
-        'topic_value': record.get(TOPIC_COL),
+        'item': item,
+        'data': source,
+        'groups': [
+            {'target': target_names.get(t, t), 'label': lbl, 'n': n, 'mean': round(mean, 3)}
+            for t, lbl, n, mean in reader.execute(q).all()
+        ],
     }
 
 
 @app.route('/debug-rounds')
+@admin_only
 def debug_rounds():
     """Diagnostics: return participant + rounds saved so far.
 
     Usage:
     - Visit after or during a session: /debug-rounds
     - Or specify a pid: /debug-rounds?pid=PROLIFIC_PID
+    - Rounds saved since the last snapshot: /debug-rounds?live=1
     """
     pid = request.args.get('pid') or session.get('prolific_id')
     if not pid:
         return {'error': 'No pid provided and no session prolific_id.'}, 400
 
+    reader, source = analytics_session()
     try:
-        participant = Participant.query.filter_by(prolific_id=pid).first()
+        participant = reader.scalars(db.select(Participant).filter_by(prolific_id=pid)).first()
         if not participant:
-            return {'pid': pid, 'participant': None, 'rounds': []}
+            return {'pid': pid, 'data': source, 'participant': None, 'rounds': []}
 
-        rounds = (
-            Round.query.filter_by(participant_id=participant.id)
+        rounds = reader.scalars(
+            db.select(Round).options(db.undefer_group('payload'))
+            .filter_by(participant_id=participant.id)
             .order_by(Round.round_number.asc())
-            .all()
-        )
+        ).all()
     except OperationalError as e:
         # Typically indicates tables were never created ("no such table: participant").
         return {
@@ -794,363 +3029,805 @@ def debug_rounds():
         return {
             'id': r.id,
             'round_number': r.round_number,
-            'theme_selection': r.theme_selection,
-            'article': r.article,
-            'mid_questionnaire': r.mid_questionnaire,
+            'theme_selection': raw_payload(r, 'theme_selection'),
+            'article': raw_payload(r, 'article'),
+            'mid_questionnaire': raw_payload(r, 'mid_questionnaire'),
             'timestamp': r.timestamp.isoformat() if r.timestamp else None,
         }
 
     return {
         'pid': pid,
+        'data': source,
         'participant': {
             'id': participant.id,
             'prolific_id': participant.prolific_id,
             'condition': participant.condition,
             'timestamp_start': participant.timestamp_start.isoformat() if participant.timestamp_start else None,
-            'demographics': participant.demographics,
-            'pre_questionnaire': participant.pre_questionnaire,
+            'demographics': raw_payload(participant, 'demographics'),
+            'pre_questionnaire': raw_payload(participant, 'pre_questionnaire'),
             'post_questionnaire': participant.post_questionnaire,
         },
         'rounds': [_to_dict_round(r) for r in rounds],
     }
 
 
+def _article_topic(article_id, topic_cache: dict | None = None):
+    """Catalog topic of an article id, or None; memoized in `topic_cache` when given."""
+    if article_id is None:
+        return None
+    if topic_cache is not None and article_id in topic_cache:
+        return topic_cache[article_id]
+    row = _find_article_row(article_id)
+    topic = normalize_article_row(row).get(TOPIC_COL) if row is not None else None
+    if topic_cache is not None:
+        topic_cache[article_id] = topic
+    return topic
+
+
+def _backfill_rounds(rounds, topic_cache: dict | None = None) -> int:
+    """Re-run the flattening triggers for rounds with a stored payload; returns how many.
+
+    Payloads saved before topics were stored get them from the catalog first;
+    archived payloads are restored.
+    """
+    archived = [r.id for r in rounds if r.article is None]
+    if archived and _unarchive_payloads(db.session.connection(), 'round', archived):
+        Round.query.options(db.undefer_group('payload')).filter(Round.id.in_(archived)).populate_existing().all()
+    ids = []
+    for r in rounds:
+        payload = r.article
+        if not isinstance(payload, dict):
+            continue
+        if 'recommendations_topics' not in payload:
+            r.article = {
+                **payload,
+                'main_topic': _article_topic(payload.get('main_article_id'), topic_cache),
+                'recommendations_topics': [
+                    _article_topic(rec_id, topic_cache) for rec_id in payload.get('recommendations') or []
+                ],
+            }
+        ids.append(r.id)
+    if ids:
+        db.session.flush()
+        db.session.execute(
+            db.update(Round).where(Round.id.in_(ids)).values(article=Round.article)
+            .execution_options(synchronize_session=False)
+        )
+    return len(ids)
+
+
+# ---- Background backfill of flattened round columns ----
+# Rounds are processed in id order, BACKFILL_CHUNK_SIZE at a time, each chunk
+# in its own short transaction that also advances the persisted cursor in
+# `job_state` (so a killed or recycled worker resumes where it stopped). After
+# each chunk the job sleeps at least BACKFILL_THROTTLE_S and at least as long
+# as the chunk took, so it never holds SQLite's write lock more than half the
+# time and participant saves get in between chunks.
+BACKFILL_CHUNK_SIZE = int(os.environ.get("BACKFILL_CHUNK_SIZE", "500"))
+BACKFILL_THROTTLE_S = float(os.environ.get("BACKFILL_THROTTLE_S", "0.5"))
+_BACKFILL_JOB = 'backfill_flat'
+_JOB_STALE_S = 60  # a 'running' job without a heartbeat for this long is treated as dead
+
+
+def _job_progress(job: JobState | None) -> dict:
+    if job is None:
+        return {'status': 'idle', 'cursor': 0, 'processed': 0, 'updated': 0, 'total': None}
+    progress = {
+        'status': job.status,
+        'cursor': job.cursor,
+        'processed': job.processed,
+        'updated': job.updated,
+        'total': job.total,
+        'percent': round(100.0 * job.processed / job.total, 1) if job.total else None,
+        'started_at': job.started_at.isoformat() if job.started_at else None,
+        'heartbeat_at': job.heartbeat_at.isoformat() if job.heartbeat_at else None,
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None,
+        'error': job.error,
+    }
+    if job.status == 'running' and job.started_at and job.heartbeat_at and job.processed:
+        elapsed = max((job.heartbeat_at - job.started_at).total_seconds(), 1e-3)
+        rate = job.processed / elapsed
+        progress['rounds_per_s'] = round(rate, 1)
+        if job.total:
+            progress['eta_s'] = round(max(job.total - job.processed, 0) / rate, 1)
+    return progress
+
+
+def _claim_backfill_job(restart: bool = False) -> bool:
+    """Mark the job running unless another live worker already runs it."""
+    now = datetime.utcnow()
+    db.session.execute(
+        db.text("INSERT INTO job_state (name, status, cursor, processed, updated) "
+                "VALUES (:name, 'idle', 0, 0, 0) ON CONFLICT(name) DO NOTHING"),
+        {'name': _BACKFILL_JOB},
+    )
+    values = {'status': 'running', 'started_at': now, 'heartbeat_at': now, 'finished_at': None, 'error': None}
+    if restart:
+        values.update(cursor=0, processed=0, updated=0)
+    claimed = db.session.execute(
+        db.update(JobState)
+        .where(JobState.name == _BACKFILL_JOB)
+        .where(db.or_(
+            JobState.status != 'running',
+            JobState.heartbeat_at < now - timedelta(seconds=_JOB_STALE_S),
+        ))
+        .values(**values)
+    ).rowcount == 1
+    if claimed:
+        job = db.session.get(JobState, _BACKFILL_JOB)
+        remaining = db.session.scalar(db.select(db.func.count(Round.id)).where(Round.id > job.cursor))
+        job.total = job.processed + remaining
+    db.session.commit()
+    return claimed
+
+
+def _backfill_flat_chunk(topic_cache: dict) -> int:
+    """Process the next chunk after the cursor; returns the number of rounds seen."""
+    job = db.session.get(JobState, _BACKFILL_JOB)
+    if job.status == 'cancelling':
+        job.status = 'idle'
+        db.session.commit()
+        return 0
+    rounds = (
+        Round.query.options(db.undefer_group('payload'))
+        .filter(Round.id > job.cursor)
+        .order_by(Round.id.asc())
+        .limit(BACKFILL_CHUNK_SIZE)
+        .all()
+    )
+    if rounds:
+        job.updated += _backfill_rounds(rounds, topic_cache)
+        job.processed += len(rounds)
+        job.cursor = rounds[-1].id
+    else:
+        job.status = 'done'
+        job.finished_at = datetime.utcnow()
+    job.heartbeat_at = datetime.utcnow()
+    db.session.commit()
+    return len(rounds)
+
+
+def _backfill_flat_job():
+    with app.app_context():
+        topic_cache: dict = {}
+        try:
+            while True:
+                started = time.monotonic()
+                if not _backfill_flat_chunk(topic_cache):
+                    break
+                time.sleep(max(BACKFILL_THROTTLE_S, time.monotonic() - started))
+        except Exception as e:
+            db.session.rollback()
+            app.logger.exception("backfill job failed", extra={'fields': {'job': _BACKFILL_JOB}})
+            job = db.session.get(JobState, _BACKFILL_JOB)
+            job.status = 'failed'
+            job.error = str(e)
+            db.session.commit()
+        try:
+            job = db.session.get(JobState, _BACKFILL_JOB)
+            app.logger.info("backfill job stopped", extra={'fields': {'job': _BACKFILL_JOB, **_job_progress(job)}})
+        finally:
+            db.session.remove()
+
+
+# While _legacy_backfill_pending is set (at startup), the first request of each
+# process checks again and, if rounds still hold legacy text, starts the job
+# when it has never run (or restarts it if an earlier run is done). A job an
+# admin cancelled, or one that failed, is left alone; a 'running' job whose
+# worker died is resumed. Only one process wins the claim in job_state. The
+# flag is cleared once no legacy text is left.
+_legacy_backfill_pid = None
+_legacy_backfill_lock = threading.Lock()
+
+
+def _auto_backfill_allowed(job: JobState | None) -> bool:
+    if job is None or job.status == 'done':
+        return True
+    stale = job.heartbeat_at is None or job.heartbeat_at < datetime.utcnow() - timedelta(seconds=_JOB_STALE_S)
+    return job.status == 'running' and stale
+
+
+def _legacy_text_left() -> bool:
+    """Re-check legacy text, clearing _legacy_backfill_pending when none is left."""
+    global _legacy_backfill_pending
+    with db.engine.connect() as conn:
+        pending = _legacy_round_text_pending(conn)
+    if not pending:
+        _legacy_backfill_pending = False
+    return pending
+
+
+def _auto_backfill_flat():
+    with app.app_context():
+        try:
+            if not _legacy_text_left():
+                return
+            job = db.session.get(JobState, _BACKFILL_JOB)
+            if not _auto_backfill_allowed(job):
+                app.logger.info("legacy round text left; backfill job not started automatically", extra={'fields': {
+                    'job': _BACKFILL_JOB,
+                    'status': job.status,
+                    'hint': 'start it with /debug-backfill-flat',
+                }})
+                return
+            if not _claim_backfill_job(restart=job is not None and job.status == 'done'):
+                return
+        except Exception:
+            app.logger.exception("could not start the backfill job", extra={'fields': {'job': _BACKFILL_JOB}})
+            return
+        finally:
+            db.session.remove()
+    app.logger.info("backfill job started for legacy round text", extra={'fields': {'job': _BACKFILL_JOB}})
+    _backfill_flat_job()
+    with app.app_context():
+        try:
+            _legacy_text_left()
+        finally:
+            db.session.remove()
+
+
+@app.before_request
+def _start_legacy_backfill():
+    global _legacy_backfill_pid
+    if not _legacy_backfill_pending or _legacy_backfill_pid == os.getpid():
+        return
+    with _legacy_backfill_lock:
+        if _legacy_backfill_pid == os.getpid():
+            return
+        threading.Thread(target=_auto_backfill_flat, name="backfill-flat", daemon=True).start()
+        _legacy_backfill_pid = os.getpid()
+
+
 @app.route('/debug-backfill-flat')
+@admin_only
 def debug_backfill_flat():
-    """Diagnostics: backfill flattened round columns from stored JSON.
+    """Backfill flattened round columns from stored JSON.
 
     Usage:
-    - Backfill all rounds: /debug-backfill-flat
-    - Backfill only one participant: /debug-backfill-flat?pid=PROLIFIC_PID
+    - Start or resume the background job: /debug-backfill-flat
+    - Progress only: /debug-backfill-flat?action=status
+    - Stop after the current chunk: /debug-backfill-flat?action=cancel
+    - Start over from the first round: /debug-backfill-flat?action=restart
+    - Only one participant, in this request: /debug-backfill-flat?pid=PROLIFIC_PID
     """
     pid = request.args.get('pid')
-    q = Round.query
-    participant = None
     if pid:
         participant = Participant.query.filter_by(prolific_id=pid).first()
         if not participant:
             return {'error': 'Unknown pid', 'pid': pid}, 404
-        q = q.filter_by(participant_id=participant.id)
+        rounds = (
+            Round.query.options(db.undefer_group('payload'))
+            .filter_by(participant_id=participant.id)
+            .order_by(Round.id.asc())
+            .all()
+        )
+        updated = _backfill_rounds(rounds)
+        db.session.commit()
+        return {
+            'pid': pid,
+            'participant_id': participant.id,
+            'rounds_seen': len(rounds),
+            'rounds_updated': updated,
+            'hint': 'Now query flattened columns from the `round` table.'
+        }
+
+    action = request.args.get('action', 'start')
+    if action not in ('start', 'status', 'cancel', 'restart'):
+        return {'error': 'action must be start, status, cancel or restart'}, 400
+    started = False
+    if action == 'cancel':
+        db.session.execute(
+            db.update(JobState)
+            .where(JobState.name == _BACKFILL_JOB, JobState.status == 'running')
+            .values(status='cancelling')
+        )
+        db.session.commit()
+    elif action in ('start', 'restart'):
+        started = _claim_backfill_job(restart=action == 'restart')
+        if started:
+            threading.Thread(target=_backfill_flat_job, name="backfill-flat", daemon=True).start()
+    return {
+        'job': _BACKFILL_JOB,
+        'started': started,
+        'chunk_size': BACKFILL_CHUNK_SIZE,
+        'throttle_s': BACKFILL_THROTTLE_S,
+        **_job_progress(db.session.get(JobState, _BACKFILL_JOB)),
+    }
 
-    rounds = q.order_by(Round.id.asc()).all()
-    updated = 0
 
-    def _to_int(val):
-        if val is None:
-            return None
-        if isinstance(val, int):
-            return val
+# ---- Data export ----
+# Streams `round` joined to `participant` (or `participant` alone) in
+# keyset-paginated chunks: each chunk is one short read (id > last ORDER BY id
+# LIMIT n) whose transaction ends before the chunk is written out, so memory
+# stays bounded and a slow download never holds a read lock on responses.db.
+# The upper bound is fixed when the export starts and returned as the
+# watermark for the next incremental export: MAX(id) for rounds (pass it as
+# since_id), MAX(timestamp_updated) for participants (pass it as since), since
+# participants are updated in place and a new id says nothing about edits.
+EXPORT_CHUNK_SIZE = int(os.environ.get("EXPORT_CHUNK_SIZE", "1000"))
+EXPORT_FORMATS = {
+    'csv': 'text/csv',
+    'jsonl': 'application/x-ndjson',
+    'parquet': 'application/vnd.apache.parquet',
+}
+EXPORT_KINDS = ('rounds', 'participants')
+
+
+def _export_columns(kind: str) -> list[tuple[str, db.Column]]:
+    """(output name, column) pairs; round columns first, participant columns after."""
+    participant_cols = list(Participant.__table__.columns)
+    if kind == 'participants':
+        return [(c.name, c) for c in participant_cols]
+    round_cols = list(Round.__table__.columns)
+    round_names = {c.name for c in round_cols}
+    columns = [('round_id' if c.name == 'id' else c.name, c) for c in round_cols]
+    columns += _round_text_columns()
+    columns += [
+        (f'participant_{c.name}' if c.name in round_names else c.name, c)
+        for c in participant_cols
+        if c.name != 'id'
+    ]
+    return columns
+
+
+def _export_bounds(kind: str, reader) -> tuple[int, datetime | None]:
+    """(MAX(id), MAX(last save time) for participants) when the export starts."""
+    if kind == 'rounds':
+        upper_id, upper_ts = reader.scalar(db.select(db.func.max(Round.id))) or 0, None
+    else:
+        upper_id, upper_ts = reader.execute(
+            db.select(db.func.max(Participant.id), db.func.max(Participant.timestamp_updated))
+        ).one()
+    reader.rollback()
+    return upper_id or 0, upper_ts
+
+
+def _export_base_query(kind: str, columns: list[tuple[str, db.Column]]):
+    """(select of `columns`, key column, key output name, time column) for `kind`."""
+    if kind == 'rounds':
+        base = db.select(*[c.label(name) for name, c in columns]).select_from(Round).join(
+            Participant, Round.participant_id == Participant.id
+        )
+        return base, Round.id, 'round_id', Round.timestamp
+    base = db.select(*[c.label(name) for name, c in columns]).select_from(Participant)
+    return base, Participant.id, 'id', Participant.timestamp_updated
+
+
+def _export_chunks(kind: str, upper_id: int, since_id: int | None = None, since: datetime | None = None,
+                   chunk_size: int = EXPORT_CHUNK_SIZE, reader=None, upper_ts: datetime | None = None):
+    """Yield lists of row dicts, one per keyset chunk, for ids in (since_id, upper_id]
+    (and last saves in (since, upper_ts] when given)."""
+    base, key_col, key_name, ts_col = _export_base_query(kind, _export_columns(kind))
+    base = base.where(key_col <= upper_id)
+    if since is not None:
+        base = base.where(ts_col > since)
+    if upper_ts is not None:
+        base = base.where(ts_col <= upper_ts)
+
+    reader = reader or db.session
+    last_id = since_id or 0
+    while True:
+        stmt = (
+            base.where(key_col > last_id)
+            .order_by(key_col)
+            .limit(chunk_size)
+            .execution_options(yield_per=chunk_size)
+        )
         try:
-            s = str(val).strip()
-            return int(s) if s else None
-        except Exception:
-            return None
+            rows = [dict(row._mapping) for row in reader.execute(stmt)]
+            _fill_archived_payloads(kind, rows, reader)
+        finally:
+            reader.rollback()  # end the read transaction before the chunk is written out
+        if not rows:
+            return
+        last_id = rows[-1][key_name]
+        yield rows
+        if len(rows) < chunk_size:
+            return
 
-    for r in rounds:
-        payload = r.article if isinstance(r.article, dict) else None
-        if not isinstance(payload, dict):
+
+def _fill_archived_payloads(kind: str, rows: list[dict], reader):
+    """Put archived payloads back into export rows whose JSON columns are empty."""
+    if kind == 'rounds':
+        sources = [('round', 'round_id'), ('participant', 'participant_id')]
+    else:
+        sources = [('participant', 'id')]
+    for table, key in sources:
+        # Only payload columns the rows were selected with (the admin API projects fields).
+        columns = [c for c in ARCHIVED_PAYLOAD_COLUMNS[table] if rows and c in rows[0]]
+        ids = {row[key] for row in rows if any(row[c] is None for c in columns)}
+        if not ids:
             continue
+        payloads = _archived_payloads(reader, table, sorted(ids))
+        for row in rows:
+            for column in columns:
+                text = payloads.get((row[key], column)) if row.get(column) is None else None
+                if text is not None:
+                    row[column] = json.loads(text)
+
+
+def _export_value(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def _export_csv(chunks, names: list[str]):
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(names)
+    for rows in chunks:
+        for row in rows:
+            writer.writerow([
+                json.dumps(v, ensure_ascii=False) if isinstance(v, (dict, list)) else _export_value(v)
+                for v in (row[name] for name in names)
+            ])
+        yield buf.getvalue()
+        buf.seek(0)
+        buf.truncate()
+    yield buf.getvalue()
+
+
+def _export_jsonl(chunks):
+    for rows in chunks:
+        yield ''.join(
+            json.dumps({k: _export_value(v) for k, v in row.items()}, ensure_ascii=False) + '\n'
+            for row in rows
+        )
 
-        r.main_article_stable_id = payload.get('main_article_stable_id')
-        r.main_article_title = payload.get('main_article_title')
-        r.selected_rec_stable_id = payload.get('selected_recommendation_stable_id')
-        r.selected_rec_title = payload.get('selected_recommendation_title')
 
-        # Best-effort: derive chosen position and changing-label position from stored JSON.
-        rec_ids = payload.get('recommendations') or []
-        selected_id = payload.get('selected_recommendation_id')
-        try:
-            r.selected_rec_pos = int(rec_ids.index(selected_id)) if selected_id in rec_ids else None
-        except Exception:
-            r.selected_rec_pos = None
+def _pyarrow_available() -> bool:
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _export_parquet(chunks, columns: list[tuple[str, db.Column]], fileobj):
+    """Write chunks as Parquet row groups; JSON columns are stored as JSON text."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    def _arrow_type(col):
+        if isinstance(col.type, db.Integer):
+            return pa.int64()
+        if isinstance(col.type, db.DateTime):
+            return pa.timestamp('us')
+        return pa.string()
+
+    schema = pa.schema([(name, _arrow_type(col)) for name, col in columns])
+    json_names = [name for name, col in columns if isinstance(col.type, db.JSON)]
+    with pq.ParquetWriter(fileobj, schema) as writer:
+        for rows in chunks:
+            for row in rows:
+                for name in json_names:
+                    if row[name] is not None:
+                        row[name] = json.dumps(row[name], ensure_ascii=False)
+            writer.write_table(pa.Table.from_pylist(rows, schema=schema))
+
+
+def export_data(fmt: str, kind: str = 'rounds', since_id: int | None = None, since: datetime | None = None,
+                chunk_size: int = EXPORT_CHUNK_SIZE, fileobj=None, reader=None):
+    """Export study data; returns (iterator of str chunks or None, watermark).
+
+    CSV and JSONL are returned as an iterator of text chunks. Parquet needs a
+    seekable binary `fileobj`, is written into it, and returns None. `reader`
+    is the session to read from (default db.session, the live database). The
+    watermark is the highest round id, or for participants the latest save
+    time as an ISO string.
+    """
+    if kind == 'participants' and since_id is not None:
+        raise ValueError('since_id only applies to rounds; pass the participants watermark as since')
+    reader = reader or db.session
+    upper_id, upper_ts = _export_bounds(kind, reader)
+    chunks = _export_chunks(kind, upper_id, since_id=since_id, since=since, chunk_size=chunk_size,
+                            reader=reader, upper_ts=upper_ts)
+    columns = _export_columns(kind)
+    if kind == 'rounds':
+        watermark = upper_id
+    else:
+        watermark = (upper_ts or since).isoformat() if (upper_ts or since) else ''
+    if fmt == 'csv':
+        return _export_csv(chunks, [name for name, _ in columns]), watermark
+    if fmt == 'jsonl':
+        return _export_jsonl(chunks), watermark
+    _export_parquet(chunks, columns, fileobj)
+    return None, watermark
+
+
+def _parse_export_args(args) -> tuple[dict | None, str | None]:
+    fmt = args.get('format', 'csv')
+    kind = args.get('kind', 'rounds')
+    if fmt not in EXPORT_FORMATS:
+        return None, f"format must be one of {', '.join(EXPORT_FORMATS)}"
+    if kind not in EXPORT_KINDS:
+        return None, f"kind must be one of {', '.join(EXPORT_KINDS)}"
+    try:
+        since_id = int(args['since_id']) if args.get('since_id') else None
+        since = datetime.fromisoformat(args['since']) if args.get('since') else None
+        chunk_size = max(1, min(int(args.get('chunk', EXPORT_CHUNK_SIZE)), 50000))
+    except ValueError as e:
+        return None, str(e)
+    if kind == 'participants' and since_id is not None:
+        return None, 'since_id only applies to rounds; pass the participants watermark as since'
+    return {'fmt': fmt, 'kind': kind, 'since_id': since_id, 'since': since, 'chunk_size': chunk_size}, None
 
-        # Prefer explicit value if present (newer payloads), otherwise infer from labels.
-        explicit_pos = payload.get('changing_label_rec_pos')
-        if explicit_pos in (0, 1, '0', '1'):
-            try:
-                r.changing_label_rec_pos = int(explicit_pos)
-            except Exception:
-                r.changing_label_rec_pos = None
-        else:
-            try:
-                rec_labels = payload.get('recommendations_labels') or {}
-                # If exactly one rec label differs from the favourite label, treat it as the changing one.
-                candidates = []
-                for pos, rid in enumerate(rec_ids[:2]):
-                    lbl = rec_labels.get(str(rid))
-                    if lbl and lbl != FAV_REC_LABEL:
-                        candidates.append(pos)
-                r.changing_label_rec_pos = candidates[0] if len(candidates) == 1 else None
-            except Exception:
-                r.changing_label_rec_pos = None
 
-        main_id = payload.get('main_article_id')
-        if main_id is not None and main_id in df['index'].values:
-            try:
-                main_row = df[df['index'] == main_id].iloc[0].to_dict()
-                r.main_topic = normalize_article_row(main_row).get(TOPIC_COL)
-            except Exception:
-                r.main_topic = None
-        else:
-            r.main_topic = None
-
-        rec_ids = payload.get('recommendations') or []
-        rec_stable_ids = payload.get('recommendations_stable_ids') or []
-        rec_titles = payload.get('recommendations_titles') or []
-        rec_labels = payload.get('recommendations_labels') or {}
-        ratings = payload.get('ratings') or {}
-
-        def _rating_for_rec(rec_pos: int, key_prefix: str):
-            rec_id = rec_ids[rec_pos] if len(rec_ids) > rec_pos else None
-            if rec_id is not None:
-                v = ratings.get(f'{key_prefix}_{rec_id}')
-                if v not in (None, ''):
-                    return v
-            return ratings.get(f'{key_prefix}_{rec_pos}')
+@app.route('/debug-export')
+@admin_only
+def debug_export():
+    """Stream participant/round data as CSV, JSONL or Parquet.
 
-        r.rec0_stable_id = rec_stable_ids[0] if len(rec_stable_ids) > 0 else None
-        r.rec0_title = rec_titles[0] if len(rec_titles) > 0 else None
-        rec0_id = rec_ids[0] if len(rec_ids) > 0 else None
-        if rec0_id is not None and rec0_id in df['index'].values:
-            try:
-                rec0_row = df[df['index'] == rec0_id].iloc[0].to_dict()
-                r.rec0_topic = normalize_article_row(rec0_row).get(TOPIC_COL)
-            except Exception:
-                r.rec0_topic = None
-        else:
-            r.rec0_topic = None
-        r.rec0_label_text = rec_labels.get(str(rec0_id)) if rec0_id is not None else None
-        r.rec0_likelihood = _to_int(_rating_for_rec(0, 'likelihood'))
-        r.rec0_preference_fit = _to_int(_rating_for_rec(0, 'preference_fit'))
-        r.rec0_constructive = _to_int(_rating_for_rec(0, 'constructive'))
-        r.rec0_understandable = _to_int(_rating_for_rec(0, 'understandable'))
-        r.rec0_trustworthy = _to_int(_rating_for_rec(0, 'trustworthy'))
-        r.rec0_relevant = _to_int(_rating_for_rec(0, 'relevant'))
-
-        r.rec1_stable_id = rec_stable_ids[1] if len(rec_stable_ids) > 1 else None
-        r.rec1_title = rec_titles[1] if len(rec_titles) > 1 else None
-        rec1_id = rec_ids[1] if len(rec_ids) > 1 else None
-        if rec1_id is not None and rec1_id in df['index'].values:
-            try:
-                rec1_row = df[df['index'] == rec1_id].iloc[0].to_dict()
-                r.rec1_topic = normalize_article_row(rec1_row).get(TOPIC_COL)
-            except Exception:
-                r.rec1_topic = None
-        else:
-            r.rec1_topic = None
-        r.rec1_label_text = rec_labels.get(str(rec1_id)) if rec1_id is not None else None
-        r.rec1_likelihood = _to_int(_rating_for_rec(1, 'likelihood'))
-        r.rec1_preference_fit = _to_int(_rating_for_rec(1, 'preference_fit'))
-        r.rec1_constructive = _to_int(_rating_for_rec(1, 'constructive'))
-        r.rec1_understandable = _to_int(_rating_for_rec(1, 'understandable'))
-        r.rec1_trustworthy = _to_int(_rating_for_rec(1, 'trustworthy'))
-        r.rec1_relevant = _to_int(_rating_for_rec(1, 'relevant'))
-
-        # Store ratings by article type (low-interest vs high-interest)
-        r.low_preference_fit = _to_int(ratings.get('low_preference_fit'))
-        r.low_constructive = _to_int(ratings.get('low_constructive'))
-        r.low_understandable = _to_int(ratings.get('low_understandable'))
-        r.low_trustworthy = _to_int(ratings.get('low_trustworthy'))
-        r.low_relevant = _to_int(ratings.get('low_relevant'))
-
-        r.high_preference_fit = _to_int(ratings.get('high_preference_fit'))
-        r.high_constructive = _to_int(ratings.get('high_constructive'))
-        r.high_understandable = _to_int(ratings.get('high_understandable'))
-        r.high_trustworthy = _to_int(ratings.get('high_trustworthy'))
-        r.high_relevant = _to_int(ratings.get('high_relevant'))
-
-        r.label_understandable = _to_int(ratings.get('label_understandable'))
-        r.label_useful = _to_int(ratings.get('label_useful'))
-        r.label_influenced = _to_int(ratings.get('label_influenced'))
-        r.label_attention = _to_int(ratings.get('label_attention'))
-        r.label_more = _to_int(ratings.get('label_more'))
-
-        r.rb_attention_check = _to_int(ratings.get('rb_attention_check'))
-
-        updated += 1
+    Usage:
+    - All rounds joined to their participant: /debug-export?format=csv
+    - One row per participant: /debug-export?format=jsonl&kind=participants
+    - Incremental: /debug-export?since_id=<X-Export-Watermark of the previous export>
+      (participants: /debug-export?kind=participants&since=<X-Export-Watermark>)
+    - Saved after a time: /debug-export?since=2026-10-01T00:00:00
+    - From the live database instead of the snapshot: /debug-export?live=1
+    """
+    options, error = _parse_export_args(request.args)
+    if error:
+        return {'error': error}, 400
+    options['reader'], source = analytics_session()
+    filename = f"{options['kind']}_{datetime.utcnow():%Y%m%dT%H%M%S}.{options['fmt']}"
+
+    if options['fmt'] == 'parquet':
+        if not _pyarrow_available():
+            return {'error': 'Parquet export needs pyarrow (pip install pyarrow).'}, 501
+        # Parquet's footer is written last, so spool to disk and stream the file.
+        spool = tempfile.SpooledTemporaryFile(max_size=32 * 1024 * 1024)
+        _, watermark = export_data(fileobj=spool, **options)
+        spool.seek(0)
+
+        def _stream_file():
+            with spool:
+                while block := spool.read(64 * 1024):
+                    yield block
+
+        body = _stream_file()
+    else:
+        body, watermark = export_data(**options)
+        body = stream_with_context(body)
+
+    return Response(body, mimetype=EXPORT_FORMATS[options['fmt']], headers={
+        'Content-Disposition': f'attachment; filename="{filename}"',
+        'X-Export-Watermark': str(watermark),
+        'X-Data-Source': source['source'],
+        'X-Snapshot-Age': '' if source['snapshot_age_s'] is None else str(source['snapshot_age_s']),
+    })
+
+
+# ---- Admin data API ----
+# /debug-api/participants and /debug-api/rounds page through the same columns
+# as the export, newest snapshot by default (?live=1 for the live database).
+# Pages are keyset-paginated on the primary key (pass `next_after` back as
+# `after`), read as plain rows rather than ORM objects, and may be narrowed to
+# some `fields`.
+ADMIN_API_PAGE_SIZE = 100
+ADMIN_API_MAX_PAGE_SIZE = 1000
+
+
+def _completed_clause(participant_id_col):
+    """Participant has saved its final round (same definition as completion_summary)."""
+    final = db.aliased(Round)
+    return db.exists().where(
+        final.participant_id == participant_id_col,
+        final.round_number == STUDY_TOTAL_ROUNDS,
+        final.main_article_ref.isnot(None),
+    )
 
-    db.session.commit()
+
+@app.route('/debug-api/<kind>')
+@admin_only
+def debug_api(kind: str):
+    """One page of participants or rounds (rounds carry their participant's columns).
+
+    Usage:
+    - /debug-api/participants?limit=500
+    - Next page: /debug-api/participants?after=<next_after of the previous page>
+    - /debug-api/rounds?fields=round_id,prolific_id,main_topic,rec0_trustworthy
+    - Filters: condition=, explanation_pair=, completed=0|1, since=/until= (ISO time of the
+      participant's or the round's last save)
+    """
+    if kind not in EXPORT_KINDS:
+        return {'error': f"kind must be one of {', '.join(EXPORT_KINDS)}"}, 404
+    args = request.args
+    try:
+        after = int(args.get('after', 0))
+        limit = max(1, min(int(args.get('limit', ADMIN_API_PAGE_SIZE)), ADMIN_API_MAX_PAGE_SIZE))
+        since = datetime.fromisoformat(args['since']) if args.get('since') else None
+        until = datetime.fromisoformat(args['until']) if args.get('until') else None
+    except ValueError as e:
+        return {'error': str(e)}, 400
+    if args.get('completed') not in (None, '0', '1'):
+        return {'error': 'completed must be 0 or 1'}, 400
+
+    columns = _export_columns(kind)
+    key_name = 'round_id' if kind == 'rounds' else 'id'
+    if args.get('fields'):
+        fields = [f.strip() for f in args['fields'].split(',') if f.strip()]
+        unknown = sorted(set(fields) - {name for name, _ in columns})
+        if unknown:
+            return {'error': f"unknown fields: {', '.join(unknown)}"}, 400
+        if key_name not in fields:
+            fields.insert(0, key_name)
+    else:
+        fields = [name for name, _ in columns]
+    # Keys the archived-payload lookup needs are selected even when not requested.
+    needed = {key_name, 'participant_id'} if kind == 'rounds' else {key_name}
+    selected = [(name, c) for name, c in columns if name in fields or name in needed]
+
+    base, key_col, _, ts_col = _export_base_query(kind, selected)
+    if args.get('condition'):
+        base = base.where(Participant.condition == args['condition'])
+    if args.get('explanation_pair'):
+        base = base.where(Participant.explanation_pair == args['explanation_pair'])
+    if args.get('completed') is not None:
+        completed = _completed_clause(Participant.id)
+        base = base.where(completed if args['completed'] == '1' else ~completed)
+    if since is not None:
+        base = base.where(ts_col >= since)
+    if until is not None:
+        base = base.where(ts_col < until)
+
+    reader, source = analytics_session()
+    rows = [dict(row._mapping) for row in reader.execute(
+        base.where(key_col > after).order_by(key_col).limit(limit)
+    )]
+    _fill_archived_payloads(kind, rows, reader)
     return {
-        'pid': pid,
-        'participant_id': participant.id if participant else None,
-        'rounds_seen': len(rounds),
-        'rounds_updated': updated,
-        'hint': 'Now query flattened columns from the `round` table.'
+        'kind': kind,
+        'data': source,
+        'items': [{name: _export_value(row[name]) for name in fields} for row in rows],
+        'next_after': rows[-1][key_name] if len(rows) == limit else None,
     }
 
+
+@app.cli.command('export')
+@click.option('--format', 'fmt', type=click.Choice(list(EXPORT_FORMATS)), default='csv', show_default=True)
+@click.option('--kind', type=click.Choice(EXPORT_KINDS), default='rounds', show_default=True)
+@click.option('--out', default='-', help="Output file ('-' for stdout; Parquet needs a file).")
+@click.option('--since-id', type=int, help='Only rounds with a larger id (the watermark of a previous export).')
+@click.option('--since', type=click.DateTime(formats=['%Y-%m-%d', '%Y-%m-%dT%H:%M:%S', '%Y-%m-%d %H:%M:%S',
+                                                     '%Y-%m-%dT%H:%M:%S.%f']),
+              help='Only rows saved after this time (UTC; for participants, the watermark of a previous export).')
+@click.option('--chunk-size', type=int, default=EXPORT_CHUNK_SIZE, show_default=True)
+@click.option('--live', is_flag=True, help='Read the live database instead of the analytics snapshot.')
+def export_command(fmt, kind, out, since_id, since, chunk_size, live):
+    """Export participant/round data without loading it all into memory."""
+    options = {'fmt': fmt, 'kind': kind, 'since_id': since_id, 'since': since, 'chunk_size': chunk_size}
+    if kind == 'participants' and since_id is not None:
+        raise click.UsageError('--since-id only applies to rounds; pass the participants watermark as --since.')
+    if fmt == 'parquet':
+        if out == '-':
+            raise click.UsageError('Parquet export needs --out FILE.')
+        if not _pyarrow_available():
+            raise click.ClickException('Parquet export needs pyarrow (pip install pyarrow).')
+    reader, source = open_analytics_session(live=live)
+    try:
+        if fmt == 'parquet':
+            with open(out, 'wb') as fh:
+                _, watermark = export_data(fileobj=fh, reader=reader, **options)
+        else:
+            body, watermark = export_data(reader=reader, **options)
+            with click.open_file(out, 'w', encoding='utf-8', lazy=False) as fh:
+                for text in body:
+                    fh.write(text)
+    finally:
+        if reader is not db.session:
+            reader.close()
+    age = '' if source['snapshot_age_s'] is None else f", {source['snapshot_age_s']}s old"
+    next_option = '--since-id' if kind == 'rounds' else '--since'
+    click.echo(f"read from {source['source']}{age}; watermark (next {next_option}): {watermark}", err=True)
+
+
+@app.cli.command('archive-payloads')
+@click.option('--table', type=click.Choice(['all', *ARCHIVED_PAYLOAD_COLUMNS]), default='all', show_default=True)
+@click.option('--min-age-h', type=float, default=PAYLOAD_ARCHIVE_MIN_AGE_H, show_default=True,
+              help='Only rows saved at least this many hours ago.')
+@click.option('--chunk-size', type=int, default=BACKFILL_CHUNK_SIZE, show_default=True)
+@click.option('--throttle', type=float, default=BACKFILL_THROTTLE_S, show_default=True,
+              help='Minimum pause between chunks (seconds), so live writes get the lock.')
+def archive_payloads_command(table, min_age_h, chunk_size, throttle):
+    """Move raw JSON payloads of finished, verified-flattened rows into payload_archive."""
+    cutoff = datetime.utcnow() - timedelta(hours=min_age_h)
+    codec = 'zstd' if _zstd_available() else 'zlib'
+    for name in (ARCHIVED_PAYLOAD_COLUMNS if table == 'all' else [table]):
+        after_id, archived, skipped = 0, 0, 0
+        while True:
+            started = time.monotonic()
+            result = _archive_chunk(name, after_id, cutoff, chunk_size)
+            if result is None:
+                break
+            after_id, n_archived, n_skipped = result
+            archived += n_archived
+            skipped += n_skipped
+            time.sleep(max(throttle, time.monotonic() - started))
+        click.echo(f"{name}: archived {archived} rows ({codec}), skipped {skipped} whose flattened columns "
+                   f"do not match their payload (run the backfill first)", err=True)
+    click.echo("Run VACUUM (or wait for auto_vacuum) to shrink the database file.", err=True)
+
+
 def get_participant_id():
     return session.get('prolific_id')
 
 def update_participant_data(section, data):
     pid = get_participant_id()
     if not pid:
-        print("No Prolific PID found - skipping save.")
+        app.logger.warning("no Prolific PID found - skipping save", extra={'fields': {'section': section}})
         return
 
     try:
-        # Get or create participant
-        participant = Participant.query.filter_by(prolific_id=pid).first()
+        # Get or create participant. The highest participant id comes back in
+        # the same statement; a new participant needs it for its explanation pair.
+        max_id = db.select(db.func.max(Participant.id).label('max_id')).subquery()
+        max_participant_id, participant = db.session.execute(
+            db.select(max_id.c.max_id, Participant)
+            .select_from(max_id)
+            .outerjoin(Participant, Participant.prolific_id == pid)
+        ).one()
         if not participant:
             # Ensure explanation pair is set before creating participant
-            _ensure_least_rec_label_order(total_rounds=STUDY_TOTAL_ROUNDS)
-            
+            _ensure_least_rec_label_order(total_rounds=STUDY_TOTAL_ROUNDS, participant_num=max_participant_id or 0)
+
+            # Not flushed here: the INSERT then carries the section data too.
+            now = datetime.utcnow()
             participant = Participant(
                 prolific_id=pid,
-                timestamp_start=datetime.utcnow(),
+                timestamp_start=now,
+                timestamp_updated=now,
                 explanation_pair=session.get('explanation_pair', '')
             )
             db.session.add(participant)
-            db.session.flush()  # Assigns participant.id
 
         # Save section data
+        if section in ('demographics', 'pre_questionnaire', 'post_questionnaire'):
+            # Participants are updated in place, so exports filter on this, not on timestamp_start.
+            participant.timestamp_updated = datetime.utcnow()
         if section == 'demographics':
             participant.demographics = data
-            _sync_participant_flat_columns(participant, 'demographics', data)
         elif section == 'pre_questionnaire':
             participant.pre_questionnaire = data
-            _sync_participant_flat_columns(participant, 'pre_questionnaire', data)
         elif section == 'post_questionnaire':
             participant.post_questionnaire = data
         elif section == 'round':
             round_number = session.get('round', 1)
-            existing_round = Round.query.filter_by(participant_id=participant.id, round_number=round_number).first()
+            if participant.id is None:
+                db.session.flush()  # Assigns participant.id
+            existing_round = (
+                Round.query.options(db.undefer_group('payload'))
+                .filter_by(participant_id=participant.id, round_number=round_number)
+                .first()
+            )
             if not existing_round:
+                # Populated below and inserted at commit in a single INSERT.
                 existing_round = Round(
                     round_number=round_number,
                     participant_id=participant.id,
                     timestamp=datetime.utcnow()
                 )
                 db.session.add(existing_round)
-                db.session.flush()
-
-            def _to_int(val):
-                if val is None:
-                    return None
-                if isinstance(val, int):
-                    return val
-                try:
-                    s = str(val).strip()
-                    return int(s) if s else None
-                except Exception:
-                    return None
-
-            # Flatten rating-box data (if present)
-            article_payload = data.get('article') if isinstance(data, dict) else None
-            if isinstance(article_payload, dict):
-                existing_round.main_article_stable_id = article_payload.get('main_article_stable_id')
-                existing_round.main_article_title = article_payload.get('main_article_title')
-                existing_round.selected_rec_stable_id = article_payload.get('selected_recommendation_stable_id')
-                existing_round.selected_rec_title = article_payload.get('selected_recommendation_title')
-                existing_round.selected_rec_pos = article_payload.get('selected_recommendation_pos')
-                existing_round.changing_label_rec_pos = article_payload.get('changing_label_rec_pos')
-
-                main_id = article_payload.get('main_article_id')
-                if main_id is not None and main_id in df['index'].values:
-                    try:
-                        main_row = df[df['index'] == main_id].iloc[0].to_dict()
-                        existing_round.main_topic = normalize_article_row(main_row).get(TOPIC_COL)
-                    except Exception:
-                        existing_round.main_topic = None
-                else:
-                    existing_round.main_topic = None
-
-                rec_stable_ids = article_payload.get('recommendations_stable_ids') or []
-                rec_titles = article_payload.get('recommendations_titles') or []
-                rec_ids = article_payload.get('recommendations') or []
-                rec_labels = article_payload.get('recommendations_labels') or {}
-                ratings = article_payload.get('ratings') or {}
-
-                def _rating_for_rec(rec_pos: int, key_prefix: str):
-                    """Get a rating value for a recommendation.
-
-                    New data uses keys like: `${key_prefix}_${rec_id}` (because the form
-                    names are based on rec.index). Some older code used `${key_prefix}_${pos}`.
-                    """
-                    rec_id = rec_ids[rec_pos] if len(rec_ids) > rec_pos else None
-                    if rec_id is not None:
-                        v = ratings.get(f'{key_prefix}_{rec_id}')
-                        if v not in (None, ''):
-                            return v
-                    return ratings.get(f'{key_prefix}_{rec_pos}')
-
-                # Recommendation 0
-                existing_round.rec0_stable_id = rec_stable_ids[0] if len(rec_stable_ids) > 0 else None
-                existing_round.rec0_title = rec_titles[0] if len(rec_titles) > 0 else None
-                rec0_id = rec_ids[0] if len(rec_ids) > 0 else None
-                if rec0_id is not None and rec0_id in df['index'].values:
-                    try:
-                        rec0_row = df[df['index'] == rec0_id].iloc[0].to_dict()
-                        existing_round.rec0_topic = normalize_article_row(rec0_row).get(TOPIC_COL)
-                    except Exception:
-                        existing_round.rec0_topic = None
-                else:
-                    existing_round.rec0_topic = None
-                existing_round.rec0_label_text = rec_labels.get(str(rec0_id)) if rec0_id is not None else None
-                existing_round.rec0_likelihood = _to_int(_rating_for_rec(0, 'likelihood'))
-                existing_round.rec0_preference_fit = _to_int(_rating_for_rec(0, 'preference_fit'))
-                existing_round.rec0_constructive = _to_int(_rating_for_rec(0, 'constructive'))
-                existing_round.rec0_understandable = _to_int(_rating_for_rec(0, 'understandable'))
-                existing_round.rec0_trustworthy = _to_int(_rating_for_rec(0, 'trustworthy'))
-                existing_round.rec0_relevant = _to_int(_rating_for_rec(0, 'relevant'))
-
-                # Recommendation 1
-                existing_round.rec1_stable_id = rec_stable_ids[1] if len(rec_stable_ids) > 1 else None
-                existing_round.rec1_title = rec_titles[1] if len(rec_titles) > 1 else None
-                rec1_id = rec_ids[1] if len(rec_ids) > 1 else None
-                if rec1_id is not None and rec1_id in df['index'].values:
-                    try:
-                        rec1_row = df[df['index'] == rec1_id].iloc[0].to_dict()
-                        existing_round.rec1_topic = normalize_article_row(rec1_row).get(TOPIC_COL)
-                    except Exception:
-                        existing_round.rec1_topic = None
-                else:
-                    existing_round.rec1_topic = None
-                existing_round.rec1_label_text = rec_labels.get(str(rec1_id)) if rec1_id is not None else None
-                existing_round.rec1_likelihood = _to_int(_rating_for_rec(1, 'likelihood'))
-                existing_round.rec1_preference_fit = _to_int(_rating_for_rec(1, 'preference_fit'))
-                existing_round.rec1_constructive = _to_int(_rating_for_rec(1, 'constructive'))
-                existing_round.rec1_understandable = _to_int(_rating_for_rec(1, 'understandable'))
-                existing_round.rec1_trustworthy = _to_int(_rating_for_rec(1, 'trustworthy'))
-                existing_round.rec1_relevant = _to_int(_rating_for_rec(1, 'relevant'))
-
-                # Store ratings by article type (low-interest vs high-interest)
-                existing_round.low_preference_fit = _to_int(ratings.get('low_preference_fit'))
-                existing_round.low_constructive = _to_int(ratings.get('low_constructive'))
-                existing_round.low_understandable = _to_int(ratings.get('low_understandable'))
-                existing_round.low_trustworthy = _to_int(ratings.get('low_trustworthy'))
-                existing_round.low_relevant = _to_int(ratings.get('low_relevant'))
-
-                existing_round.high_preference_fit = _to_int(ratings.get('high_preference_fit'))
-                existing_round.high_constructive = _to_int(ratings.get('high_constructive'))
-                existing_round.high_understandable = _to_int(ratings.get('high_understandable'))
-                existing_round.high_trustworthy = _to_int(ratings.get('high_trustworthy'))
-                existing_round.high_relevant = _to_int(ratings.get('high_relevant'))
-
-                # Label items (shared)
-                existing_round.label_understandable = _to_int(ratings.get('label_understandable'))
-                existing_round.label_useful = _to_int(ratings.get('label_useful'))
-                existing_round.label_influenced = _to_int(ratings.get('label_influenced'))
-                existing_round.label_attention = _to_int(ratings.get('label_attention'))
-                existing_round.label_more = _to_int(ratings.get('label_more'))
-
-                # Rating-box attention check (round 3 only)
-                existing_round.rb_attention_check = _to_int(ratings.get('rb_attention_check'))
+
+            # Flattened rating-box columns are filled by the round_flatten_article_* triggers.
             for k in ['theme_selection', 'article', 'mid_questionnaire']:
                 if k in data:
                     val = getattr(existing_round, k)
                     if val and isinstance(val, dict) and isinstance(data[k], dict):
-                        val.update(data[k])
-                        setattr(existing_round, k, val)
+                        # New dict, not val.update(): an in-place change is not detected, so the
+                        # column (and its flattening trigger) would not be written.
+                        setattr(existing_round, k, {**val, **data[k]})
                     else:
                         setattr(existing_round, k, data[k])
             existing_round.timestamp = datetime.utcnow()
 
         db.session.commit()
-        print(f"[SAVE] '{section}' saved for participant {pid} at {datetime.utcnow().isoformat()}")
+        app.logger.info("saved", extra={'fields': {'section': section}})
 
     except Exception as e:
         db.session.rollback()
-        print(f"[ERROR] Failed to save '{section}' for participant {pid}: {e}")
+        app.logger.exception("failed to save", extra={'fields': {'section': section, 'error': str(e)}})
 
 
 
@@ -1159,6 +3836,7 @@ def landing():
     return render_template('landing.html')
 
 @app.route('/demographics', methods=['GET', 'POST'])
+@idempotent_form
 def demographics():
     if request.method == 'POST':
         gender = request.form.get('gender')
@@ -1229,6 +3907,7 @@ def demographics():
     return render_template('demographics.html')
 
 @app.route('/pre-questionnaire', methods=['GET', 'POST'])
+@idempotent_form
 @require_previous_step('demographics')
 def pre_questionnaire():
     if request.method == 'POST':
@@ -1282,12 +3961,10 @@ def pre_questionnaire():
         fav_selection = data.get('favourite_topic_1') if list_name == 'A' else data.get('favourite_topic_2')
         fav_topic = _map_list_topic(list_name, fav_selection)
 
-        if fav_topic:
-            candidates = df[df[TOPIC_COL].astype(str).str.strip().str.lower() == fav_topic.strip().lower()]
-        else:
-            candidates = df
-
-        first_row = candidates.sample(1).iloc[0] if not candidates.empty else df.sample(1).iloc[0]
+        rng = participant_rng('main', round_number)
+        first_row = _pick_article_from_topic(fav_topic, [], None, rng)
+        if first_row is None:
+            first_row = _random_article_row(rng)
         first_article_id = int(first_row['index'])
 
         session['first_article_id'] = first_article_id
@@ -1299,6 +3976,7 @@ def pre_questionnaire():
 
 
 @app.route('/instructions', methods=['GET', 'POST'])
+@idempotent_form
 @require_previous_step('pre_questionnaire')
 def instructions():
     if request.method == 'POST':
@@ -1312,18 +3990,18 @@ from datetime import datetime, timedelta
 import random
 
 @app.route('/article/<int:article_id>', methods=['GET', 'POST'])
+@idempotent_form
 @require_previous_step('instructions')
 def article(article_id):
     # if article_id not in df['index'].values:
     #     return redirect(url_for('select_article'))
 
-    row = df[df['index'] == article_id]
-    if row.empty:
+    article_data = _find_article_row(article_id)
+    if article_data is None:
         # If an invalid/unknown article_id is requested, fall back to a random known article.
-        fallback_row = df.sample(1).iloc[0]
+        fallback_row = _random_article_row(participant_rng('fallback', article_id))
         return redirect(url_for('article', article_id=int(fallback_row['index'])))
 
-    article_data = row.iloc[0].to_dict()
     # Normalize keys to what templates expect (Title, Content, Image URL, Author, Date)
     article_data = normalize_article_row(article_data)
     article_index = article_data['index']
@@ -1362,6 +4040,10 @@ def article(article_id):
 
     # session['last_article_had_label'] = show_label
 
+    # Recommendations and their order for this round. Seeded per participant and
+    # round, so a reload with the same seen articles shows the same ones.
+    rng = participant_rng('round', round_number)
+
     # Generate recommendations (only on GET)
     if request.method == 'GET':
         # Ensure per-participant randomized label order exists.
@@ -1373,14 +4055,8 @@ def article(article_id):
             current_topic_str = _normalize_topic_value(article_data.get(TOPIC_COL, ''))
             fav_topic_str = _normalize_topic_value(fav_topic)
             if current_topic_str != fav_topic_str:
-                main_candidates = df[
-                    (df[TOPIC_COL].astype(str).str.strip().str.lower() == fav_topic_str) &
-                    (~df['index'].isin(seen_ids))
-                ]
-                if main_candidates.empty:
-                    main_candidates = df[df[TOPIC_COL].astype(str).str.strip().str.lower() == fav_topic_str]
-                if not main_candidates.empty:
-                    new_row = main_candidates.sample(1).iloc[0]
+                new_row = _pick_article_from_topic(fav_topic, seen_ids, None, participant_rng('main', round_number))
+                if new_row is not None:
                     return redirect(url_for('article', article_id=int(new_row['index'])))
 
         # Build exactly two recommendations:
@@ -1390,35 +4066,8 @@ def article(article_id):
         try:
             rec_records = []
 
-            def _topic_mask(topic_value: str | None):
-                if not topic_value:
-                    return None
-                topic_str = _normalize_topic_value(topic_value)
-                return df[TOPIC_COL].astype(str).str.strip().str.lower() == topic_str
-
             def _pick_one_from_topic(topic_value: str | None):
-                if not topic_value:
-                    return None
-                mask = _topic_mask(topic_value)
-                if mask is None:
-                    return None
-
-                # Prefer unseen and not-the-main-article.
-                candidates = df[mask & (~df['index'].isin(seen_ids)) & (df['index'] != article_index)]
-                if not candidates.empty:
-                    return candidates.sample(1).iloc[0].to_dict()
-
-                # Next allow seen, but still avoid main article.
-                candidates = df[mask & (df['index'] != article_index)]
-                if not candidates.empty:
-                    return candidates.sample(1).iloc[0].to_dict()
-
-                # Finally, allow even the main article (duplicate main+rec is acceptable).
-                candidates = df[mask]
-                if not candidates.empty:
-                    return candidates.sample(1).iloc[0].to_dict()
-
-                return None
+                return _pick_article_from_topic(topic_value, seen_ids, article_index, rng)
 
             rec_fav = _pick_one_from_topic(fav_topic)
             rec_least = _pick_one_from_topic(least_topic)
@@ -1449,7 +4098,7 @@ def article(article_id):
                 # Absolute last resort: duplicate the current article.
                 rec_records = [article_data, article_data]
 
-            random.shuffle(rec_records)
+            rng.shuffle(rec_records)
 
             # Normalize each recommendation for template compatibility
             recommendations = [normalize_article_row(rec) for rec in rec_records[:2]]
@@ -1460,8 +4109,6 @@ def article(article_id):
         # Assign recommendation labels:
         # - favourite-topic rec: fixed label
         # - least-topic rec: rotating label (random order per participant), different each round
-        rec_labels_by_id: dict[str, str] = {}
-        rec_kinds_by_id: dict[str, str] = {}
         least_label_order = session.get('least_rec_label_order') or []
         least_label_for_round = None
         if isinstance(least_label_order, list) and least_label_order:
@@ -1470,26 +4117,9 @@ def article(article_id):
             except Exception:
                 least_label_for_round = least_label_order[0]
 
-        fav_topic_str = _normalize_topic_value(fav_topic)
-        least_topic_str = _normalize_topic_value(least_topic)
-        for rec in recommendations:
-            rec_topic_str = _normalize_topic_value(rec.get(TOPIC_COL))
-            rec_id = str(rec.get('index'))
-
-            if fav_topic_str and rec_topic_str == fav_topic_str:
-                rec_labels_by_id[rec_id] = ''
-                rec_kinds_by_id[rec_id] = 'fav'
-            elif least_topic_str and rec_topic_str == least_topic_str:
-                rec_labels_by_id[rec_id] = least_label_for_round or ''
-                rec_kinds_by_id[rec_id] = 'least'
-            else:
-                # If topics are missing (e.g., duplicates), assign remaining slot deterministically.
-                if len([v for v in rec_labels_by_id.values() if v == '']) < 1:
-                    rec_labels_by_id[rec_id] = ''
-                    rec_kinds_by_id[rec_id] = 'fav'
-                else:
-                    rec_labels_by_id[rec_id] = least_label_for_round or ''
-                    rec_kinds_by_id[rec_id] = 'least'
+        rec_labels_by_id, rec_kinds_by_id = _assign_rec_labels(
+            recommendations, fav_topic, least_topic, least_label_for_round
+        )
 
         session['current_recommendations'] = [rec['index'] for rec in recommendations]
         session['current_recommendations_labels'] = rec_labels_by_id
@@ -1499,11 +4129,9 @@ def article(article_id):
         recommendations = []
         ids = session.get('current_recommendations', [])
         for rec_id in ids:
-            row = df[df['index'] == rec_id]
-            if not row.empty:
-                rec_data = row.iloc[0].to_dict()
-                rec_data = normalize_article_row(rec_data)
-                recommendations.append(rec_data)
+            rec_data = _find_article_row(rec_id)
+            if rec_data is not None:
+                recommendations.append(normalize_article_row(rec_data))
 
     # # Generate random C2PA badge if needed
     # cr_labels = ['cr1.png', 'cr2.png', 'cr3.png', 'cr4.png']
@@ -1531,16 +4159,9 @@ def article(article_id):
         except Exception:
             selected_rec_pos = None
 
-        changing_label_rec_pos = None
-        try:
-            kinds_by_id = session.get('current_recommendations_kinds', {}) or {}
-            # The changing explanation is intended for the least-topic recommendation.
-            for pos, rec_id in enumerate(recommendations_ids[:2]):
-                if str(kinds_by_id.get(str(rec_id), '')).strip() == 'least':
-                    changing_label_rec_pos = int(pos)
-                    break
-        except Exception:
-            changing_label_rec_pos = None
+        changing_label_rec_pos = _changing_label_pos(
+            recommendations_ids, session.get('current_recommendations_kinds', {}) or {}
+        )
 
         if selected_article_id is None or selected_article_id not in recommendations_ids:
             return render_template(
@@ -1563,22 +4184,25 @@ def article(article_id):
 
         recommendation_stable_ids = []
         recommendation_titles = []
+        recommendation_topics = []
         for rec_id in recommendations_ids:
-            rec_row = df[df['index'] == rec_id]
-            if rec_row.empty:
+            rec_row = _find_article_row(rec_id)
+            if rec_row is None:
                 recommendation_stable_ids.append(None)
                 recommendation_titles.append(None)
+                recommendation_topics.append(None)
                 continue
-            rec_record = normalize_article_row(rec_row.iloc[0].to_dict())
+            rec_record = normalize_article_row(rec_row)
             recommendation_stable_ids.append(get_stable_article_id(rec_record))
             recommendation_titles.append(rec_record.get('Title', None))
+            recommendation_topics.append(rec_record.get(TOPIC_COL))
 
         selected_rec_title = None
         selected_rec_stable_id = None
         try:
-            selected_row = df[df['index'] == selected_article_id]
-            if not selected_row.empty:
-                selected_rec_record = normalize_article_row(selected_row.iloc[0].to_dict())
+            selected_row = _find_article_row(selected_article_id)
+            if selected_row is not None:
+                selected_rec_record = normalize_article_row(selected_row)
                 selected_rec_title = selected_rec_record.get('Title', None)
                 selected_rec_stable_id = get_stable_article_id(selected_rec_record)
         except Exception:
@@ -1651,6 +4275,7 @@ def article(article_id):
                 'main_article_id': article_index,
                 'main_article_stable_id': main_article_stable_id,
                 'main_article_title': article_data.get('Title', ''),
+                'main_topic': article_data.get(TOPIC_COL),
                 'selected_recommendation_id': selected_article_id,
                 'selected_recommendation_stable_id': selected_rec_stable_id,
                 'selected_recommendation_title': selected_rec_title,
@@ -1660,6 +4285,7 @@ def article(article_id):
                 'recommendations_labels': session.get('current_recommendations_labels', {}),
                 'recommendations_stable_ids': recommendation_stable_ids,
                 'recommendations_titles': recommendation_titles,
+                'recommendations_topics': recommendation_topics,
                 'ratings': ratings
             }
         })
@@ -1669,13 +4295,11 @@ def article(article_id):
         if round_number < total_rounds:
             session['round'] = round_number + 1
             # pick a new main article not seen yet
-            remaining = df[~df['index'].isin(seen_ids)]
-            if remaining.empty:
+            next_rng = participant_rng('next_article', round_number + 1)
+            next_id = _sample_id(CATALOG.ids, seen_ids, next_rng)
+            if next_id is None:
                 # if we run out, allow repeats (shouldn't happen normally)
-                next_row = df.sample(1).iloc[0]
-            else:
-                next_row = remaining.sample(1).iloc[0]
-            next_id = int(next_row['index'])
+                next_id = next_rng.choice(CATALOG.ids)
             session['next_article'] = next_id
             seen_ids.add(next_id)
             session['seen_article_ids'] = list(seen_ids)
@@ -1685,15 +4309,16 @@ def article(article_id):
         session['study_completed'] = True
         return redirect(url_for('thank_you'))
 
-    # Add random metadata if missing
+    # Add random metadata if missing (the same for every participant who sees the article)
+    meta_rng = random.Random(f'{STUDY_RNG_SEED}:article:{article_index}')
     if 'Author' not in article_data or not article_data['Author']:
-        article_data['Author'] = random.choice([
+        article_data['Author'] = meta_rng.choice([
             "Olivia Hansen", "Jonas Berg", "Elena Novak", "Anders Dahl", 
             "Nora Larsen", "Mateo Sæther", "Sofie Zhang", "Henrik Müller"
         ])
 
     if 'Date' not in article_data or not article_data['Date']:
-        days_ago = random.randint(0, 5)
+        days_ago = meta_rng.randint(0, 5)
         article_data['Date'] = (datetime.now() - timedelta(days=days_ago)).strftime("%B %d, %Y")
 
     return render_template(
@@ -1734,6 +4359,43 @@ def reset_db():
         return f"Ошибка при очистке: {e}"
 
 
+# ---- Server process lifecycle ----
+# Hooks for a pre-forking server that imports the app once in its master
+# (gunicorn.conf.py with preload_app): the catalog, compiled templates and the
+# schema/trigger setup above are then done once and shared copy-on-write.
+def warm_up(connect: bool = True):
+    """Compile every template and, with connect, open a DB connection.
+
+    Run before a worker takes traffic so the first participants it serves do
+    not pay for template compilation or the SQLite connect and PRAGMAs.
+    """
+    for name in app.jinja_env.list_templates():
+        app.jinja_env.get_template(name)
+    if connect:
+        with app.app_context():
+            db.session.execute(db.text('SELECT 1'))
+            db.session.remove()
+
+
+def release_db_connections():
+    """Close the pooled DB connections; the master calls this before forking workers."""
+    with app.app_context():
+        db.engine.dispose()
+
+
+def reset_after_fork():
+    """Per-process state for a freshly forked worker.
+
+    Forgets (without closing) DB connections inherited from the parent, which
+    still owns them, reseeds the log and profile sampling generators so
+    workers do not sample in lockstep, and starts this process's log listener.
+    """
+    with app.app_context():
+        db.engine.dispose(close=False)
+    _log_sample_rng.seed()
+    _profile_rng.seed()
+    _ensure_log_listener_started()
+
 
 if __name__ == '__main__':
     host = os.environ.get("HOST", "127.0.0.1")
@@ -0,0 +1,65 @@
+"""Gunicorn settings for the study (used by deploy/prolific-study.service).
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+The app is imported once in the master (preload_app), so the article catalog,
+compiled templates and the schema/trigger setup done at import are shared
+copy-on-write by all workers. Each worker then drops the DB connections it
+inherited, and warms up before it accepts requests. Workers are recycled
+after max_requests (+ jitter, so they do not all restart at once).
+
+Environment:
+    GUNICORN_BIND               default 127.0.0.1:8000
+    WEB_CONCURRENCY             worker processes, default 2
+    GUNICORN_THREADS            threads per worker, default 4 (1 = sync workers)
+    GUNICORN_MAX_REQUESTS       default 2000 (0 disables recycling)
+    GUNICORN_MAX_REQUESTS_JITTER  default 200
+    GUNICORN_TIMEOUT            default 30
+"""
+
+import os
+
+bind = os.environ.get("GUNICORN_BIND", "127.0.0.1:8000")
+workers = int(os.environ.get("WEB_CONCURRENCY", "2"))
+# Threads > 1 selects the gthread worker. Safe since the catalog is read-only
+# and randomness is per participant; scripts/check_concurrency.py checks it.
+threads = int(os.environ.get("GUNICORN_THREADS", "4"))
+
+preload_app = True
+max_requests = int(os.environ.get("GUNICORN_MAX_REQUESTS", "2000"))
+max_requests_jitter = int(os.environ.get("GUNICORN_MAX_REQUESTS_JITTER", "200"))
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", "30"))
+graceful_timeout = 25  # below TimeoutStopSec=30 in the systemd unit
+
+# Worker heartbeat files on tmpfs: on a disk-backed /tmp a slow fsync can
+# stall the heartbeat long enough for the master to kill a healthy worker.
+if os.path.isdir("/dev/shm"):
+    worker_tmp_dir = "/dev/shm"
+
+# Gunicorn's default access log format plus the request time in microseconds
+# (%(D)s) and the client address nginx forwards, which
+# scripts/replay_access_log.py reads. Behind nginx %(h)s is always 127.0.0.1,
+# so the replay groups participants by X-Forwarded-For.
+accesslog = "-"
+access_log_format = '%(h)s %(l)s %(u)s %(t)s "%(r)s" %(s)s %(b)s "%(f)s" "%(a)s" %(D)s "%({x-forwarded-for}i)s"'
+errorlog = "-"
+
+
+def when_ready(server):
+    # Runs in the master after the app is loaded, before any worker is forked.
+    import app
+
+    app.warm_up(connect=False)
+    app.release_db_connections()
+
+
+def post_fork(server, worker):
+    import app
+
+    app.reset_after_fork()
+
+
+def post_worker_init(worker):
+    import app
+
+    app.warm_up()
@@ -0,0 +1,278 @@
+"""Microbenchmarks for the study's hot paths, compared against a stored baseline.
+
+Cases (each timed in isolation, best of several repeats):
+- select_from_topic   recommendation sampling (_pick_article_from_topic)
+- normalize_row       normalize_article_row on one catalog row
+- article_lookup      catalog lookup by article id (_find_article_row)
+- save_round          update_participant_data('round', ...) for an existing round
+- backfill_flat       the backfill's per-round flattening (_backfill_rounds) for one participant
+- json_column         db.JSON serialize + parse of a round payload, per JSON backend
+- json_response       Flask JSON response for a 500-row admin API page, per JSON backend
+
+Catalog cases run at every --catalog-sizes value; the DB cases additionally
+run against responses databases pre-filled with --responses-sizes
+participants (two rounds each). Each responses size runs in its own
+subprocess because the app binds its DB engine at import.
+
+Usage:
+    python scripts/benchmark.py                      # compare with baseline
+    python scripts/benchmark.py --save-baseline      # record a new baseline
+    python scripts/benchmark.py --threshold 0.10     # fail on >10% slowdown
+
+Baselines are machine specific: record one on the machine you compare on.
+The baseline records the machine it came from and a comparison on another
+machine prints a warning. Without a baseline the run exits 2 (nothing to
+compare with) unless --save-baseline is given.
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import timeit
+
+_SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+_REPO_DIR = os.path.dirname(_SCRIPTS_DIR)
+DEFAULT_BASELINE = os.path.join(_REPO_DIR, 'benchmarks', 'baseline.json')
+_MACHINE_KEY = '_machine'
+
+sys.path.insert(0, _SCRIPTS_DIR)
+
+from generate_fixtures import fill_responses, read_catalog_topics, write_catalog  # noqa: E402
+
+def _round_payload(main_id: int, recs: list[int], rng: random.Random) -> dict:
+    ratings = {}
+    for rec_id in recs:
+        for item in ('likelihood', 'preference_fit', 'constructive', 'understandable', 'trustworthy', 'relevant'):
+            ratings[f'{item}_{rec_id}'] = str(rng.randint(1, 5))
+    for item in ('label_understandable', 'label_useful', 'label_influenced', 'label_attention', 'label_more'):
+        ratings[item] = str(rng.randint(1, 5))
+    return {
+        'main_article_id': main_id,
+        'main_article_stable_id': f'A{main_id:07d}',
+        'main_article_title': f'Article {main_id}',
+        'selected_recommendation_id': recs[0],
+        'selected_recommendation_pos': 0,
+        'changing_label_rec_pos': 1,
+        'recommendations': recs,
+        'recommendations_labels': {str(recs[0]): '', str(recs[1]): 'Trending right now'},
+        'recommendations_stable_ids': [f'A{r:07d}' for r in recs],
+        'recommendations_titles': [f'Article {r}' for r in recs],
+        'ratings': ratings,
+    }
+
+
+def best_time(fn, repeat: int) -> float:
+    """Best per-call time in seconds (timeit autorange, best of `repeat`)."""
+    timer = timeit.Timer(fn)
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat=repeat, number=number)) / number
+
+
+def json_cases(app_module, repeat: int) -> dict:
+    """The JSON cases once per available backend (app.JSON_BACKEND is read on every call)."""
+    payload = _round_payload(1, [2, 3], random.Random(2))
+    page = {'items': [dict(payload, round_id=i) for i in range(500)], 'next_after': 500}
+    backends = ['json'] + (['orjson'] if app_module.orjson is not None else [])
+    original = app_module.JSON_BACKEND
+    results = {}
+    try:
+        for backend in backends:
+            app_module.JSON_BACKEND = backend
+            results[f'json_column[backend={backend}]'] = best_time(
+                lambda: app_module.json_column_loads(app_module.json_column_dumps(payload)), repeat)
+            with app_module.app.app_context():
+                results[f'json_response[backend={backend}]'] = best_time(
+                    lambda: app_module.app.json.response(page), repeat)
+    finally:
+        app_module.JSON_BACKEND = original
+    return results
+
+
+def run_worker(args) -> dict:
+    """Run every case for one responses size; called in a fresh subprocess."""
+    workdir = args.workdir
+    sys.path.insert(0, _REPO_DIR)
+    import app as app_module  # noqa: E402  (env must be set before import)
+
+    results = {}
+    responses = args.responses
+    catalogs = {}
+    for size in args.catalog_sizes:
+        path = os.path.join(workdir, f'catalog_{size}.db')
+        if not os.path.exists(path):
+            write_catalog(path, size)
+        catalogs[size] = app_module.ArticleCatalog.from_frame(*app_module.load_article_catalog(path))
+
+    # The DB is filled against the largest catalog so every article id exists.
+    largest = max(args.catalog_sizes)
+    fill_responses(
+        app_module, responses, read_catalog_topics(os.path.join(workdir, f'catalog_{largest}.db')),
+        prolific_prefix='BENCH-',
+    )
+
+    if responses == args.responses_sizes[0]:
+        results.update(json_cases(app_module, args.repeat))
+
+    rng = random.Random(1)
+    for size, catalog in catalogs.items():
+        app_module.CATALOG = catalog
+        app_module.TOPIC_COL = catalog.topic_col
+        seen = [rng.randrange(size) for _ in range(4)]
+        row = app_module._find_article_row(size // 2)
+
+        if responses == args.responses_sizes[0]:
+            # Catalog-only cases do not depend on the responses DB; time them once.
+            results[f'select_from_topic[catalog={size}]'] = best_time(
+                lambda: app_module._pick_article_from_topic('Crime', seen, seen[0], rng), args.repeat)
+            results[f'normalize_row[catalog={size}]'] = best_time(
+                lambda: app_module.normalize_article_row(row), args.repeat)
+            results[f'article_lookup[catalog={size}]'] = best_time(
+                lambda: app_module._find_article_row(rng.randrange(size)), args.repeat)
+
+        label = f'catalog={size},responses={responses}'
+        flask_app = app_module.app
+        payload = {'round': 1, 'article': _round_payload(1, [2, 3], rng)}
+
+        def save_round():
+            with flask_app.test_request_context('/'):
+                app_module.session['prolific_id'] = 'BENCH-SAVE'
+                app_module.session['round'] = 1
+                app_module.session['explanation_pair'] = 'Trending right now | Fact-checked for accuracy'
+                app_module.update_participant_data('round', payload)
+
+        save_round()  # create participant + round once; the timed calls update it
+        results[f'save_round[{label}]'] = best_time(save_round, args.repeat)
+
+        if responses:
+            def backfill():
+                with flask_app.app_context():
+                    participant = app_module.Participant.query.filter_by(prolific_id='BENCH-1').first()
+                    rounds = (app_module.Round.query.options(app_module.db.undefer_group('payload'))
+                              .filter_by(participant_id=participant.id).all())
+                    app_module._backfill_rounds(rounds)
+                    app_module.db.session.commit()
+
+            results[f'backfill_flat[{label}]'] = best_time(backfill, args.repeat)
+    return results
+
+
+def run_all(args) -> dict:
+    results = {}
+    with tempfile.TemporaryDirectory(prefix='study-bench-') as workdir:
+        import_catalog = os.path.join(workdir, 'catalog_import.db')
+        write_catalog(import_catalog, 100)
+        for responses in args.responses_sizes:
+            env = dict(
+                os.environ,
+                FLASK_SECRET_KEY='benchmark',
+                ARTICLES_DB_PATH=import_catalog,
+                RESPONSES_DB_PATH=os.path.join(workdir, f'responses_{responses}.db'),
+                LOG_LEVEL='WARNING',
+            )
+            cmd = [
+                sys.executable, os.path.abspath(__file__), '--worker',
+                '--workdir', workdir,
+                '--responses', str(responses),
+                '--responses-sizes', ','.join(map(str, args.responses_sizes)),
+                '--catalog-sizes', ','.join(map(str, args.catalog_sizes)),
+                '--repeat', str(args.repeat),
+            ]
+            out = subprocess.run(cmd, env=env, check=True, stdout=subprocess.PIPE, text=True)
+            results.update(json.loads(out.stdout.strip().splitlines()[-1]))
+    return results
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list[str]:
+    print(f"{'case':<58}{'time':>12}{'baseline':>12}{'change':>9}")
+    regressions = []
+    for case, seconds in results.items():
+        base = baseline.get(case)
+        change = (seconds / base - 1.0) if base else None
+        flag = ''
+        if change is not None and change > threshold:
+            flag = '  REGRESSION'
+            regressions.append(case)
+        print(f"{case:<58}{_fmt(seconds):>12}{_fmt(base):>12}"
+              f"{(f'{change * 100:+.1f}%' if change is not None else 'new'):>9}{flag}")
+    return regressions
+
+
+def machine_info() -> dict:
+    return {
+        'node': platform.node(),
+        'machine': platform.machine(),
+        'processor': platform.processor(),
+        'cpus': os.cpu_count(),
+        'python': platform.python_version(),
+    }
+
+
+def _fmt(seconds):
+    if seconds is None:
+        return '-'
+    if seconds >= 1e-3:
+        return f'{seconds * 1e3:.2f}ms'
+    return f'{seconds * 1e6:.1f}us'
+
+
+def _int_list(raw: str) -> list[int]:
+    return [int(x) for x in raw.split(',') if x.strip()]
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--catalog-sizes', type=_int_list, default=[1000, 10000, 100000])
+    parser.add_argument('--responses-sizes', type=_int_list, default=[0, 10000])
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+    parser.add_argument('--save-baseline', action='store_true')
+    parser.add_argument('--threshold', type=float, default=0.25, help='allowed slowdown, 0.25 = +25%%')
+    parser.add_argument('--json', help='also write raw results to this file')
+    # Internal: one responses size per subprocess.
+    parser.add_argument('--worker', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--workdir', help=argparse.SUPPRESS)
+    parser.add_argument('--responses', type=int, default=0, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.worker:
+        print(json.dumps(run_worker(args)))
+        return 0
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as fh:
+            baseline = json.load(fh)
+    elif not args.save_baseline:
+        print(f"No baseline at {args.baseline}: nothing to compare with. Record one on this machine with "
+              f"--save-baseline.", file=sys.stderr)
+        return 2
+    recorded_on = baseline.pop(_MACHINE_KEY, None)
+    if recorded_on and recorded_on != machine_info():
+        print(f"WARNING: baseline was recorded on another machine ({recorded_on}); "
+              f"timings are not comparable.", file=sys.stderr)
+
+    results = run_all(args)
+    regressions = compare(results, baseline, args.threshold)
+
+    if args.json:
+        with open(args.json, 'w') as fh:
+            json.dump(results, fh, indent=2, sort_keys=True)
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(os.path.abspath(args.baseline)), exist_ok=True)
+        with open(args.baseline, 'w') as fh:
+            json.dump({**baseline, **results, _MACHINE_KEY: machine_info()}, fh, indent=2, sort_keys=True)
+        print(f"\nBaseline written to {args.baseline}")
+        return 0
+    if regressions:
+        print(f"\n{len(regressions)} case(s) slower than baseline by more than {args.threshold:.0%}")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
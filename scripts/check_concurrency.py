@@ -0,0 +1,158 @@
+"""Check that concurrent participants do not share state inside one process.
+
+Walks --journeys complete participant journeys through Flask's test client,
+first on --threads threads at once (as a gthread/gevent worker would serve
+them) and then one at a time, each run in its own subprocess with a fresh
+responses DB and the same synthetic catalog. Each journey answers with its
+own seeded generator, so both runs see the same answers.
+
+The check fails if any request errors or any participant is missing rounds.
+It also fails if a participant's assignments differ between the two runs:
+main articles, recommendations, their order and the chosen recommendation.
+These are seeded per participant (app.participant_rng), so interleaving
+must not change them. Explanation labels are left out because they follow
+the arrival order.
+
+    python scripts/check_concurrency.py
+    python scripts/check_concurrency.py --journeys 200 --threads 32
+"""
+
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+
+_SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+_REPO_DIR = os.path.dirname(_SCRIPTS_DIR)
+sys.path.insert(0, _SCRIPTS_DIR)
+
+from generate_fixtures import write_catalog  # noqa: E402
+from study_client import article_payload, build_form_payload, pre_questionnaire_payload  # noqa: E402
+
+
+def run_journey(app_module, n: int, seed: int) -> list[str]:
+    """One participant from landing page to thank-you; returns error messages."""
+    from werkzeug.datastructures import MultiDict
+
+    rng = random.Random(f'{seed}:{n}')
+    client = app_module.app.test_client()
+    errors = []
+
+    def get(path):
+        resp = client.get(path)
+        if resp.status_code not in (200, 302):
+            errors.append(f'GET {path}: {resp.status_code}')
+        return resp, resp.get_data(as_text=True)
+
+    def post(path, data):
+        resp = client.post(path, data=MultiDict(data))
+        if resp.status_code != 302:
+            errors.append(f'POST {path}: {resp.status_code}')
+            return None
+        return urllib.parse.urlsplit(resp.headers['Location']).path
+
+    get(f'/?PROLIFIC_PID=CONC-{n}')
+    _, html = get('/demographics')
+    post('/demographics', build_form_payload(html, rng, {'age': str(rng.randint(18, 80))}))
+    _, html = get('/pre-questionnaire')
+    post('/pre-questionnaire', pre_questionnaire_payload(html, rng))
+    location = post('/instructions', {})
+    for _ in range(app_module.STUDY_TOTAL_ROUNDS):
+        if location is None:
+            break
+        resp, html = get(location)
+        while resp.status_code == 302:
+            location = urllib.parse.urlsplit(resp.headers['Location']).path
+            resp, html = get(location)
+        location = post(location, article_payload(html, rng))
+    return errors
+
+
+def run_worker(args) -> dict:
+    sys.path.insert(0, _REPO_DIR)
+    import app as app_module  # noqa: E402  (env must be set before import)
+
+    app_module.app.config['TESTING'] = True
+    with ThreadPoolExecutor(max_workers=args.threads) as pool:
+        errors = [e for errs in pool.map(lambda n: run_journey(app_module, n, args.seed), range(args.journeys))
+                  for e in errs]
+
+    assignments: dict[str, list] = {}
+    with app_module.app.app_context():
+        rows = app_module.db.session.execute(app_module.db.text(
+            'SELECT p.prolific_id, r.round_number, r.main_article_stable_id, r.rec0_stable_id, r.rec1_stable_id, '
+            'r.selected_rec_stable_id FROM round_view r JOIN participant p ON p.id = r.participant_id '
+            'ORDER BY p.prolific_id, r.round_number'
+        )).all()
+    for pid, *assignment in rows:
+        assignments.setdefault(pid, []).append(assignment)
+    return {'errors': errors, 'assignments': assignments}
+
+
+def run(args, threads: int, workdir: str, catalog: str) -> dict:
+    env = dict(
+        os.environ,
+        FLASK_SECRET_KEY='concurrency-check',
+        ARTICLES_DB_PATH=catalog,
+        RESPONSES_DB_PATH=os.path.join(workdir, f'responses_{threads}.db'),
+        SQL_BUDGET_STRICT='0',
+        LOG_LEVEL=os.environ.get('LOG_LEVEL', 'ERROR'),
+    )
+    cmd = [
+        sys.executable, os.path.abspath(__file__), '--worker',
+        '--journeys', str(args.journeys), '--threads', str(threads), '--seed', str(args.seed),
+    ]
+    out = subprocess.run(cmd, env=env, check=True, stdout=subprocess.PIPE, text=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--journeys', type=int, default=50)
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--catalog', help='article catalog to use (default: a synthetic 2000-article catalog)')
+    parser.add_argument('--seed', type=int, default=1)
+    # Internal: one run per subprocess, since the app binds its DB engine at import.
+    parser.add_argument('--worker', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.worker:
+        print(json.dumps(run_worker(args)))
+        return 0
+
+    with tempfile.TemporaryDirectory(prefix='study-concurrency-') as workdir:
+        catalog = args.catalog
+        if not catalog:
+            catalog = os.path.join(workdir, 'catalog.db')
+            write_catalog(catalog, 2000)
+        concurrent = run(args, args.threads, workdir, catalog)
+        sequential = run(args, 1, workdir, catalog)
+
+    failures = []
+    for name, result in (('concurrent', concurrent), ('sequential', sequential)):
+        for error in result['errors']:
+            failures.append(f'{name}: {error}')
+        if len(result['assignments']) != args.journeys:
+            failures.append(f"{name}: {len(result['assignments'])} of {args.journeys} participants saved rounds")
+    differing = sorted(
+        pid for pid in set(concurrent['assignments']) | set(sequential['assignments'])
+        if concurrent['assignments'].get(pid) != sequential['assignments'].get(pid)
+    )
+    if differing:
+        failures.append(f"{len(differing)} participant(s) got different assignments when run concurrently, "
+                        f"e.g. {differing[:5]}")
+
+    print(f"{args.journeys} journeys, {args.threads} threads vs 1: "
+          f"{sum(len(r) for r in concurrent['assignments'].values())} rounds compared")
+    for failure in failures:
+        print(f"  {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,120 @@
+"""Check SQL statements per request against app.SQL_QUERY_BUDGETS.
+
+Walks complete participant journeys through Flask's test client (fresh
+temporary responses DB, synthetic catalog unless --catalog is given), counts
+the statements each request executes and compares the worst case per
+(endpoint, method) with its budget. Exits 1 if any route is over budget and
+prints the offending statements, so an extra lookup or a COUNT(*) on the hot
+path fails here instead of during a launch.
+
+    python scripts/check_query_budgets.py
+    python scripts/check_query_budgets.py --journeys 5 --verbose
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import urllib.parse
+
+_SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+_REPO_DIR = os.path.dirname(_SCRIPTS_DIR)
+sys.path.insert(0, _SCRIPTS_DIR)
+
+from generate_fixtures import write_catalog  # noqa: E402
+from study_client import article_payload, build_form_payload, pre_questionnaire_payload  # noqa: E402
+
+
+def run_journeys(app_module, n_journeys: int, rounds: int, seed: int) -> dict:
+    """Returns {(endpoint, method): [(n_statements, statements), ...]}."""
+    from flask import g, request
+    from werkzeug.datastructures import MultiDict
+
+    observed: dict[tuple[str, str], list] = {}
+
+    @app_module.app.after_request
+    def _record(response):
+        statements = list(g.get('_sql_statements') or [])
+        observed.setdefault((request.endpoint, request.method), []).append((len(statements), statements))
+        return response
+
+    rng = random.Random(seed)
+    for n in range(n_journeys):
+        client = app_module.app.test_client()
+
+        def get(path):
+            resp = client.get(path)
+            return resp, resp.get_data(as_text=True)
+
+        def post(path, data):
+            resp = client.post(path, data=MultiDict(data))
+            if resp.status_code != 302:
+                raise SystemExit(f"POST {path} returned {resp.status_code}, expected a redirect")
+            return urllib.parse.urlsplit(resp.headers['Location']).path
+
+        get(f'/?PROLIFIC_PID=BUDGET-{n}')
+        _, html = get('/demographics')
+        post('/demographics', build_form_payload(html, rng, {'age': str(rng.randint(18, 80))}))
+        _, html = get('/pre-questionnaire')
+        post('/pre-questionnaire', pre_questionnaire_payload(html, rng))
+        get('/instructions')
+        location = post('/instructions', {})
+        for _ in range(rounds):
+            resp, html = get(location)
+            while resp.status_code == 302:
+                location = urllib.parse.urlsplit(resp.headers['Location']).path
+                resp, html = get(location)
+            location = post(location, article_payload(html, rng))
+        get(location)
+    return observed
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--journeys', type=int, default=3)
+    parser.add_argument('--catalog', help='article catalog to use (default: a synthetic 2000-article catalog)')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--verbose', action='store_true', help='print the statements of every checked route')
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory(prefix='study-budgets-') as workdir:
+        catalog = args.catalog
+        if not catalog:
+            catalog = os.path.join(workdir, 'catalog.db')
+            write_catalog(catalog, 2000)
+        os.environ.update(
+            FLASK_SECRET_KEY='query-budgets',
+            ARTICLES_DB_PATH=catalog,
+            RESPONSES_DB_PATH=os.path.join(workdir, 'responses.db'),
+            SQL_BUDGET_STRICT='0',
+            LOG_LEVEL=os.environ.get('LOG_LEVEL', 'ERROR'),
+        )
+        sys.path.insert(0, _REPO_DIR)
+        import app as app_module  # noqa: E402  (env must be set before import)
+
+        app_module.app.config['TESTING'] = True
+        observed = run_journeys(app_module, args.journeys, app_module.STUDY_TOTAL_ROUNDS, args.seed)
+
+    failures = 0
+    print(f"{'endpoint':<22}{'method':<8}{'requests':>9}{'max sql':>9}{'budget':>8}")
+    for key, budget in app_module.SQL_QUERY_BUDGETS.items():
+        runs = observed.get(key)
+        if not runs:
+            print(f"{key[0]:<22}{key[1]:<8}{0:>9}{'-':>9}{budget:>8}  (not exercised)")
+            continue
+        worst, statements = max(runs, key=lambda r: r[0])
+        over = worst > budget
+        failures += over
+        print(f"{key[0]:<22}{key[1]:<8}{len(runs):>9}{worst:>9}{budget:>8}{'  OVER BUDGET' if over else ''}")
+        if over or args.verbose:
+            for statement in statements:
+                print(f"    {' '.join(statement.split())[:160]}")
+    if failures:
+        print(f"\n{failures} route(s) over their SQL budget")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
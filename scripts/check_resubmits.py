@@ -0,0 +1,143 @@
+"""Check that repeated form submissions (app.idempotent_form) write nothing twice.
+
+Walks participant journeys through Flask's test client (fresh temporary
+responses DB, synthetic catalog unless --catalog is given) and, on every
+study form, repeats the POST the way browsers do:
+
+- double-click: the same form is posted again with the cookie from before the
+  first submission (the browser dropped the first response), once after it
+  finished and --threads times concurrently. Each repeat must get the first
+  submission's redirect and session.
+- back button: after the thank-you page, the round-1 form is posted again
+  with the current cookie. The participant must be sent back to the
+  thank-you page with the study still completed.
+
+Exits 1 if any participant ends up with more than one row per round or any
+repeat is answered differently.
+
+    python scripts/check_resubmits.py
+    python scripts/check_resubmits.py --journeys 20 --threads 8
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+
+_SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+_REPO_DIR = os.path.dirname(_SCRIPTS_DIR)
+sys.path.insert(0, _SCRIPTS_DIR)
+
+from generate_fixtures import write_catalog  # noqa: E402
+from study_client import article_payload, build_form_payload, pre_questionnaire_payload  # noqa: E402
+
+
+def run_journey(app_module, n: int, rng: random.Random, threads: int) -> list[str]:
+    """One participant with a double-click on every form and a late round-1 resubmit."""
+    from werkzeug.datastructures import MultiDict
+
+    client = app_module.app.test_client()
+    # Compare decoded sessions: the signed cookie embeds a timestamp, so the
+    # same session serialized a second later is a different string.
+    serializer = app_module.app.session_interface.get_signing_serializer(app_module.app)
+    errors = []
+
+    def get(path):
+        resp = client.get(path)
+        while resp.status_code == 302:
+            path = urllib.parse.urlsplit(resp.headers['Location']).path
+            resp = client.get(path)
+        return path, resp.get_data(as_text=True)
+
+    def repeat(path, data, cookie):
+        repeater = app_module.app.test_client()
+        repeater.set_cookie('session', cookie)
+        resp = repeater.post(path, data=MultiDict(data))
+        return resp.status_code, resp.headers.get('Location'), serializer.loads(repeater.get_cookie('session').value)
+
+    def double_click(path, data):
+        cookie = client.get_cookie('session').value
+        resp = client.post(path, data=MultiDict(data))
+        expected = (302, resp.headers.get('Location'), serializer.loads(client.get_cookie('session').value))
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            repeats = list(pool.map(lambda _: repeat(path, data, cookie), range(threads)))
+        for got in [repeat(path, data, cookie)] + repeats:
+            if got[:2] != expected[:2]:
+                errors.append(f'double-click POST {path}: {got[:2]}, expected {expected[:2]}')
+            elif got[2] != expected[2]:
+                errors.append(f'double-click POST {path}: session not replayed')
+        return urllib.parse.urlsplit(expected[1]).path
+
+    get(f'/?PROLIFIC_PID=RESUBMIT-{n}')
+    path, html = get('/demographics')
+    double_click(path, build_form_payload(html, rng, {'age': str(rng.randint(18, 80))}))
+    path, html = get('/pre-questionnaire')
+    double_click(path, pre_questionnaire_payload(html, rng))
+    path, html = get('/instructions')
+    location = double_click(path, build_form_payload(html, rng))
+    first_round = None
+    for _ in range(app_module.STUDY_TOTAL_ROUNDS):
+        path, html = get(location)
+        data = article_payload(html, rng)
+        first_round = first_round or (path, data)
+        location = double_click(path, data)
+
+    path, _ = get(location)
+    resp = client.post(first_round[0], data=MultiDict(first_round[1]))
+    back = urllib.parse.urlsplit(resp.headers.get('Location') or '').path
+    if resp.status_code != 302 or back != path:
+        errors.append(f'back-button POST {first_round[0]}: {resp.status_code} {back}, expected {path}')
+    if client.get('/thank-you').status_code != 200:
+        errors.append('back-button resubmit lost study_completed')
+    return errors
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--journeys', type=int, default=5)
+    parser.add_argument('--threads', type=int, default=4, help='concurrent repeats of each form')
+    parser.add_argument('--catalog', help='article catalog to use (default: a synthetic 2000-article catalog)')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory(prefix='study-resubmits-') as workdir:
+        catalog = args.catalog
+        if not catalog:
+            catalog = os.path.join(workdir, 'catalog.db')
+            write_catalog(catalog, 2000)
+        os.environ.update(
+            FLASK_SECRET_KEY='resubmits',
+            ARTICLES_DB_PATH=catalog,
+            RESPONSES_DB_PATH=os.path.join(workdir, 'responses.db'),
+            SQL_BUDGET_STRICT='0',
+            LOG_LEVEL=os.environ.get('LOG_LEVEL', 'ERROR'),
+        )
+        sys.path.insert(0, _REPO_DIR)
+        import app as app_module  # noqa: E402  (env must be set before import)
+
+        app_module.app.config['TESTING'] = True
+        rng = random.Random(args.seed)
+        failures = [e for n in range(args.journeys) for e in run_journey(app_module, n, rng, args.threads)]
+        with app_module.app.app_context():
+            duplicated = app_module.db.session.execute(app_module.db.text(
+                'SELECT p.prolific_id, r.round_number, COUNT(*) FROM round r '
+                'JOIN participant p ON p.id = r.participant_id '
+                'GROUP BY r.participant_id, r.round_number HAVING COUNT(*) > 1'
+            )).all()
+            rounds = app_module.Round.query.count()
+
+    failures += [f'{pid}: {count} rows for round {round_number}' for pid, round_number, count in duplicated]
+    expected = args.journeys * app_module.STUDY_TOTAL_ROUNDS
+    if rounds != expected:
+        failures.append(f'{rounds} rounds saved, expected {expected}')
+    print(f"{args.journeys} journeys, {args.threads + 1} repeats per form: {rounds} rounds saved")
+    for failure in failures:
+        print(f"  {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
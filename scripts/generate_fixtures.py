@@ -0,0 +1,331 @@
+"""Synthetic article catalogs and responses databases for scale testing.
+
+The catalog is written in the exact shape app.load_article_catalog() expects:
+a `new_articles` table with generic TEXT columns field1..field20 whose first
+data row holds the real headers, `field1` as the stable article id and
+`field20` as the topic column.
+
+The responses DB is created from the app's own models (so the schema and
+migrations always match) and filled in batches with participants and saved
+rounds. Only the JSON payloads are written; the app's triggers fill the
+flattened analysis columns.
+
+Examples:
+    # 100k articles, topics Zipf-skewed, ~600-word bodies
+    python scripts/generate_fixtures.py catalog --articles 100000 --topic-skew 1.0 \\
+        --content-words 600 --out /tmp/article_selection.db
+
+    # 500k participants x 2 rounds (1M round rows) against that catalog
+    python scripts/generate_fixtures.py responses --participants 500000 \\
+        --catalog /tmp/article_selection.db --out /tmp/responses.db
+
+    # Run the app against both
+    ARTICLES_DB_PATH=/tmp/article_selection.db RESPONSES_DB_PATH=/tmp/responses.db \\
+        flask --app app run
+"""
+
+import argparse
+import json
+import os
+import random
+import sqlite3
+import sys
+from datetime import datetime, timedelta
+
+_REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Values of the catalog's topic column (the targets of app.TOPIC_MAP_LIST_A/B).
+TOPICS = [
+    'Economics', 'International', 'Crime', 'Finance', 'Politics', 'Public Health',
+    'Lifestyle', 'Entertainment', 'Science', 'Tech', 'Sports', 'Personal Health',
+]
+CATALOG_HEADERS = (
+    ['field1', 'Title', 'Content', 'Image URL', 'authors', 'published_date', 'updated_date', 'url', 'source']
+    + [f'extra_{i}' for i in range(10, 20)]
+    + ['field20']
+)
+RATING_ITEMS = ('likelihood', 'preference_fit', 'constructive', 'understandable', 'trustworthy', 'relevant')
+LOW_HIGH_ITEMS = ('preference_fit', 'constructive', 'understandable', 'trustworthy', 'relevant')
+LABEL_ITEMS = ('label_understandable', 'label_useful', 'label_influenced', 'label_attention', 'label_more')
+_WORDS = (
+    'policy market report study city council health data growth season team climate vote court '
+    'research energy school local global price public record season model system future people'
+).split()
+
+
+def _topic_weights(skew: float) -> list[float]:
+    """Zipf-like weights over TOPICS; skew 0 gives a uniform distribution."""
+    return [1.0 / (rank + 1) ** skew for rank in range(len(TOPICS))]
+
+
+def _text(rng: random.Random, mean_words: int) -> str:
+    n = max(1, int(rng.uniform(0.5, 1.5) * mean_words))
+    return ' '.join(rng.choice(_WORDS) for _ in range(n)).capitalize() + '.'
+
+
+def write_catalog(
+    path: str,
+    n_articles: int,
+    topic_skew: float = 0.0,
+    content_words: int = 400,
+    title_words: int = 8,
+    seed: int = 0,
+) -> list[str]:
+    """Write `new_articles` and return the topic of each article (by article id)."""
+    rng = random.Random(seed)
+    weights = _topic_weights(topic_skew)
+    topics = rng.choices(TOPICS, weights=weights, k=n_articles)
+    base_date = datetime(2024, 1, 1)
+
+    if os.path.exists(path):
+        os.remove(path)
+    conn = sqlite3.connect(path)
+    conn.execute('CREATE TABLE new_articles (' + ', '.join(f'field{i} TEXT' for i in range(1, 21)) + ')')
+    insert = 'INSERT INTO new_articles VALUES (' + ', '.join('?' * 20) + ')'
+    conn.execute(insert, CATALOG_HEADERS)
+
+    batch = []
+    for i, topic in enumerate(topics):
+        published = base_date + timedelta(hours=rng.randrange(24 * 365))
+        batch.append(
+            [
+                f'SYN-{i:08d}',
+                _text(rng, title_words).rstrip('.'),
+                _text(rng, content_words),
+                '',
+                json.dumps([f'Reporter {rng.randrange(500)}']),
+                published.strftime('%Y-%m-%d'),
+                '',
+                f'https://example.org/articles/{i}',
+                'synthetic',
+            ]
+            + [''] * 10
+            + [topic]
+        )
+        if len(batch) >= 10000:
+            conn.executemany(insert, batch)
+            batch.clear()
+    conn.executemany(insert, batch)
+    conn.commit()
+    conn.close()
+    return topics
+
+
+def read_catalog_topics(path: str) -> list[str]:
+    """Topic per article id (df['index']) of an existing catalog."""
+    conn = sqlite3.connect(path)
+    try:
+        rows = conn.execute('SELECT field20 FROM new_articles').fetchall()
+    finally:
+        conn.close()
+    return [r[0] for r in rows[1:]]  # first row holds the headers
+
+
+def _topics_index(topics: list[str]) -> dict[str, list[int]]:
+    by_topic: dict[str, list[int]] = {}
+    for article_id, topic in enumerate(topics):
+        by_topic.setdefault(topic, []).append(article_id)
+    return by_topic
+
+
+def fill_responses(
+    app_module,
+    n_participants: int,
+    topics: list[str],
+    rounds: int | None = None,
+    seed: int = 0,
+    batch_size: int = 5000,
+    prolific_prefix: str = 'SYN-',
+):
+    """Insert participants and their saved rounds through the app's engine.
+
+    Must be called with the app imported against the target responses DB.
+    """
+    if not n_participants:
+        return
+    rng = random.Random(seed)
+    rounds = rounds or app_module.STUDY_TOTAL_ROUNDS
+    by_topic = _topics_index(topics)
+    topic_a = list(app_module.TOPIC_MAP_LIST_A)
+    topic_b = list(app_module.TOPIC_MAP_LIST_B)
+    labels = app_module.LEAST_REC_LABELS
+    started = datetime.utcnow() - timedelta(days=7)
+
+    with app_module.app.app_context():
+        engine = app_module.db.engine
+        with engine.connect() as conn:
+            next_id = (conn.exec_driver_sql('SELECT MAX(id) FROM participant').scalar() or 0) + 1
+
+        for batch_start in range(0, n_participants, batch_size):
+            participants, round_rows = [], []
+            for n in range(batch_start, min(n_participants, batch_start + batch_size)):
+                pid = next_id + n
+                participant, prefs = _participant_row(pid, f'{prolific_prefix}{pid}', rng, topic_a, topic_b, labels)
+                participant['timestamp_start'] = started + timedelta(seconds=n)
+                participant['timestamp_updated'] = participant['timestamp_start'] + timedelta(minutes=2 * (rounds + 1))
+                participants.append(participant)
+                start_list = rng.choice('AB')
+                seen: set[int] = set()
+                for round_number in range(1, rounds + 1):
+                    list_name = start_list if round_number % 2 == 1 else ('B' if start_list == 'A' else 'A')
+                    round_rows.append(_round_row(
+                        app_module, pid, round_number, list_name, prefs, participant, by_topic, topics, seen, rng,
+                        participant['timestamp_start'] + timedelta(minutes=2 * round_number),
+                    ))
+            with engine.begin() as conn:
+                conn.execute(app_module.Participant.__table__.insert(), participants)
+                conn.execute(app_module.Round.__table__.insert(), round_rows)
+
+
+def _participant_row(pid, prolific_id, rng, topic_a, topic_b, labels):
+    fav_a, least_a = rng.sample(topic_a, 2)
+    fav_b, least_b = rng.sample(topic_b, 2)
+    i, j = sorted(rng.sample(range(len(labels)), 2))
+    demographics = {
+        'gender': rng.choice(['Male', 'Female', 'Non-binary', 'Prefer not to say']),
+        'age': rng.randint(18, 80),
+        'state': rng.choice(['California', 'Texas', 'New York', 'Ohio', 'Florida']),
+        'education': rng.choice(['High school', "Bachelor's degree", "Master's degree"]),
+        'political_leaning': rng.choice(['Liberal', 'Moderate', 'Conservative']),
+    }
+    demographics['country'] = demographics['state']
+    demographics['age_group'] = '25–34' if demographics['age'] < 35 else '35–44'
+    pre = {
+        'news_frequency': rng.choice(['Daily', 'Weekly', 'Rarely']),
+        'platform': rng.choice(['News websites', 'Social media', 'TV']),
+        'favourite_topic_1': fav_a,
+        'least_favourite_topic_1': least_a,
+        'favourite_topic_2': fav_b,
+        'least_favourite_topic_2': least_b,
+        'enjoy_topic_1': str(rng.randint(1, 7)),
+        'enjoy_topic_2': str(rng.randint(1, 7)),
+        'avoid_topic_1': str(rng.randint(1, 7)),
+        'avoid_topic_2': str(rng.randint(1, 7)),
+        'attention_check': 'Strongly agree',
+        'avoid_news': rng.choice(['no', 'occasionally', 'regularly']),
+        'avoid_reasons': rng.sample(['negative_mood', 'not_relevant', 'not_trust', 'too_much'], 2),
+        'avoid_other': '',
+    }
+    # Flattened demo_*/pre_* columns are filled by the app's triggers.
+    row = {
+        'id': pid,
+        'prolific_id': prolific_id,
+        'demographics': demographics,
+        'pre_questionnaire': pre,
+        'explanation_pair': f'{labels[i]} | {labels[j]}',
+    }
+    prefs = {'A': (fav_a, least_a), 'B': (fav_b, least_b), 'labels': (labels[i], labels[j])}
+    return row, prefs
+
+
+def _pick(by_topic, topic, seen, rng, n_articles):
+    pool = by_topic.get(topic) or range(n_articles)
+    for _ in range(4):
+        article_id = rng.choice(pool)
+        if article_id not in seen:
+            break
+    seen.add(article_id)
+    return article_id
+
+
+def _round_row(app_module, pid, round_number, list_name, prefs, participant, by_topic, topics, seen, rng, ts):
+    mapping = app_module.TOPIC_MAP_LIST_A if list_name == 'A' else app_module.TOPIC_MAP_LIST_B
+    fav_topic, least_topic = (mapping[t] for t in prefs[list_name])
+    main_id = _pick(by_topic, fav_topic, seen, rng, len(topics))
+    recs = [_pick(by_topic, fav_topic, seen, rng, len(topics)), _pick(by_topic, least_topic, seen, rng, len(topics))]
+    kinds = ['fav', 'least']
+    if rng.random() < 0.5:
+        recs.reverse()
+        kinds.reverse()
+    changing_pos = kinds.index('least')
+    least_label = prefs['labels'][min(round_number, 2) - 1]
+    rec_labels = {str(r): (least_label if k == 'least' else '') for r, k in zip(recs, kinds)}
+    selected_pos = rng.randrange(2)
+
+    ratings = {}
+    for rec_id in recs:
+        for item in RATING_ITEMS:
+            ratings[f'{item}_{rec_id}'] = str(rng.randint(1, 7))
+    for item in LOW_HIGH_ITEMS:
+        ratings[f'low_{item}'] = str(rng.randint(1, 7))
+        ratings[f'high_{item}'] = str(rng.randint(1, 7))
+    for item in LABEL_ITEMS:
+        ratings[item] = str(rng.randint(1, 7))
+    ratings['rb_attention_check'] = ''
+
+    def stable(article_id):
+        return f'SYN-{article_id:08d}'
+
+    def title(article_id):
+        return f'Synthetic article {article_id}'
+
+    article = {
+        'main_article_id': main_id,
+        'main_article_stable_id': stable(main_id),
+        'main_article_title': title(main_id),
+        'main_topic': topics[main_id],
+        'selected_recommendation_id': recs[selected_pos],
+        'selected_recommendation_stable_id': stable(recs[selected_pos]),
+        'selected_recommendation_title': title(recs[selected_pos]),
+        'selected_recommendation_pos': selected_pos,
+        'changing_label_rec_pos': changing_pos,
+        'recommendations': recs,
+        'recommendations_labels': rec_labels,
+        'recommendations_stable_ids': [stable(r) for r in recs],
+        'recommendations_titles': [title(r) for r in recs],
+        'recommendations_topics': [topics[r] for r in recs],
+        'ratings': ratings,
+    }
+    # Flattened columns are filled by the app's triggers.
+    return {
+        'participant_id': pid,
+        'round_number': round_number,
+        'article': article,
+        'timestamp': ts,
+    }
+
+
+def import_app(catalog_path: str, responses_path: str):
+    """Import app.py bound to the given catalog and responses DB."""
+    os.environ['ARTICLES_DB_PATH'] = os.path.abspath(catalog_path)
+    os.environ['RESPONSES_DB_PATH'] = os.path.abspath(responses_path)
+    os.environ.setdefault('FLASK_SECRET_KEY', 'fixtures')
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+    sys.path.insert(0, _REPO_DIR)
+    import app as app_module
+    return app_module
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    cat = sub.add_parser('catalog', help='write a synthetic new_articles catalog')
+    cat.add_argument('--articles', type=int, default=10000)
+    cat.add_argument('--topic-skew', type=float, default=0.0, help='Zipf exponent over topics (0 = uniform)')
+    cat.add_argument('--content-words', type=int, default=400)
+    cat.add_argument('--title-words', type=int, default=8)
+    cat.add_argument('--seed', type=int, default=0)
+    cat.add_argument('--out', default='article_selection.db')
+
+    resp = sub.add_parser('responses', help='fill a responses DB with synthetic participants and rounds')
+    resp.add_argument('--participants', type=int, default=10000)
+    resp.add_argument('--rounds', type=int, default=0, help='rounds per participant (default STUDY_TOTAL_ROUNDS)')
+    resp.add_argument('--catalog', required=True, help='catalog the rounds refer to')
+    resp.add_argument('--seed', type=int, default=0)
+    resp.add_argument('--out', default='responses.db')
+
+    args = parser.parse_args(argv)
+    if args.command == 'catalog':
+        write_catalog(args.out, args.articles, args.topic_skew, args.content_words, args.title_words, args.seed)
+        print(f"Wrote {args.articles} articles to {args.out}")
+        return 0
+
+    app_module = import_app(args.catalog, args.out)
+    fill_responses(app_module, args.participants, read_catalog_topics(args.catalog), args.rounds or None, args.seed)
+    print(f"Added {args.participants} participants to {args.out}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,223 @@
+"""Load generator: drive full participant journeys against a running instance.
+
+Each virtual participant walks the whole study (landing, demographics,
+pre-questionnaire, instructions, every article round, thank-you) with
+realistic form payloads. Concurrency is ramped through the given stages and
+each stage reports per-step throughput, p50/p95/p99 latency and errors. With
+--db pointing at the instance's responses.db, completed journeys are checked
+against what was actually saved (lost saves, duplicate rounds, ...).
+
+Example (size workers before a launch):
+    gunicorn -c gunicorn.conf.py wsgi:app &
+    python scripts/loadtest.py --base-url http://127.0.0.1:8000 \\
+        --stages 1,5,10,25,50 --stage-seconds 60 --db responses.db
+"""
+
+import argparse
+import json
+import math
+import os
+import random
+import sqlite3
+import sys
+import threading
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from study_client import JourneyResult, StudyClient  # noqa: E402
+
+
+def percentile(sorted_values: list[float], pct: float):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(pct / 100.0 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def summarize_steps(journeys: list[JourneyResult], wall_s: float) -> list[dict]:
+    """Per step+method: count, throughput, latency percentiles (ms) and errors."""
+    by_step: dict[tuple[str, str], list] = {}
+    order = []
+    for j in journeys:
+        for s in j.steps:
+            key = (s.step, s.method)
+            if key not in by_step:
+                by_step[key] = []
+                order.append(key)
+            by_step[key].append(s)
+
+    rows = []
+    for key in order:
+        results = by_step[key]
+        latencies = sorted(r.elapsed_s * 1000 for r in results if r.ok)
+        rows.append({
+            'step': key[0],
+            'method': key[1],
+            'count': len(results),
+            'rps': round(len(results) / wall_s, 2) if wall_s else None,
+            'p50_ms': _round(percentile(latencies, 50)),
+            'p95_ms': _round(percentile(latencies, 95)),
+            'p99_ms': _round(percentile(latencies, 99)),
+            'errors': sum(1 for r in results if not r.ok),
+        })
+    return rows
+
+
+def _round(value):
+    return round(value, 1) if value is not None else None
+
+
+def check_db(db_path: str, journeys: list[JourneyResult], total_rounds: int) -> dict:
+    """Compare completed journeys with what the instance stored."""
+    completed = [j.prolific_id for j in journeys if j.completed]
+    conn = sqlite3.connect(f"file:{os.path.abspath(db_path)}?mode=ro", uri=True, timeout=30)
+    try:
+        found = {}
+        for chunk_start in range(0, len(completed), 500):
+            chunk = completed[chunk_start:chunk_start + 500]
+            marks = ','.join('?' * len(chunk))
+            for row in conn.execute(
+                f"""
+                SELECT p.prolific_id,
+                       p.demographics IS NOT NULL,
+                       p.pre_questionnaire IS NOT NULL,
+                       COALESCE(p.explanation_pair, '') != '',
+                       COUNT(r.id),
+                       COUNT(DISTINCT r.round_number),
+                       SUM(r.article IS NULL)
+                FROM participant p LEFT JOIN round r ON r.participant_id = p.id
+                WHERE p.prolific_id IN ({marks})
+                GROUP BY p.id
+                """,
+                chunk,
+            ):
+                found[row[0]] = row[1:]
+    finally:
+        conn.close()
+
+    report = {
+        'completed_journeys': len(completed),
+        'missing_participant': 0,
+        'missing_demographics': 0,
+        'missing_pre_questionnaire': 0,
+        'missing_explanation_pair': 0,
+        'lost_round_saves': 0,
+        'duplicate_rounds': 0,
+        'rounds_without_payload': 0,
+    }
+    for pid in completed:
+        row = found.get(pid)
+        if row is None:
+            report['missing_participant'] += 1
+            continue
+        has_demo, has_pre, has_pair, n_rounds, n_distinct, n_empty = row
+        report['missing_demographics'] += not has_demo
+        report['missing_pre_questionnaire'] += not has_pre
+        report['missing_explanation_pair'] += not has_pair
+        report['lost_round_saves'] += max(0, total_rounds - n_distinct)
+        report['duplicate_rounds'] += n_rounds - n_distinct
+        report['rounds_without_payload'] += n_empty or 0
+    report['lost_saves'] = (
+        report['missing_participant'] + report['missing_demographics']
+        + report['missing_pre_questionnaire'] + report['lost_round_saves']
+    )
+    return report
+
+
+def run_stage(args, concurrency: int, run_id: str, seq: list) -> tuple[list[JourneyResult], float]:
+    deadline = time.monotonic() + args.stage_seconds
+    results: list[JourneyResult] = []
+    lock = threading.Lock()
+
+    def worker(worker_no: int):
+        rng = random.Random(f"{args.seed}-{concurrency}-{worker_no}")
+        while time.monotonic() < deadline:
+            with lock:
+                seq[0] += 1
+                n = seq[0]
+                if args.max_journeys and n > args.max_journeys:
+                    return
+            client = StudyClient(args.base_url, timeout=args.timeout)
+            journey = client.run_journey(
+                f"{args.pid_prefix}{run_id}-{n}", rng,
+                think_time_s=args.think_time, total_rounds=args.rounds,
+            )
+            with lock:
+                results.append(journey)
+
+    started = time.monotonic()
+    threads = [threading.Thread(target=worker, args=(i,), daemon=True) for i in range(concurrency)]
+    for t in threads:
+        t.start()
+        # Stagger arrivals a little, like a launch rather than a thundering herd.
+        time.sleep(min(0.05, args.stage_seconds / max(concurrency, 1) / 10))
+    for t in threads:
+        t.join()
+    return results, time.monotonic() - started
+
+
+def print_stage(concurrency: int, journeys: list[JourneyResult], wall_s: float, steps: list[dict]):
+    completed = sum(j.completed for j in journeys)
+    print(f"\n=== concurrency {concurrency}: {len(journeys)} journeys, {completed} completed, "
+          f"{completed / wall_s:.2f} completions/s over {wall_s:.1f}s")
+    print(f"{'step':<20}{'method':<7}{'count':>7}{'req/s':>8}{'p50':>9}{'p95':>9}{'p99':>9}{'errors':>8}")
+    for r in steps:
+        print(f"{r['step']:<20}{r['method']:<7}{r['count']:>7}{r['rps'] or 0:>8.2f}"
+              f"{r['p50_ms'] or 0:>9.1f}{r['p95_ms'] or 0:>9.1f}{r['p99_ms'] or 0:>9.1f}{r['errors']:>8}")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--base-url', default='http://127.0.0.1:8000')
+    parser.add_argument('--stages', default='1,5,10,25', help='comma-separated concurrency levels')
+    parser.add_argument('--stage-seconds', type=float, default=60.0)
+    parser.add_argument('--max-journeys', type=int, default=0, help='stop each stage after N journeys (0 = no cap)')
+    parser.add_argument('--think-time', type=float, default=0.0, help='mean pause between pages, in seconds')
+    parser.add_argument('--rounds', type=int, default=2, help='article rounds per journey (STUDY_TOTAL_ROUNDS)')
+    parser.add_argument('--timeout', type=float, default=30.0)
+    parser.add_argument('--seed', default='loadtest')
+    parser.add_argument('--pid-prefix', default='LOADTEST-')
+    parser.add_argument('--db', help="path to the instance's responses.db for consistency checks")
+    parser.add_argument('--json', help='write the full report to this file')
+    args = parser.parse_args(argv)
+
+    run_id = uuid.uuid4().hex[:8]
+    stages = [int(s) for s in args.stages.split(',') if s.strip()]
+    report = {'base_url': args.base_url, 'run_id': run_id, 'stages': []}
+    all_journeys: list[JourneyResult] = []
+
+    for concurrency in stages:
+        seq = [0]
+        journeys, wall_s = run_stage(args, concurrency, f"{run_id}-c{concurrency}", seq)
+        steps = summarize_steps(journeys, wall_s)
+        print_stage(concurrency, journeys, wall_s, steps)
+        all_journeys.extend(journeys)
+        report['stages'].append({
+            'concurrency': concurrency,
+            'wall_s': round(wall_s, 2),
+            'journeys': len(journeys),
+            'completed': sum(j.completed for j in journeys),
+            'errors': sum(j.error_count for j in journeys),
+            'steps': steps,
+        })
+
+    if args.db:
+        consistency = check_db(args.db, all_journeys, args.rounds)
+        report['consistency'] = consistency
+        print("\n=== DB consistency")
+        for key, value in consistency.items():
+            print(f"{key:<28}{value:>8}")
+
+    if args.json:
+        with open(args.json, 'w') as fh:
+            json.dump(report, fh, indent=2)
+
+    failed = sum(s['errors'] for s in report['stages']) or (report.get('consistency') or {}).get('lost_saves')
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,286 @@
+"""Replay production traffic from gunicorn access logs against a local instance.
+
+The systemd unit logs every request with `--access-logfile -`, so journald
+holds the real request mix and arrival times:
+
+    journalctl -u prolific-study --since "2026-10-01 09:00" --until "2026-10-01 12:00" -o cat > launch.log
+
+Requests are grouped into participant sessions (a session starts at
+`/?PROLIFIC_PID=...` and continues for the same client address + user agent).
+The client address is the X-Forwarded-For field gunicorn.conf.py appends to
+each line; behind nginx the socket address (%(h)s) is always 127.0.0.1, so
+older logs without it merge all participants on the same browser build.
+Each session is replayed in its own thread, starting at its original offset
+(divided by --speed) and keeping the original gaps between its requests.
+Form bodies are not in the log, so POSTs are rebuilt from the page the replayed
+client just received, and article URLs follow the local instance's redirects.
+
+    python scripts/replay_access_log.py launch.log --base-url http://127.0.0.1:8000 \\
+        --speed 10 --json build-a.json
+    # ... switch builds, reset the DB ...
+    python scripts/replay_access_log.py launch.log --speed 10 --json build-b.json --compare build-a.json
+
+If the log lines carry the request time in microseconds (`%(D)s`, as in
+gunicorn.conf.py), production latencies are reported alongside.
+"""
+
+import argparse
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+import urllib.parse
+from dataclasses import dataclass, field
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from loadtest import summarize_steps  # noqa: E402
+from study_client import (  # noqa: E402
+    JourneyResult,
+    StepResult,
+    StudyClient,
+    article_payload,
+    build_form_payload,
+    pre_questionnaire_payload,
+)
+
+# gunicorn's default access_log_format, with an optional trailing %(D)s and
+# "%({x-forwarded-for}i)s" (see gunicorn.conf.py).
+_LINE_RE = re.compile(
+    r'(?P<host>\S+) \S+ \S+ \[(?P<time>[^\]]+)\] "(?P<method>[A-Z]+) (?P<path>\S+) [^"]*" '
+    r'(?P<status>\d{3}) \S+ "[^"]*" "(?P<agent>[^"]*)"(?: (?P<micros>\d+))?(?: "(?P<forwarded>[^"]*)")?'
+)
+_LOOPBACK_HOSTS = ('127.', '::1', 'localhost', 'unix:')
+_STEP_PATHS = {
+    '/': 'landing',
+    '/demographics': 'demographics',
+    '/pre-questionnaire': 'pre_questionnaire',
+    '/instructions': 'instructions',
+    '/thank-you': 'thank_you',
+}
+
+
+@dataclass
+class LoggedRequest:
+    ts: float
+    method: str
+    path: str
+    status: int
+    micros: int | None
+
+
+@dataclass
+class Session:
+    key: tuple[str, str]
+    prolific_id: str
+    requests: list[LoggedRequest] = field(default_factory=list)
+
+    @property
+    def start(self) -> float:
+        return self.requests[0].ts
+
+
+def _client_address(m: re.Match) -> str:
+    """The participant's address: the first X-Forwarded-For hop, else %(h)s."""
+    forwarded = (m['forwarded'] or '').split(',')[0].strip()
+    return forwarded if forwarded and forwarded != '-' else m['host']
+
+
+def parse_log(lines) -> list[Session]:
+    """Group access-log lines into participant sessions, oldest first."""
+    current: dict[tuple[str, str], Session] = {}
+    sessions: list[Session] = []
+    clients: set[str] = set()
+    for line in lines:
+        m = _LINE_RE.search(line)
+        if not m:
+            continue
+        try:
+            ts = datetime.strptime(m['time'], '%d/%b/%Y:%H:%M:%S %z').timestamp()
+        except ValueError:
+            continue
+        path = m['path']
+        if path.startswith('/static/'):
+            continue
+        key = (_client_address(m), m['agent'])
+        clients.add(key[0])
+        parsed = urllib.parse.urlsplit(path)
+        pid = urllib.parse.parse_qs(parsed.query).get('PROLIFIC_PID', [None])[0]
+        if pid and parsed.path == '/':
+            session = Session(key, pid)
+            current[key] = session
+            sessions.append(session)
+        session = current.get(key)
+        if session is None:
+            continue
+        session.requests.append(LoggedRequest(
+            ts, m['method'], path, int(m['status']), int(m['micros']) if m['micros'] else None,
+        ))
+    if clients and all(c.startswith(_LOOPBACK_HOSTS) for c in clients):
+        print("WARNING: every client address in the log is loopback (no X-Forwarded-For field?); "
+              "participants with the same user agent are merged into one session. "
+              "Use the access_log_format from gunicorn.conf.py.", file=sys.stderr)
+    sessions.sort(key=lambda s: s.start)
+    return sessions
+
+
+def _step_name(path: str, article_posts: int) -> str | None:
+    route = urllib.parse.urlsplit(path).path
+    if route.startswith('/article/'):
+        return f'article_{article_posts + 1}'
+    return _STEP_PATHS.get(route)
+
+
+def replay_session(session: Session, client: StudyClient, speed: float, rng: random.Random, pid_prefix: str):
+    """Replay one session; returns (local timings, production timings from the log)."""
+    result = JourneyResult(f'{pid_prefix}{session.prolific_id}')
+    production = JourneyResult(session.prolific_id)
+    pages: dict[str, str] = {}
+    article_location = None
+    article_posts = 0
+    previous_ts = session.start
+
+    for logged in session.requests:
+        gap = (logged.ts - previous_ts) / speed
+        previous_ts = logged.ts
+        if gap > 0:
+            time.sleep(gap)
+
+        step = _step_name(logged.path, article_posts)
+        if step is None:
+            continue
+        if logged.micros is not None:
+            production.steps.append(StepResult(step, logged.method, logged.status, logged.micros / 1e6))
+
+        route = urllib.parse.urlsplit(logged.path).path
+        if step == 'landing':
+            path = f'/?PROLIFIC_PID={urllib.parse.quote(result.prolific_id)}'
+        elif step.startswith('article_'):
+            path = article_location or logged.path
+        else:
+            path = route
+
+        if logged.method == 'GET':
+            status, location, html = client.request(step, 'GET', path, result=result)
+            hops = 0
+            while location and step.startswith('article_') and hops < 3:
+                article_location = location
+                status, location, html = client.request(step, 'GET', location, result=result)
+                hops += 1
+            pages[step] = html
+        elif logged.method == 'POST':
+            html = pages.get(step, '')
+            if step.startswith('article_'):
+                data = article_payload(html, rng)
+            elif step == 'pre_questionnaire':
+                data = pre_questionnaire_payload(html, rng)
+            elif step == 'demographics':
+                data = build_form_payload(html, rng, {'age': str(rng.randint(18, 80))})
+            else:
+                data = build_form_payload(html, rng)
+            status, location, _ = client.request(step, 'POST', path, data, result=result)
+            if step.startswith('article_'):
+                article_posts += 1
+            if location and (step == 'instructions' or step.startswith('article_')):
+                article_location = location
+        if step == 'thank_you' and result.steps and result.steps[-1].ok:
+            result.completed = True
+    return result, production
+
+
+def run_replay(sessions: list[Session], args) -> tuple[list[JourneyResult], list[JourneyResult], float]:
+    local: list[JourneyResult] = []
+    production: list[JourneyResult] = []
+    lock = threading.Lock()
+    threads = []
+    t0 = time.monotonic()
+    origin = sessions[0].start if sessions else 0.0
+
+    def worker(session: Session, seed: int):
+        client = StudyClient(args.base_url, timeout=args.timeout, user_agent='study-replay/1.0')
+        res, prod = replay_session(session, client, args.speed, random.Random(seed), args.pid_prefix)
+        with lock:
+            local.append(res)
+            production.append(prod)
+
+    for n, session in enumerate(sessions):
+        delay = (session.start - origin) / args.speed - (time.monotonic() - t0)
+        if delay > 0:
+            time.sleep(delay)
+        t = threading.Thread(target=worker, args=(session, n), daemon=True)
+        t.start()
+        threads.append(t)
+    for t in threads:
+        t.join()
+    return local, production, time.monotonic() - t0
+
+
+def compare_reports(current: list[dict], previous: list[dict]):
+    before = {(r['step'], r['method']): r for r in previous}
+    print(f"\n{'step':<20}{'method':<7}{'p50 before':>12}{'p50 now':>10}{'p95 before':>12}{'p95 now':>10}{'p95 change':>12}")
+    for r in current:
+        b = before.get((r['step'], r['method']))
+        if not b:
+            continue
+        change = ''
+        if b.get('p95_ms') and r.get('p95_ms') is not None:
+            change = f"{(r['p95_ms'] / b['p95_ms'] - 1) * 100:+.1f}%"
+        print(f"{r['step']:<20}{r['method']:<7}{b.get('p50_ms') or 0:>12.1f}{r.get('p50_ms') or 0:>10.1f}"
+              f"{b.get('p95_ms') or 0:>12.1f}{r.get('p95_ms') or 0:>10.1f}{change:>12}")
+
+
+def _print_steps(title: str, steps: list[dict]):
+    print(f"\n=== {title}")
+    print(f"{'step':<20}{'method':<7}{'count':>7}{'p50':>9}{'p95':>9}{'p99':>9}{'errors':>8}")
+    for r in steps:
+        print(f"{r['step']:<20}{r['method']:<7}{r['count']:>7}{r['p50_ms'] or 0:>9.1f}"
+              f"{r['p95_ms'] or 0:>9.1f}{r['p99_ms'] or 0:>9.1f}{r['errors']:>8}")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('logfile', help="access log ('-' for stdin), e.g. from journalctl -o cat")
+    parser.add_argument('--base-url', default='http://127.0.0.1:8000')
+    parser.add_argument('--speed', type=float, default=1.0, help='1 = real time, 10 = ten times faster')
+    parser.add_argument('--limit-sessions', type=int, default=0)
+    parser.add_argument('--timeout', type=float, default=30.0)
+    parser.add_argument('--pid-prefix', default='REPLAY-')
+    parser.add_argument('--json', help='write the step report to this file')
+    parser.add_argument('--compare', help='report from a previous replay (another build) to diff against')
+    args = parser.parse_args(argv)
+
+    fh = sys.stdin if args.logfile == '-' else open(args.logfile, encoding='utf-8', errors='replace')
+    with fh:
+        sessions = parse_log(fh)
+    if args.limit_sessions:
+        sessions = sessions[:args.limit_sessions]
+    if not sessions:
+        print("No participant sessions found in the log.")
+        return 1
+    span = sessions[-1].requests[-1].ts - sessions[0].start
+    print(f"Replaying {len(sessions)} sessions spanning {span / 60:.1f} min at {args.speed:g}x")
+
+    local, production, wall_s = run_replay(sessions, args)
+    steps = summarize_steps(local, wall_s)
+    _print_steps(f"local replay: {sum(j.completed for j in local)}/{len(local)} sessions completed in {wall_s:.1f}s",
+                 steps)
+    prod_steps = summarize_steps(production, span or 1.0)
+    if any(r['count'] for r in prod_steps):
+        _print_steps("production (from %(D)s in the log)", prod_steps)
+
+    report = {'sessions': len(sessions), 'speed': args.speed, 'wall_s': round(wall_s, 2), 'steps': steps}
+    if args.compare:
+        with open(args.compare) as fh:
+            compare_reports(steps, json.load(fh)['steps'])
+    if args.json:
+        with open(args.json, 'w') as fh:
+            json.dump(report, fh, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,265 @@
+"""Monte Carlo check of the study's counterbalancing, without a launch.
+
+Runs the app's own assignment functions for many virtual participants:
+- explanation pair      app._explanation_pair_for(participant_num)
+- topic start list      app._choose_topic_start_list(rng)
+- lists per round       app._list_for_round_from(start, round)
+- recommendation order  shuffle of [fav rec, least rec], as in article()
+- labels / position     app._assign_rec_labels, app._changing_label_pos
+- article exposure      app._pick_article_from_topic (main + both recs)
+
+The participant counter that drives the pair cycle lives in an in-memory
+store. With --concurrency K, up to K demographics POSTs are in flight at once
+and each reads the counter when it starts but increments it when it commits,
+so interleavings produce the stale reads (and repeated pairs) real workers can.
+
+Article exposure is measured on the first --exposure-participants
+participants; everything else covers all of them.
+
+    python scripts/simulate_randomization.py --participants 100000
+    python scripts/simulate_randomization.py --participants 100000 --concurrency 8 --preference-skew 1.0
+    python scripts/simulate_randomization.py --catalog article_selection.db --json balance.json
+
+Exits 1 if any factor is out of balance (chi-square p below --alpha).
+"""
+
+import argparse
+import json
+import math
+import os
+import random
+import sys
+import tempfile
+from collections import Counter
+
+_SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, _SCRIPTS_DIR)
+
+from generate_fixtures import import_app, write_catalog  # noqa: E402
+
+
+def chi_square(counts: list[int]) -> tuple[float, float]:
+    """Chi-square statistic against a uniform split and its p-value (Wilson-Hilferty)."""
+    k = len(counts) - 1
+    total = sum(counts)
+    if k <= 0 or total == 0:
+        return 0.0, 1.0
+    expected = total / len(counts)
+    stat = sum((c - expected) ** 2 / expected for c in counts)
+    z = ((stat / k) ** (1 / 3) - (1 - 2 / (9 * k))) / math.sqrt(2 / (9 * k))
+    return stat, 0.5 * math.erfc(z / math.sqrt(2))
+
+
+def assign_participant_numbers(n: int, concurrency: int, rng: random.Random) -> list[int]:
+    """participant_num each virtual participant reads, under random interleavings.
+
+    A request reads the committed count when it starts and commits (count += 1)
+    some interleaving later; concurrency 1 reproduces the sequential cycle.
+    """
+    committed = 0
+    in_flight: list[tuple[int, int]] = []  # (participant, participant_num read)
+    numbers = [0] * n
+    started = 0
+    while started < n or in_flight:
+        can_start = started < n and len(in_flight) < concurrency
+        if can_start and (not in_flight or rng.random() < 0.5):
+            in_flight.append((started, committed))
+            started += 1
+        else:
+            participant, num = in_flight.pop(rng.randrange(len(in_flight)))
+            numbers[participant] = num
+            committed += 1
+    return numbers
+
+
+def _choose_topics(topics: list[str], weights: list[float], rng: random.Random) -> tuple[str, str]:
+    """Favourite and a different least-favourite topic from one list."""
+    fav = rng.choices(topics, weights)[0]
+    rest = [t for t in topics if t != fav]
+    rest_weights = [w for t, w in zip(topics, weights) if t != fav]
+    # Least favourite: preference reversed, so popular topics are rarely least liked.
+    least = rng.choices(rest, [1.0 / w for w in rest_weights])[0]
+    return fav, least
+
+
+def simulate(app_module, args) -> dict:
+    rng = random.Random(args.seed)
+    total_rounds = args.rounds or app_module.STUDY_TOTAL_ROUNDS
+    list_topics = {'A': list(app_module.TOPIC_MAP_LIST_A), 'B': list(app_module.TOPIC_MAP_LIST_B)}
+    weights = {
+        name: [1.0 / (rank + 1) ** args.preference_skew for rank in range(len(topics))]
+        for name, topics in list_topics.items()
+    }
+    topic_col = app_module.TOPIC_COL
+
+    numbers = assign_participant_numbers(args.participants, args.concurrency, rng)
+    pairs = Counter()
+    label_by_round = Counter()
+    start_lists = Counter()
+    position = Counter()
+    position_by_round = Counter()
+    position_by_label = Counter()
+    exposure = Counter()
+
+    for n in range(args.participants):
+        order = app_module._explanation_pair_for(numbers[n])
+        pairs[' | '.join(order)] += 1
+        start = app_module._choose_topic_start_list(rng)
+        start_lists[start] += 1
+        prefs = {name: _choose_topics(list_topics[name], weights[name], rng) for name in ('A', 'B')}
+        measure_exposure = n < args.exposure_participants
+        seen: list[int] = []
+
+        for round_number in range(1, total_rounds + 1):
+            list_name = app_module._list_for_round_from(start, round_number)
+            fav_topic = app_module._map_list_topic(list_name, prefs[list_name][0])
+            least_topic = app_module._map_list_topic(list_name, prefs[list_name][1])
+            least_label = order[round_number - 1] if round_number <= len(order) else order[0]
+            label_by_round[(round_number, least_label)] += 1
+
+            if measure_exposure:
+                main = app_module._pick_article_from_topic(fav_topic, seen, None, rng)
+                main_id = int(main['index']) if main is not None else -1
+                seen.append(main_id)
+                recs = [
+                    app_module._pick_article_from_topic(fav_topic, seen, main_id, rng),
+                    app_module._pick_article_from_topic(least_topic, seen, main_id, rng),
+                ]
+                recs = [r for r in recs if r is not None]
+                exposure[main_id] += 1
+                for rec in recs:
+                    exposure[int(rec['index'])] += 1
+            else:
+                recs = [{topic_col: fav_topic, 'index': -1}, {topic_col: least_topic, 'index': -2}]
+
+            rng.shuffle(recs)
+            _, kinds = app_module._assign_rec_labels(recs, fav_topic, least_topic, least_label)
+            pos = app_module._changing_label_pos([r['index'] for r in recs], kinds)
+            position[pos] += 1
+            position_by_round[(round_number, pos)] += 1
+            position_by_label[(least_label, pos)] += 1
+
+    return {
+        'participants': args.participants,
+        'concurrency': args.concurrency,
+        'pairs': pairs,
+        'repeated_participant_nums': args.participants - len(set(numbers)),
+        'label_by_round': label_by_round,
+        'start_lists': start_lists,
+        'position': position,
+        'position_by_round': position_by_round,
+        'position_by_label': position_by_label,
+        'exposure': exposure,
+        'total_rounds': total_rounds,
+    }
+
+
+def _exposure_report(app_module, exposure: Counter) -> list[dict]:
+    catalog = app_module.CATALOG.frame
+    rows = []
+    for topic, ids in catalog.groupby(catalog[app_module.TOPIC_COL].astype(str).str.strip())['index']:
+        counts = [exposure.get(int(i), 0) for i in ids]
+        total = sum(counts)
+        mean = total / len(counts)
+        sd = math.sqrt(sum((c - mean) ** 2 for c in counts) / len(counts))
+        stat, p = chi_square(counts)
+        rows.append({
+            'topic': topic,
+            'articles': len(counts),
+            'exposures': total,
+            'never_shown': sum(1 for c in counts if c == 0),
+            'min': min(counts),
+            'max': max(counts),
+            'cv': round(sd / mean, 3) if mean else None,
+            'p': p if total else None,
+        })
+    return rows
+
+
+def report(app_module, result: dict, alpha: float) -> tuple[dict, list[str]]:
+    failures = []
+    out = {'participants': result['participants'], 'concurrency': result['concurrency']}
+
+    def factor(name: str, counter: Counter, keys=None):
+        keys = keys if keys is not None else sorted(counter, key=str)
+        counts = [counter.get(k, 0) for k in keys]
+        stat, p = chi_square(counts)
+        flag = p < alpha
+        if flag:
+            failures.append(name)
+        total = sum(counts) or 1
+        print(f"\n{name}: chi2={stat:.1f} p={p:.4g}{'  IMBALANCED' if flag else ''}")
+        for k, c in zip(keys, counts):
+            print(f"  {str(k)[:70]:<72}{c:>9}{c / total:>8.2%}")
+        out[name] = {'counts': {str(k): c for k, c in zip(keys, counts)}, 'chi2': stat, 'p': p}
+
+    all_pairs = [' | '.join(app_module._explanation_pair_for(i))
+                 for i in range(math.comb(len(app_module.LEAST_REC_LABELS), 2))]
+    factor('explanation_pairs', result['pairs'], all_pairs)
+    print(f"  repeated participant_num reads (stale counts): {result['repeated_participant_nums']}")
+    out['repeated_participant_nums'] = result['repeated_participant_nums']
+    labels = app_module.LEAST_REC_LABELS
+    for round_number in range(1, result['total_rounds'] + 1):
+        factor(f'round_{round_number}_explanation',
+               Counter({lbl: result['label_by_round'].get((round_number, lbl), 0) for lbl in labels}), labels)
+    factor('topic_start_list', result['start_lists'], ['A', 'B'])
+    factor('changing_label_position', result['position'], [0, 1])
+    for round_number in range(1, result['total_rounds'] + 1):
+        factor(f'round_{round_number}_changing_label_position',
+               Counter({p: result['position_by_round'].get((round_number, p), 0) for p in (0, 1)}), [0, 1])
+    for lbl in labels:
+        factor(f'changing_label_position[{lbl or "(no label)"}]',
+               Counter({p: result['position_by_label'].get((lbl, p), 0) for p in (0, 1)}), [0, 1])
+    if result['position'].get(None):
+        failures.append('changing_label_position_missing')
+        print(f"\n{result['position'][None]} rounds without a least-topic recommendation")
+
+    if result['exposure']:
+        rows = _exposure_report(app_module, result['exposure'])
+        print(f"\nper-article exposure (main article + both recommendations, "
+              f"{sum(r['exposures'] for r in rows)} impressions):")
+        print(f"  {'topic':<20}{'articles':>9}{'shown':>8}{'never':>7}{'min':>6}{'max':>6}{'cv':>7}{'p':>10}")
+        for r in rows:
+            cv = '-' if r['cv'] is None else r['cv']
+            p = '-' if r['p'] is None else f"{r['p']:.3g}"
+            print(f"  {r['topic']:<20}{r['articles']:>9}{r['exposures']:>8}{r['never_shown']:>7}{r['min']:>6}"
+                  f"{r['max']:>6}{cv:>7}{p:>10}")
+        out['exposure'] = rows
+    return out, failures
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--participants', type=int, default=100000)
+    parser.add_argument('--concurrency', type=int, default=1, help='demographics POSTs in flight at once')
+    parser.add_argument('--rounds', type=int, default=0, help='rounds per participant (default STUDY_TOTAL_ROUNDS)')
+    parser.add_argument('--preference-skew', type=float, default=0.0,
+                        help='Zipf skew of favourite-topic choices within each list (0 = uniform)')
+    parser.add_argument('--exposure-participants', type=int, default=1000)
+    parser.add_argument('--catalog', help='article catalog (default: a synthetic 600-article catalog, about the size of the real one)')
+    parser.add_argument('--alpha', type=float, default=0.001)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', help='write the report to this file')
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory(prefix='study-sim-') as workdir:
+        catalog = args.catalog
+        if not catalog:
+            catalog = os.path.join(workdir, 'catalog.db')
+            write_catalog(catalog, 600, content_words=5, title_words=3)
+        os.environ.setdefault('LOG_LEVEL', 'ERROR')
+        app_module = import_app(catalog, os.path.join(workdir, 'responses.db'))
+        result = simulate(app_module, args)
+
+    out, failures = report(app_module, result, args.alpha)
+    if args.json:
+        with open(args.json, 'w') as fh:
+            json.dump(out, fh, indent=2)
+    if failures:
+        print(f"\nOut of balance: {', '.join(failures)}")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,259 @@
+"""HTTP client that walks one participant through the study flow.
+
+Shared by the load generator (loadtest.py) and the access-log replayer
+(replay_access_log.py). Standard library only, so it runs on the study VM
+without extra installs.
+
+Form payloads are built from the rendered HTML (every radio group, select and
+checkbox on the page gets a plausible value), so the client keeps working when
+questions are added or renamed in the templates.
+"""
+
+import http.cookiejar
+import random
+import re
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from dataclasses import dataclass, field
+from html.parser import HTMLParser
+
+
+@dataclass
+class StepResult:
+    step: str
+    method: str
+    status: int | None
+    elapsed_s: float
+    error: str | None = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+@dataclass
+class JourneyResult:
+    prolific_id: str
+    steps: list[StepResult] = field(default_factory=list)
+    completed: bool = False
+
+    @property
+    def error_count(self) -> int:
+        return sum(1 for s in self.steps if not s.ok)
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    """Surface redirects to the caller so each hop is timed as its own step."""
+
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        return None
+
+
+class _FormParser(HTMLParser):
+    """Collect the fields of the first <form method="POST"> on a page."""
+
+    def __init__(self):
+        super().__init__()
+        self.in_form = False
+        self.done = False
+        self.radios: dict[str, list[str]] = {}
+        self.checkboxes: dict[str, list[str]] = {}
+        self.selects: dict[str, list[str]] = {}
+        self.hidden: dict[str, str] = {}
+        self.text: list[str] = []
+        self._select = None
+
+    def handle_starttag(self, tag, attrs):
+        a = dict(attrs)
+        if tag == 'form' and not self.done and (a.get('method') or '').upper() == 'POST':
+            self.in_form = True
+            return
+        if not self.in_form:
+            return
+        name = a.get('name')
+        if tag == 'input' and name:
+            kind = (a.get('type') or 'text').lower()
+            if kind == 'radio':
+                self.radios.setdefault(name, []).append(a.get('value', 'on'))
+            elif kind == 'checkbox':
+                self.checkboxes.setdefault(name, []).append(a.get('value', 'on'))
+            elif kind == 'hidden':
+                self.hidden[name] = a.get('value') or ''
+            elif kind in ('text', 'number'):
+                self.text.append(name)
+        elif tag == 'select' and name:
+            self._select = name
+            self.selects[name] = []
+        elif tag == 'option' and self._select and a.get('value'):
+            self.selects[self._select].append(a['value'])
+
+    def handle_endtag(self, tag):
+        if tag == 'select':
+            self._select = None
+        elif tag == 'form' and self.in_form:
+            self.in_form = False
+            self.done = True
+
+
+def build_form_payload(html: str, rng: random.Random, overrides: dict | None = None) -> list[tuple[str, str]]:
+    """Fill every field of the page's POST form with a plausible random answer."""
+    parser = _FormParser()
+    parser.feed(html)
+    data: dict[str, str | list[str]] = dict(parser.hidden)
+    for name, values in parser.radios.items():
+        data[name] = rng.choice(values)
+    for name, values in parser.selects.items():
+        # Skip the "Other" style options so free-text follow-ups are not needed.
+        usable = [v for v in values if not v.lower().startswith('other') and v != 'Self-describe'] or values
+        if usable:
+            data[name] = rng.choice(usable)
+    for name, values in parser.checkboxes.items():
+        usable = [v for v in values if v.lower() != 'other'] or values
+        data[name] = rng.sample(usable, k=min(len(usable), rng.randint(1, 2)))
+    data.update(overrides or {})
+
+    pairs = []
+    for name, value in data.items():
+        if isinstance(value, list):
+            pairs.extend((name, v) for v in value)
+        else:
+            pairs.append((name, value))
+    return pairs
+
+
+def _distinct_choice(html: str, name: str, avoid: str | None, rng: random.Random) -> str | None:
+    values = re.findall(rf'name="{re.escape(name)}"[^>]*value="([^"]*)"', html)
+    values = [v for v in values if v != avoid]
+    return rng.choice(values) if values else None
+
+
+def pre_questionnaire_payload(html: str, rng: random.Random) -> list[tuple[str, str]]:
+    """Pre-questionnaire answers with a favourite and a different least-favourite topic per list."""
+    overrides = {}
+    for list_no in (1, 2):
+        fav = _distinct_choice(html, f'favourite_topic_{list_no}', None, rng)
+        overrides[f'favourite_topic_{list_no}'] = fav
+        overrides[f'least_favourite_topic_{list_no}'] = _distinct_choice(
+            html, f'least_favourite_topic_{list_no}', fav, rng
+        )
+    return build_form_payload(html, rng, {k: v for k, v in overrides.items() if v})
+
+
+def article_payload(html: str, rng: random.Random) -> list[tuple[str, str]]:
+    """Pick one recommendation and answer every rating item on an article page."""
+    parser = _FormParser()
+    parser.feed(html)
+    rec_ids = re.findall(r'name="likelihood_(\d+)"', html)
+    data = {}
+    for name, value in parser.hidden.items():
+        # Rating items are hidden inputs the page's script fills in; form_token is kept as rendered.
+        data[name] = value if name == 'form_token' else str(rng.randint(1, 5))
+    data['selected_article_id'] = rng.choice(rec_ids) if rec_ids else ''
+    return list(data.items())
+
+
+class StudyClient:
+    """One participant's browser: a cookie jar plus per-request timing."""
+
+    def __init__(self, base_url: str, timeout: float = 30.0, user_agent: str = 'study-loadtest/1.0'):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.user_agent = user_agent
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()),
+            _NoRedirect,
+        )
+
+    def request(self, step: str, method: str, path: str, data=None, result: JourneyResult | None = None):
+        """Send one request; returns (status, location, body). Never raises."""
+        url = path if path.startswith('http') else f"{self.base_url}{path}"
+        body = urllib.parse.urlencode(data, doseq=True).encode() if data is not None else None
+        req = urllib.request.Request(url, data=body, method=method, headers={'User-Agent': self.user_agent})
+        started = time.perf_counter()
+        status, location, text, error = None, None, '', None
+        try:
+            with self.opener.open(req, timeout=self.timeout) as resp:
+                status = resp.status
+                text = resp.read().decode('utf-8', 'replace')
+        except urllib.error.HTTPError as e:
+            status = e.code
+            location = e.headers.get('Location')
+            if status not in (301, 302, 303, 307, 308):
+                error = f"HTTP {status}"
+        except Exception as e:  # connection refused, timeout, reset ...
+            error = f"{type(e).__name__}: {e}"
+        elapsed = time.perf_counter() - started
+        if result is not None:
+            result.steps.append(StepResult(step, method, status, elapsed, error))
+        if location:
+            location = urllib.parse.urljoin(url, location)
+        return status, location, text
+
+    def run_journey(
+        self,
+        prolific_id: str,
+        rng: random.Random,
+        think_time_s: float = 0.0,
+        total_rounds: int = 2,
+    ) -> JourneyResult:
+        """Walk landing -> demographics -> pre-questionnaire -> instructions -> articles -> thank-you."""
+        result = JourneyResult(prolific_id)
+
+        def think():
+            if think_time_s:
+                time.sleep(rng.uniform(0.5, 1.5) * think_time_s)
+
+        def ok(status):
+            return result.steps and result.steps[-1].ok and status is not None
+
+        status, _, _ = self.request('landing', 'GET', f"/?PROLIFIC_PID={urllib.parse.quote(prolific_id)}", result=result)
+        if not ok(status):
+            return result
+        think()
+
+        status, _, html = self.request('demographics', 'GET', '/demographics', result=result)
+        if not ok(status):
+            return result
+        form = build_form_payload(html, rng, {'age': str(rng.randint(18, 80))})
+        think()
+        status, _, _ = self.request('demographics', 'POST', '/demographics', form, result=result)
+        if not ok(status):
+            return result
+
+        status, _, html = self.request('pre_questionnaire', 'GET', '/pre-questionnaire', result=result)
+        if not ok(status):
+            return result
+        form = pre_questionnaire_payload(html, rng)
+        think()
+        status, _, _ = self.request('pre_questionnaire', 'POST', '/pre-questionnaire', form, result=result)
+        if not ok(status):
+            return result
+
+        status, _, _ = self.request('instructions', 'GET', '/instructions', result=result)
+        if not ok(status):
+            return result
+        think()
+        status, location, _ = self.request('instructions', 'POST', '/instructions', {}, result=result)
+        if not ok(status) or not location:
+            return result
+
+        for round_number in range(1, total_rounds + 1):
+            step = f'article_{round_number}'
+            # The app may redirect once to a main article from the favourite topic.
+            for _ in range(3):
+                status, redirect_to, html = self.request(step, 'GET', location, result=result)
+                if not ok(status) or not redirect_to:
+                    break
+                location = redirect_to
+            if not ok(status) or status != 200:
+                return result
+            think()
+            status, location, _ = self.request(step, 'POST', location, article_payload(html, rng), result=result)
+            if not ok(status) or not location:
+                return result
+
+        status, _, _ = self.request('thank_you', 'GET', location, result=result)
+        result.completed = bool(ok(status) and status == 200)
+        return result
@@ -1,7 +1,9 @@
 """WSGI entrypoint for production servers (Gunicorn/uWSGI).
 
 Example:
-    gunicorn -w 2 -b 127.0.0.1:8000 wsgi:app
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+gunicorn.conf.py preloads this module in the master and sets up each worker.
 
 Configure secrets/DB via environment variables (see README.md).
 """